@@ -332,8 +332,8 @@ def get_model(img_size, num_classes):
         x = layers.UpSampling2D(2)(x)
 
         # Project residual
-        residual = layers.UpSampling2D(2)(previous_block_activation)
-        residual = layers.Conv2D(filters, 1, padding="same")(residual)
+        residual = layers.Conv2D(filters, 1, padding="same")(previous_block_activation)
+        residual = layers.UpSampling2D(2)(residual)
         x = layers.add([x, residual])  # Add back residual
         previous_block_activation = x  # Set aside next residual
 
@@ -390,8 +390,8 @@ def get_model1(img_size, num_classes):
         x = layers.UpSampling2D(2)(x)
 
         # Project residual
-        residual = layers.UpSampling2D(2)(previous_block_activation)
-        residual = layers.Conv2D(filters, 1, padding="same")(residual)
+        residual = layers.Conv2D(filters, 1, padding="same")(previous_block_activation)
+        residual = layers.UpSampling2D(2)(residual)
         x = layers.add([x, residual])  # Add back residual
         previous_block_activation = x  # Set aside next residual
 
@@ -61,6 +61,9 @@ from tensorflow import keras
 import numpy as np
 from tensorflow.keras.preprocessing.image import load_img
 from sklearn.preprocessing import LabelBinarizer
+from oxford_pets_image_resume import fit_resumable
+from oxford_pets_image_validation import ScheduledValidation, decode_split, stratified_subset
+from oxford_pets_image_warmstart import print_report, warm_start
 
 input_dir = "images/"
 target_dir = "annotations/trimaps/"
@@ -458,8 +461,8 @@ def get_model(img_size, num_classes):
         x = layers.UpSampling2D(2)(x)
 
         # Project residual
-        residual = layers.UpSampling2D(2)(previous_block_activation)
-        residual = layers.Conv2D(filters, 1, padding="same")(residual)
+        residual = layers.Conv2D(filters, 1, padding="same")(previous_block_activation)
+        residual = layers.UpSampling2D(2)(residual)
         x = layers.add([x, residual])  # Add back residual
         previous_block_activation = x  # Set aside next residual
 
@@ -517,8 +520,8 @@ def get_model1(img_size, num_classes):
         x = layers.UpSampling2D(2)(x)
 
         # Project residual
-        residual = layers.UpSampling2D(2)(previous_block_activation)
-        residual = layers.Conv2D(filters, 1, padding="same")(residual)
+        residual = layers.Conv2D(filters, 1, padding="same")(previous_block_activation)
+        residual = layers.UpSampling2D(2)(residual)
         x = layers.add([x, residual])  # Add back residual
         previous_block_activation = x  # Set aside next residual
 
@@ -592,8 +595,8 @@ def get_model2(img_size, num_classes):
         x = layers.UpSampling2D(2)(x)
 
         # Project residual
-        residual = layers.UpSampling2D(2)(previous_block_activation)
-        residual = layers.Conv2D(filters, 1, padding="same")(residual)
+        residual = layers.Conv2D(filters, 1, padding="same")(previous_block_activation)
+        residual = layers.UpSampling2D(2)(residual)
         x = layers.add([x, residual])  # Add back residual
         previous_block_activation = x  # Set aside next residual
 
@@ -666,8 +669,8 @@ def get_model2_org(img_size, num_classes):
         x = layers.UpSampling2D(2)(x)
 
         # Project residual
-        residual = layers.UpSampling2D(2)(previous_block_activation)
-        residual = layers.Conv2D(filters, 1, padding="same")(residual)
+        residual = layers.Conv2D(filters, 1, padding="same")(previous_block_activation)
+        residual = layers.UpSampling2D(2)(residual)
         x = layers.add([x, residual])  # Add back residual
         previous_block_activation = x  # Set aside next residual
 
@@ -765,6 +768,9 @@ else :
     # Build model
     model = get_model2(img_size, num_classes)
     model.summary()
+    # Start from the layers Rev3 already trained (matched by position and shape)
+    if os.path.exists('oxford_gen_color_r3.h5') and os.path.isfile('oxford_gen_color_r3.h5') :
+        print_report(warm_start(model, 'oxford_gen_color_r3.h5'), "summary-oxford-warmstart.txt")
     
     stringlist = []
     model.summary(print_fn=lambda x: stringlist.append(x))
@@ -785,13 +791,16 @@ else :
     adam = tf.keras.optimizers.Adam()
     model.compile(optimizer=adam, loss="mae")
     
-    callbacks = [
-        keras.callbacks.ModelCheckpoint("oxford_gen_color_r4.h5", save_best_only=False)
-    ]
-    
     # Train the model, doing validation at the end of each epoch.
+    # Snapshots in memory, written in the background; the .h5 is saved once at the end.
+    # An interrupted run (no .h5 yet) continues from its last checkpoint.
     epochs = 80#15
-    model.fit(train_gen,batch_size=0 , epochs=epochs, validation_data=val_gen, callbacks=callbacks)   
+    # The split is decoded once; 200 images (by breed) every 5 epochs, all of it at the end.
+    val_set = decode_split(val_input_img_paths, img_size, encoder=encoder)
+    validation = ScheduledValidation(val_set, batch_size, every_epochs=5,
+                                     subset=stratified_subset(val_input_img_paths, 200), epochs=epochs)
+    fit_resumable(model, train_gen, epochs, "checkpoints/oxford_gen_color_r4", callbacks=[validation],
+                  keep_last=3, keep_best=2, monitor="val_loss", export_path="oxford_gen_color_r4.h5")
     pass
 
 """
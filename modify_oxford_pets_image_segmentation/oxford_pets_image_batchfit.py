@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Nov 16 09:29:52 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Batch size and img_size under a memory budget
+Description: `batch_size` was tuned by hand (32, 20, 15, "fix gpu training",
+sometimes 1). `probe` builds the model for an `img_size` and a batch size in a
+fresh process, runs a few training steps on random data and reads the peak
+memory: the process peak RSS on CPU (a fresh process so earlier probes do not
+count, and an out-of-memory kill only ends the probe), the allocator peak on a
+GPU. `fit_batch_size` doubles the batch until the budget is exceeded and then
+bisects. If the largest batch that fits is below the batch the run wants, the
+difference is made up with gradient accumulation (`AccumulatingModel`).
+`fit_with_backoff` trains and, when the allocator runs out of memory anyway,
+halves the micro-batch, doubles the accumulation so the effective batch stays
+the same, and goes on from the epoch it reached. (On CPU the kernel OOM killer
+cannot be caught, which is what the probe with its margin is for.)
+
+    python oxford_pets_image_batchfit.py --task seg --budget-gb 8 --img-size 128,160,192
+    python oxford_pets_image_batchfit.py --task color --budget-gb 6 --img-size 128 --batch-size 32 --train
+"""
+
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from oxford_pets_image_data import get_task_sequences
+from oxford_pets_image_models import build_model, task_compile
+
+
+"""
+## Gradient accumulation
+"""
+
+
+class AccumulatingModel(keras.Model):
+    """Functional model that applies the mean gradient of `accum_steps` batches.
+
+    `accum_steps` is a variable, so it can change between fits without
+    recompiling. Build it from an existing model:
+    `AccumulatingModel(model.inputs, model.outputs, accum_steps=4)`.
+    """
+
+    def __init__(self, *args, accum_steps=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.accum_steps = tf.Variable(accum_steps, dtype="int64", trainable=False)
+        self.accum_count = tf.Variable(0, dtype="int64", trainable=False)
+        self.accum_grads = [
+            tf.Variable(tf.zeros_like(v), trainable=False) for v in self.trainable_variables
+        ]
+
+    def make_train_function(self, force=False):
+        # Optimizer slots must exist before `apply_gradients` runs inside tf.cond
+        if hasattr(self.optimizer, "build"):
+            self.optimizer.build(self.trainable_variables)
+        else:  # legacy optimizer
+            self.optimizer._create_all_weights(self.trainable_variables)
+        return super().make_train_function(force)
+
+    def train_step(self, data):
+        x, y = data
+        with tf.GradientTape() as tape:
+            pred = self(x, training=True)
+            loss = self.compiled_loss(y, pred, regularization_losses=self.losses)
+        grads = tape.gradient(loss, self.trainable_variables)
+        for acc, grad in zip(self.accum_grads, grads):
+            acc.assign_add(grad)
+        self.accum_count.assign_add(1)
+
+        def apply():
+            scale = 1.0 / tf.cast(self.accum_steps, "float32")
+            self.optimizer.apply_gradients(
+                [(acc * scale, v) for acc, v in zip(self.accum_grads, self.trainable_variables)]
+            )
+            for acc in self.accum_grads:
+                acc.assign(tf.zeros_like(acc))
+            self.accum_count.assign(0)
+            return tf.constant(True)
+
+        tf.cond(self.accum_count >= self.accum_steps, apply, lambda: tf.constant(False))
+        self.compiled_metrics.update_state(y, pred)
+        return {m.name: m.result() for m in self.metrics}
+
+
+"""
+## Probe
+"""
+
+
+def peak_rss():
+    """Peak resident memory of this process in bytes, None where it is unknown."""
+    try:
+        import resource  # POSIX only
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)  # peak working set on Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # bytes on macOS, KiB on Linux
+
+
+def probe_step(builder, task, img_size, batch_size, steps=3):
+    """Runs `steps` training steps in this process; returns the peak bytes or None."""
+    gpus = tf.config.list_physical_devices("GPU")
+    size = (img_size, img_size)
+    optimizer, loss, activation = task_compile[task]
+    model = build_model(builder, size, 3, activation)
+    model = AccumulatingModel(model.inputs, model.outputs)  # accumulators count too
+    model.compile(optimizer=optimizer, loss=loss)
+    rng = np.random.RandomState(0)
+    # One array per model input (the breed mask of the two-input models too)
+    x = [rng.uniform(0, 255, (batch_size,) + tuple(inp.shape[1:])).astype("float32") for inp in model.inputs]
+    y = rng.randint(0, 3, (batch_size,) + size + (1,)).astype("uint8") if task == "seg" else x[0]
+    x = x if len(x) > 1 else x[0]
+    if gpus:
+        tf.config.experimental.reset_memory_stats("GPU:0")
+    for _ in range(steps):
+        model.train_on_batch(x, y)
+    if gpus:
+        return tf.config.experimental.get_memory_info("GPU:0")["peak"]
+    return peak_rss()
+
+
+def probe(builder, task, img_size, batch_size, steps=3):
+    """Peak bytes of `batch_size` at `img_size` in a fresh process, None if it died."""
+    spec = json.dumps({"builder": builder, "task": task, "img_size": img_size, "batch_size": batch_size,
+                       "steps": steps})
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--probe", spec], stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL, universal_newlines=True)
+    if proc.returncode != 0:
+        return None  # killed by the OOM killer or out of device memory
+    peak = proc.stdout.strip().splitlines()[-1]
+    if peak == "None":
+        raise RuntimeError("no peak memory figure on this system (install psutil)")
+    return int(peak)
+
+
+def fit_batch_size(builder, task, img_size, budget, max_batch=256, steps=3):
+    """Largest batch size whose peak stays within `budget` bytes, with the peaks seen."""
+    peaks = {}
+
+    def fits(batch):
+        peaks[batch] = probe(builder, task, img_size, batch, steps)
+        print("  img_size %d batch %d: %s" % (
+            img_size, batch, "failed" if peaks[batch] is None else "%.2f GB" % (peaks[batch] / 1e9)))
+        return peaks[batch] is not None and peaks[batch] <= budget
+
+    if not fits(1):
+        return 0, peaks
+    good, bad = 1, None
+    while bad is None and good < max_batch:  # double until it does not fit
+        batch = min(good * 2, max_batch)
+        if fits(batch):
+            good = batch
+        else:
+            bad = batch
+    while bad is not None and bad - good > 1:  # then bisect
+        batch = (good + bad) // 2
+        if fits(batch):
+            good = batch
+        else:
+            bad = batch
+    return good, peaks
+
+
+def plan(batch_size, max_batch):
+    """(micro-batch, accumulation steps) for an effective `batch_size`."""
+    if max_batch >= batch_size:
+        return batch_size, 1
+    accum = math.ceil(batch_size / max(max_batch, 1))
+    return math.ceil(batch_size / accum), accum
+
+
+"""
+## Training with out-of-memory backoff
+"""
+
+
+class EpochCounter(keras.callbacks.Callback):
+    def __init__(self, done=0):
+        super().__init__()
+        self.done = done
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.done = epoch + 1
+
+
+def fit_with_backoff(model, make_sequences, batch_size, accum_steps, epochs, callbacks=()):
+    """Fits an `AccumulatingModel`; on out-of-memory halves the micro-batch,
+    doubles `accum_steps` and resumes at the epoch reached.
+    `make_sequences(batch_size)` returns (train_gen, val_gen)."""
+    counter = EpochCounter()
+    while counter.done < epochs:
+        model.accum_steps.assign(accum_steps)
+        model.accum_count.assign(0)
+        for acc in model.accum_grads:
+            acc.assign(tf.zeros_like(acc))
+        train_gen, val_gen = make_sequences(batch_size)
+        try:
+            model.fit(train_gen, epochs=epochs, initial_epoch=counter.done, validation_data=val_gen,
+                      callbacks=list(callbacks) + [counter])
+        except (tf.errors.ResourceExhaustedError, MemoryError) as e:
+            if batch_size == 1:
+                raise
+            batch_size, accum_steps = max(batch_size // 2, 1), accum_steps * 2
+            print("out of memory at epoch %d (%s), backing off to batch %d x %d accumulation steps" % (
+                counter.done + 1, type(e).__name__, batch_size, accum_steps))
+    return batch_size, accum_steps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Largest batch size per img_size within a memory budget.")
+    parser.add_argument("--task", default="seg", choices=sorted(task_compile))
+    parser.add_argument("--builder", default="oxford_pets_image_models:get_model", help="module:function")
+    parser.add_argument("--budget-gb", type=float, default=8.0)
+    parser.add_argument("--margin", type=float, default=0.9, help="share of the budget the probe may use")
+    parser.add_argument("--img-size", default="160", help="comma separated sizes to probe")
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--steps", type=int, default=3, help="training steps per probe")
+    parser.add_argument("--batch-size", type=int, default=32, help="effective batch the run wants")
+    parser.add_argument("--train", action="store_true", help="then train at the first img_size")
+    parser.add_argument("--epochs", type=int, default=15)
+    parser.add_argument("--output", default=None, help="save the trained model here (.h5)")
+    # Set by `probe` for the measuring process
+    parser.add_argument("--probe", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        spec = json.loads(args.probe)
+        print(probe_step(spec["builder"], spec["task"], spec["img_size"], spec["batch_size"], spec["steps"]))
+        sys.exit(0)
+
+    budget = args.budget_gb * 1e9 * args.margin
+    sizes = [int(s) for s in args.img_size.split(",")]
+    rows = []
+    for img_size in sizes:
+        max_batch, peaks = fit_batch_size(args.builder, args.task, img_size, budget, args.max_batch, args.steps)
+        micro, accum = plan(args.batch_size, max_batch)
+        rows.append((img_size, max_batch, peaks.get(max_batch), micro, accum))
+
+    lines = ["%-9s %10s %10s %22s" % ("img_size", "max batch", "peak GB", "batch %d as" % args.batch_size)]
+    for img_size, max_batch, peak, micro, accum in rows:
+        lines.append("%-9d %10d %10s %22s" % (
+            img_size, max_batch, "-" if peak is None else "%.2f" % (peak / 1e9),
+            "does not fit" if not max_batch else "%d x %d steps" % (micro, accum)))
+    print("\n".join(lines))
+    fw = open("summary-oxford-batchfit.txt", "w")
+    fw.write("budget %.1f GB (margin %.0f%%), task %s, %s\n" % (
+        args.budget_gb, 100 * args.margin, args.task, args.builder))
+    fw.write("\n".join(lines) + "\n")
+    fw.close()
+
+    if args.train and rows[0][1]:
+        img_size, _, _, micro, accum = rows[0]
+        size = (img_size, img_size)
+        optimizer, loss, activation = task_compile[args.task]
+        base = build_model(args.builder, size, 3, activation)
+        model = AccumulatingModel(base.inputs, base.outputs, accum_steps=accum)
+        model.compile(optimizer=optimizer, loss=loss)
+        micro, accum = fit_with_backoff(
+            model, lambda b: get_task_sequences(args.task, b, size), micro, accum, args.epochs)
+        print("trained with batch %d x %d accumulation steps" % (micro, accum))
+        if args.output:
+            # Plain functional model with the trained weights, loadable without this module
+            keras.Model(model.inputs, model.outputs).save(args.output)
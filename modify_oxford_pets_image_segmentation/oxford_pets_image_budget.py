@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Nov 10 09:37:45 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Time-to-target training
+Description: Trains until a target validation metric, a wall-clock budget or a
+step budget is reached, instead of a fixed `epochs = 15` or `80`. The learning
+rate follows linear warmup plus cosine decay, or a one-cycle schedule, both
+spanning the step budget (or the epoch cap when only a time budget is given).
+Training also stops when the monitored metric has not improved by `min_delta`
+for `patience` epochs. The run reports the seconds and steps it took to first
+reach the target and appends one line to `summary-oxford-budget.txt`, so runs
+can be compared by cost rather than by epoch count.
+
+    python oxford_pets_image_budget.py --task seg --target 0.35 --max-minutes 30
+    python oxford_pets_image_budget.py --task color --target 12 --schedule onecycle --lr 3e-3 --max-steps 4000
+    python oxford_pets_image_budget.py --task color --builder oxford_pets_image_models:get_model_lite --max-minutes 20
+"""
+
+import argparse
+import math
+import time
+
+import tensorflow as tf
+from tensorflow import keras
+
+from oxford_pets_image_data import get_task_sequences
+from oxford_pets_image_models import build_model, task_compile
+
+
+"""
+## Learning-rate schedules
+"""
+
+
+class WarmupCosine(keras.optimizers.schedules.LearningRateSchedule):
+    """Linear warmup to `peak_lr`, then cosine decay to `final_lr` at `total_steps`."""
+
+    def __init__(self, peak_lr, total_steps, warmup_steps=0, final_lr=0.0):
+        super().__init__()
+        self.peak_lr = peak_lr
+        self.total_steps = total_steps
+        self.warmup_steps = warmup_steps
+        self.final_lr = final_lr
+
+    def __call__(self, step):
+        step = tf.cast(step, "float32")
+        warm = self.peak_lr * (step + 1.0) / max(self.warmup_steps, 1)
+        progress = tf.clip_by_value((step - self.warmup_steps) / max(self.total_steps - self.warmup_steps, 1), 0.0, 1.0)
+        decay = self.final_lr + 0.5 * (self.peak_lr - self.final_lr) * (1.0 + tf.cos(math.pi * progress))
+        return tf.where(step < self.warmup_steps, warm, decay)
+
+    def get_config(self):
+        return {
+            "peak_lr": self.peak_lr,
+            "total_steps": self.total_steps,
+            "warmup_steps": self.warmup_steps,
+            "final_lr": self.final_lr,
+        }
+
+
+class OneCycle(keras.optimizers.schedules.LearningRateSchedule):
+    """Cosine rise from `max_lr / div_factor` to `max_lr` over `pct_start` of the
+    steps, then cosine fall to `max_lr / (div_factor * final_div_factor)`."""
+
+    def __init__(self, max_lr, total_steps, pct_start=0.3, div_factor=25.0, final_div_factor=1e4):
+        super().__init__()
+        self.max_lr = max_lr
+        self.total_steps = total_steps
+        self.pct_start = pct_start
+        self.div_factor = div_factor
+        self.final_div_factor = final_div_factor
+
+    def __call__(self, step):
+        step = tf.cast(step, "float32")
+        start = self.max_lr / self.div_factor
+        end = start / self.final_div_factor
+        up_steps = max(self.total_steps * self.pct_start, 1.0)
+        up = tf.clip_by_value(step / up_steps, 0.0, 1.0)
+        down = tf.clip_by_value((step - up_steps) / max(self.total_steps - up_steps, 1.0), 0.0, 1.0)
+        rising = self.max_lr + 0.5 * (start - self.max_lr) * (1.0 + tf.cos(math.pi * up))
+        falling = end + 0.5 * (self.max_lr - end) * (1.0 + tf.cos(math.pi * down))
+        return tf.where(step < up_steps, rising, falling)
+
+    def get_config(self):
+        return {
+            "max_lr": self.max_lr,
+            "total_steps": self.total_steps,
+            "pct_start": self.pct_start,
+            "div_factor": self.div_factor,
+            "final_div_factor": self.final_div_factor,
+        }
+
+
+def make_schedule(name, lr, total_steps, warmup_steps=0):
+    if name == "cosine":
+        return WarmupCosine(lr, total_steps, warmup_steps)
+    if name == "onecycle":
+        return OneCycle(lr, total_steps)
+    return lr
+
+
+def current_lr(optimizer):
+    lr = optimizer.learning_rate
+    if isinstance(lr, keras.optimizers.schedules.LearningRateSchedule):
+        lr = lr(optimizer.iterations)
+    return float(keras.backend.get_value(lr))
+
+
+"""
+## Target, budget and plateau stopping
+"""
+
+
+class TimeToTarget(keras.callbacks.Callback):
+    """Stops on the target (optional), a budget or a plateau; records time-to-target."""
+
+    def __init__(
+        self,
+        monitor="val_loss",
+        target=None,
+        mode="min",
+        max_seconds=None,
+        max_steps=None,
+        patience=5,
+        min_delta=1e-4,
+        stop_at_target=False,
+    ):
+        super().__init__()
+        self.monitor = monitor
+        self.target = target
+        self.sign = 1.0 if mode == "min" else -1.0
+        self.max_seconds = max_seconds
+        self.max_steps = max_steps
+        self.patience = patience
+        self.min_delta = min_delta
+        self.stop_at_target = stop_at_target
+
+    def on_train_begin(self, logs=None):
+        self.t0 = time.perf_counter()
+        self.steps = 0
+        self.best = None
+        self.wait = 0
+        self.reached = None  # (seconds, steps, epochs) when the target was first met
+        self.stop_reason = None
+        self.history = []
+
+    def stop(self, reason):
+        if self.stop_reason is None:
+            self.stop_reason = reason
+        self.model.stop_training = True
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.steps += 1
+        if self.max_steps and self.steps >= self.max_steps:
+            self.stop("step budget")
+        elif self.max_seconds and time.perf_counter() - self.t0 >= self.max_seconds:
+            self.stop("time budget")
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self.t0
+        value = (logs or {}).get(self.monitor)
+        self.history.append((epoch + 1, elapsed, self.steps, value, current_lr(self.model.optimizer)))
+        if value is None:
+            return
+        value = float(value)
+        if self.reached is None and self.target is not None and self.sign * value <= self.sign * self.target:
+            self.reached = (elapsed, self.steps, epoch + 1)
+            print("target %s %s %g reached after %.1fs, %d steps" % (
+                self.monitor, "<=" if self.sign > 0 else ">=", self.target, elapsed, self.steps))
+            if self.stop_at_target:
+                self.stop("target")
+        if self.best is None or self.sign * (self.best - value) > self.min_delta:
+            self.best = value
+            self.wait = 0
+        else:
+            self.wait += 1
+            if self.patience and self.wait >= self.patience:
+                self.stop("plateau")
+
+    def report(self):
+        seconds = time.perf_counter() - self.t0
+        return {
+            "seconds": seconds,
+            "steps": self.steps,
+            "epochs": len(self.history),
+            "best": self.best,
+            "stop_reason": self.stop_reason or "epoch cap",
+            "target_seconds": None if self.reached is None else self.reached[0],
+            "target_steps": None if self.reached is None else self.reached[1],
+            "target_epochs": None if self.reached is None else self.reached[2],
+        }
+
+
+def fit_to_target(
+    model,
+    train_gen,
+    val_gen,
+    target=None,
+    monitor="val_loss",
+    mode="min",
+    max_epochs=80,
+    max_seconds=None,
+    max_steps=None,
+    patience=5,
+    min_delta=1e-4,
+    stop_at_target=False,
+    callbacks=(),
+):
+    """`model.fit` until a target, budget or plateau; `model` is compiled."""
+    if max_steps:
+        max_epochs = min(max_epochs, -(-max_steps // len(train_gen)))
+    tracker = TimeToTarget(monitor, target, mode, max_seconds, max_steps, patience, min_delta, stop_at_target)
+    model.fit(train_gen, epochs=max_epochs, validation_data=val_gen, callbacks=list(callbacks) + [tracker])
+    return tracker.report()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train to a target metric under a time or step budget.")
+    parser.add_argument("--task", default="seg", choices=sorted(task_compile))
+    parser.add_argument("--builder", default="oxford_pets_image_models:get_model", help="module:function")
+    parser.add_argument("--img-size", type=int, default=160)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--schedule", default="cosine", choices=["cosine", "onecycle", "constant"])
+    parser.add_argument("--lr", type=float, default=1e-3, help="peak learning rate")
+    parser.add_argument("--warmup-epochs", type=float, default=1.0, help="linear warmup (cosine only)")
+    parser.add_argument("--target", type=float, default=None, help="target value of --monitor")
+    parser.add_argument("--monitor", default="val_loss")
+    parser.add_argument("--stop-at-target", action="store_true", help="stop as soon as the target is reached")
+    parser.add_argument("--max-epochs", type=int, default=80)
+    parser.add_argument("--max-minutes", type=float, default=None, help="wall-clock budget")
+    parser.add_argument("--max-steps", type=int, default=None, help="step budget")
+    parser.add_argument("--patience", type=int, default=5, help="epochs without improvement before stopping")
+    parser.add_argument("--min-delta", type=float, default=1e-4)
+    parser.add_argument("--output", default=None, help="save the trained model here (.h5)")
+    args = parser.parse_args()
+
+    img_size = (args.img_size, args.img_size)
+    train_gen, val_gen = get_task_sequences(args.task, args.batch_size, img_size)
+    total_steps = args.max_steps or args.max_epochs * len(train_gen)
+    schedule = make_schedule(args.schedule, args.lr, total_steps, int(args.warmup_epochs * len(train_gen)))
+
+    optimizer, loss, activation = task_compile[args.task]
+    model = build_model(args.builder, img_size, 3, activation)
+    optimizer = {"rmsprop": keras.optimizers.RMSprop, "adam": keras.optimizers.Adam}[optimizer]
+    model.compile(optimizer=optimizer(learning_rate=schedule), loss=loss)
+
+    report = fit_to_target(
+        model,
+        train_gen,
+        val_gen,
+        target=args.target,
+        monitor=args.monitor,
+        max_epochs=args.max_epochs,
+        max_seconds=args.max_minutes * 60.0 if args.max_minutes else None,
+        max_steps=args.max_steps,
+        patience=args.patience,
+        min_delta=args.min_delta,
+        stop_at_target=args.stop_at_target,
+    )
+    if args.output:
+        model.save(args.output)
+
+    reached = report["target_seconds"] is not None
+    print("stopped by %s after %.1fs, %d steps, %d epochs, best %s %.4f" % (
+        report["stop_reason"], report["seconds"], report["steps"], report["epochs"], args.monitor, report["best"]))
+    if args.target is not None:
+        print("time to target: " + ("%.1fs (%d steps)" % (report["target_seconds"], report["target_steps"])
+                                    if reached else "not reached"))
+
+    fw = open("summary-oxford-budget.txt", "a")
+    fw.write("task=%s builder=%s schedule=%s lr=%g batch=%d target=%s time_to_target=%s steps_to_target=%s "
+             "seconds=%.1f steps=%d best=%.4f stop=%s\n" % (
+                 args.task, args.builder, args.schedule, args.lr, args.batch_size, args.target,
+                 "%.1f" % report["target_seconds"] if reached else "-",
+                 report["target_steps"] if reached else "-",
+                 report["seconds"], report["steps"], report["best"], report["stop_reason"].replace(" ", "_")))
+    fw.close()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 27 10:02:44 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Content-addressed prediction cache
+Description: Stores post-processed uint8 predictions on disk, keyed by the
+image content hash, the model weights hash, `img_size` and the
+post-processing options. A hit skips decode and `predict` entirely. Entries
+are compressed .npz files, evicted least-recently-used once the cache grows
+past `max_bytes`.
+"""
+
+import hashlib
+import io
+import os
+import threading
+
+import numpy as np
+
+
+def model_hash(model):
+    """sha256 of the model architecture and every weight array."""
+    h = hashlib.sha256(model.to_json().encode())
+    for w in model.get_weights():
+        h.update(str(w.shape).encode())
+        h.update(np.ascontiguousarray(w).tobytes())
+    return h.hexdigest()
+
+
+class PredictionCache:
+    """Thread-safe on-disk cache of uint8 prediction arrays."""
+
+    def __init__(self, cache_dir, max_bytes, model_digest, options=""):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.prefix = ("%s|%s|" % (model_digest, options)).encode()
+        self.lock = threading.Lock()
+        self.index = {}  # key -> [bytes on disk, last use]
+        self.clock = 0
+        self.total = 0
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0, "bytes_served": 0, "input_bytes_skipped": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        entries = []
+        for sub in os.scandir(cache_dir):
+            if sub.is_dir():
+                for entry in os.scandir(sub.path):
+                    if entry.name.endswith(".npz"):
+                        st = entry.stat()
+                        entries.append((st.st_mtime, entry.name[:-4], st.st_size))
+        # Older files first, so the clock keeps their LRU order
+        for _, key, size in sorted(entries):
+            self.clock += 1
+            self.index[key] = [size, self.clock]
+            self.total += size
+
+    def key(self, content, salt=""):
+        """Cache key of an encoded image (file bytes).
+
+        `salt` carries per-image model inputs that are not in the pixels, such
+        as the breed name of the two-input colour models.
+        """
+        digest = hashlib.sha256(content).digest()
+        return hashlib.sha256(self.prefix + salt.encode() + b"|" + digest).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".npz")
+
+    def get(self, key, input_bytes=0):
+        """Cached array or None. Counts the hit or miss."""
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.clock += 1
+            entry[1] = self.clock
+        try:
+            with np.load(self.path(key)) as f:
+                output = f["output"]
+        except (OSError, KeyError, ValueError):  # evicted or damaged meanwhile
+            with self.lock:
+                self.stats["misses"] += 1
+            return None
+        try:
+            os.utime(self.path(key))
+        except OSError:  # evicted since: the array is already read
+            pass
+        with self.lock:
+            self.stats["hits"] += 1
+            self.stats["bytes_served"] += output.nbytes
+            self.stats["input_bytes_skipped"] += input_bytes
+        return output
+
+    def put(self, key, output):
+        buf = io.BytesIO()
+        np.savez_compressed(buf, output=output)
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = "%s.%d.tmp" % (path, threading.get_ident())
+        with open(tmp, "wb") as f:
+            f.write(buf.getvalue())
+        os.replace(tmp, path)
+        with self.lock:
+            old = self.index.get(key)
+            if old is not None:
+                self.total -= old[0]
+            self.clock += 1
+            self.index[key] = [len(buf.getvalue()), self.clock]
+            self.total += len(buf.getvalue())
+            victims = self.evict_locked() if self.total > self.max_bytes else []
+        for victim in victims:
+            try:
+                os.remove(self.path(victim))
+            except OSError:
+                pass
+
+    def evict_locked(self):
+        """Drops least recently used keys down to 90% of `max_bytes`."""
+        victims = []
+        for key, (size, _) in sorted(self.index.items(), key=lambda kv: kv[1][1]):
+            if self.total <= 0.9 * self.max_bytes:
+                break
+            victims.append(key)
+            self.total -= size
+            del self.index[key]
+        self.stats["evicted"] += len(victims)
+        return victims
+
+    def report(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.index)
+            stats["bytes_on_disk"] = self.total
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
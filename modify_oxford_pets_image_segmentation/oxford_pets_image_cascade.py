@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Nov  3 10:14:29 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Cascaded segmentation inference
+Description: A small model (a distilled student or a lite U-Net, possibly at a
+lower `img_size`) segments every image; its probabilities are upsampled to the
+full resolution and checked per pixel with the softmax margin (top-1 minus
+top-2) or the normalized entropy. Images whose uncertain share passes
+`min_fraction` go to the full U-Net. With `--region` only the uncertain cells
+of a grid are escalated: the full model, rebuilt with dynamic input shape,
+runs on each cell plus `context` pixels around it and its output replaces the
+small model's output in that cell.
+
+Reports the escalated share, img/s against the full model alone and the mIoU
+lost on the validation split.
+
+    python oxford_pets_image_cascade.py oxford_segmentation_student.h5 oxford_segmentation.h5 --margin 0.3
+    python oxford_pets_image_cascade.py oxford_segmentation_student.h5 oxford_segmentation.h5 --entropy 0.5 --region 40
+"""
+
+import argparse
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from oxford_pets_image_data import get_task_sequences
+from oxford_pets_image_dynamic import dynamic_model, size_multiple
+from oxford_pets_image_models import get_task
+
+
+def uncertain_pixels(probs, measure="margin", threshold=0.2):
+    """Boolean (N, H, W): margin below or normalized entropy above `threshold`."""
+    if measure == "margin":
+        top2 = np.partition(probs, -2, axis=-1)[..., -2:]
+        return top2[..., 1] - top2[..., 0] < threshold
+    p = np.clip(probs, 1e-7, 1.0)
+    entropy = -(p * np.log(p)).sum(axis=-1) / np.log(probs.shape[-1])
+    return entropy > threshold
+
+
+def padded_batch(x):
+    """`x` padded to the next power of two, so few batch shapes are traced."""
+    n = 1
+    while n < len(x):
+        n *= 2
+    if n == len(x):
+        return x
+    return np.concatenate([x, np.zeros((n - len(x),) + x.shape[1:], dtype=x.dtype)])
+
+
+class Cascade:
+    def __init__(self, small, full, measure="margin", threshold=0.2, min_fraction=0.02, region=None, context=16):
+        if small.output_shape[-1] != full.output_shape[-1]:
+            raise ValueError("small model outputs %d channels, full model %d: escalated outputs cannot be merged" % (
+                small.output_shape[-1], full.output_shape[-1]))
+        self.small = small
+        self.full = full
+        self.measure = measure
+        self.threshold = threshold
+        self.min_fraction = min_fraction
+        self.region = region
+        self.small_size = tuple(small.inputs[0].shape[1:3])
+        self.img_size = tuple(full.inputs[0].shape[1:3])
+        self.counts = {"images": 0, "escalated_images": 0, "cells": 0, "escalated_cells": 0}
+        if region:
+            # Window of a cell plus context, rounded up to the downsampling factor
+            multiple = size_multiple(full)
+            window = -(-(region + 2 * context) // multiple) * multiple
+            self.window = (min(window, self.img_size[0]), min(window, self.img_size[1]))
+            self.context = context
+            self.full_dynamic = dynamic_model(full)
+
+    def small_probs(self, x):
+        xs = x if self.small_size == self.img_size else tf.image.resize(x, self.small_size)
+        probs = self.small.predict_on_batch(xs)
+        if self.small_size != self.img_size:
+            probs = tf.image.resize(probs, self.img_size)
+        # Own writable copy, escalated images and cells are written into it
+        return np.array(probs, dtype="float32")
+
+    def predict(self, x):
+        """Merged (N, H, W, C) probabilities for a float batch at the full `img_size`."""
+        x = np.asarray(x, dtype="float32")
+        probs = self.small_probs(x)
+        uncertain = uncertain_pixels(probs, self.measure, self.threshold)
+        self.counts["images"] += len(x)
+        if self.region:
+            self.escalate_regions(x, probs, uncertain)
+            return probs
+        escalate = np.flatnonzero(uncertain.mean(axis=(1, 2)) > self.min_fraction)
+        if len(escalate):
+            probs[escalate] = self.full.predict_on_batch(padded_batch(x[escalate]))[: len(escalate)]
+            self.counts["escalated_images"] += len(escalate)
+        return probs
+
+    def escalate_regions(self, x, probs, uncertain):
+        height, width = self.img_size
+        wh, ww = self.window
+        crops = []
+        cells = []
+        for i in range(len(x)):
+            escalated = False
+            for y0 in range(0, height, self.region):
+                for x0 in range(0, width, self.region):
+                    y1 = min(y0 + self.region, height)
+                    x1 = min(x0 + self.region, width)
+                    self.counts["cells"] += 1
+                    if uncertain[i, y0:y1, x0:x1].mean() <= self.min_fraction:
+                        continue
+                    # Window around the cell, shifted to stay inside the image
+                    top = min(max(y0 - self.context, 0), height - wh)
+                    left = min(max(x0 - self.context, 0), width - ww)
+                    crops.append(x[i, top : top + wh, left : left + ww])
+                    cells.append((i, y0, y1, x0, x1, top, left))
+                    escalated = True
+            self.counts["escalated_images"] += escalated
+        self.counts["escalated_cells"] += len(cells)
+        if not cells:
+            return
+        preds = self.full_dynamic.predict_on_batch(padded_batch(np.stack(crops)))
+        for pred, (i, y0, y1, x0, x1, top, left) in zip(preds, cells):
+            probs[i, y0:y1, x0:x1] = pred[y0 - top : y1 - top, x0 - left : x1 - left]
+
+
+"""
+## Escalated share, throughput and IoU lost
+"""
+
+
+def confusion(y, probs):
+    n = probs.shape[-1]
+    true = y.ravel().astype("int64")
+    return np.bincount(true * n + np.argmax(probs, -1).ravel(), minlength=n * n).reshape(n, n)
+
+
+def mean_iou(matrix):
+    inter = np.diag(matrix)
+    union = matrix.sum(0) + matrix.sum(1) - inter
+    return float((inter[union > 0] / union[union > 0]).mean())
+
+
+def compare(cascade, val_gen):
+    runs = {
+        "full": lambda x: cascade.full.predict_on_batch(x),
+        "small": cascade.small_probs,
+        "cascade": cascade.predict,
+    }
+    results = {}
+    for name, run in runs.items():
+        run(val_gen[0][0])  # trace outside the timing
+        for key in cascade.counts:
+            cascade.counts[key] = 0
+        matrix = 0
+        seconds = 0.0
+        n = 0
+        for idx in range(len(val_gen)):
+            x, y = val_gen[idx]
+            t0 = time.perf_counter()
+            probs = run(x)
+            seconds += time.perf_counter() - t0
+            matrix = matrix + confusion(y, probs)
+            n += len(x)
+        results[name] = (n / seconds, mean_iou(matrix))
+
+    counts = cascade.counts
+    print("escalated: %.1f%% of images" % (100.0 * counts["escalated_images"] / max(counts["images"], 1)), end="")
+    if cascade.region:
+        print(", %.1f%% of %dx%d cells" % (
+            100.0 * counts["escalated_cells"] / max(counts["cells"], 1), cascade.region, cascade.region), end="")
+    print()
+    full_speed, full_iou = results["full"]
+    for name, (speed, iou) in results.items():
+        print("  %-8s %8.1f img/s (%5.2fx)  mIoU %.4f  (%+.4f)" % (
+            name, speed, speed / full_speed, iou, iou - full_iou))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Small model first, full U-Net for uncertain images or regions.")
+    parser.add_argument("small", help="small segmentation model (.h5, softmax head)")
+    parser.add_argument("full", help="full segmentation model (.h5, softmax head)")
+    measure = parser.add_mutually_exclusive_group()
+    measure.add_argument("--margin", type=float, default=None, help="uncertain below this top-1 minus top-2")
+    measure.add_argument("--entropy", type=float, default=None, help="uncertain above this normalized entropy")
+    parser.add_argument("--min-fraction", type=float, default=0.02, help="uncertain share that escalates")
+    parser.add_argument("--region", type=int, default=None, help="escalate grid cells of this size only")
+    parser.add_argument("--context", type=int, default=16, help="pixels around an escalated cell")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    small = keras.models.load_model(args.small, compile=False)
+    full = keras.models.load_model(args.full, compile=False)
+    if get_task(small) != "seg" or get_task(full) != "seg":
+        parser.error("both models need a softmax segmentation head")
+    if args.entropy is not None:
+        measure, threshold = "entropy", args.entropy
+    else:
+        measure, threshold = "margin", 0.2 if args.margin is None else args.margin
+
+    try:
+        cascade = Cascade(small, full, measure, threshold, args.min_fraction, args.region, args.context)
+    except ValueError as e:
+        parser.error(str(e))
+    _, val_gen = get_task_sequences("seg", args.batch_size, cascade.img_size)
+    print("uncertain: %s %s %s, escalate above %.1f%% uncertain pixels" % (
+        measure, "<" if measure == "margin" else ">", threshold, 100.0 * args.min_fraction))
+    compare(cascade, val_gen)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Nov  4 09:26:51 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Asynchronous rotating checkpoints
+Description: A callback that replaces `ModelCheckpoint(..., save_best_only=False)`.
+At the end of an epoch it copies the weights and the optimizer state to host
+memory and hands the copy to a background thread, which writes an .npz to a
+temporary file, fsyncs it and renames it into place, so a crash mid-write
+never damages an existing checkpoint. The last `keep_last` checkpoints and the
+`keep_best` best by `monitor` are kept, listed in `<prefix>.json`. The time the
+training loop spent blocked is recorded. On train end the model is also saved
+to `export_path` (atomically) for the scripts that load the .h5.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+from tensorflow import keras
+
+
+def optimizer_variables(optimizer):
+    """Optimizer state variables, for the legacy and the new Keras optimizers."""
+    variables = optimizer.variables
+    return variables() if callable(variables) else variables
+
+
+def atomic_write(path, write):
+    """Calls `write(f)` on a temporary file, fsyncs it and renames it to `path`."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path):
+    """Returns (weights, optimizer weights, meta dict) of a checkpoint .npz."""
+    with np.load(path) as f:
+        meta = json.loads(str(f["meta"]))
+        weights = [f["w_%d" % i] for i in range(meta["n_weights"])]
+        opt_weights = [f["opt_%d" % i] for i in range(meta["n_opt"])]
+    return weights, opt_weights, meta
+
+
+def latest_checkpoint(prefix):
+    """Path of the newest checkpoint listed in `<prefix>.json`, or None."""
+    try:
+        with open(prefix + ".json") as f:
+            entries = json.load(f)["checkpoints"]
+    except (OSError, ValueError):
+        return None
+    if not entries:
+        return None
+    latest = max(entries, key=lambda e: (e["epoch"], e.get("step", 0)))
+    return os.path.join(os.path.dirname(prefix), latest["file"])
+
+
+class AsyncCheckpoint(keras.callbacks.Callback):
+    def __init__(
+        self,
+        prefix,
+        keep_last=3,
+        keep_best=2,
+        monitor="val_loss",
+        mode="min",
+        export_path=None,
+        max_pending=1,
+    ):
+        super().__init__()
+        self.prefix = prefix
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.monitor = monitor
+        self.sign = 1.0 if mode == "min" else -1.0
+        self.export_path = export_path
+        # Optional callable returning more meta for every checkpoint (training state)
+        self.extra_meta = None
+        self.entries = []
+        self.blocked = []
+        self.write_seconds = 0.0
+        self.error = None
+        # A bounded queue: if writes fall behind, the loop waits (and it is counted)
+        self.pending = queue.Queue(max_pending)
+        self.thread = None
+        os.makedirs(os.path.dirname(prefix) or ".", exist_ok=True)
+        try:
+            with open(prefix + ".json") as f:
+                self.entries = json.load(f)["checkpoints"]
+        except (OSError, ValueError):
+            pass
+
+    def on_train_begin(self, logs=None):
+        self.thread = threading.Thread(target=self.writer, daemon=True)
+        self.thread.start()
+
+    def snapshot(self, meta):
+        """Host copies of the model and optimizer state plus `meta`."""
+        weights = self.model.get_weights()
+        opt_weights = [v.numpy() for v in optimizer_variables(self.model.optimizer)]
+        if self.extra_meta is not None:
+            meta = dict(self.extra_meta(meta), **meta)
+        meta = dict(meta, n_weights=len(weights), n_opt=len(opt_weights))
+        return weights, opt_weights, meta
+
+    def save(self, meta):
+        """Snapshots now and queues the write; returns the seconds blocked."""
+        t0 = time.perf_counter()
+        self.pending.put(self.snapshot(meta))
+        blocked = time.perf_counter() - t0
+        self.blocked.append(blocked)
+        return blocked
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self.error is not None:
+            raise self.error
+        value = (logs or {}).get(self.monitor)
+        self.save({"epoch": epoch + 1, "metric": None if value is None else float(value)})
+
+    def writer(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            t0 = time.perf_counter()
+            try:
+                self.write(*item)
+            except Exception as e:  # surfaced on the training thread
+                self.error = e
+            self.write_seconds += time.perf_counter() - t0
+
+    def write(self, weights, opt_weights, meta):
+        name = "%s-epoch%04d" % (os.path.basename(self.prefix), meta["epoch"])
+        if meta.get("step"):
+            name += "-step%06d" % meta["step"]  # saved mid-epoch
+        name += ".npz"
+        path = os.path.join(os.path.dirname(self.prefix), name)
+        arrays = {"w_%d" % i: w for i, w in enumerate(weights)}
+        arrays.update({"opt_%d" % i: w for i, w in enumerate(opt_weights)})
+        arrays["meta"] = np.array(json.dumps(meta))
+        atomic_write(path, lambda f: np.savez(f, **arrays))
+
+        self.entries = [e for e in self.entries if e["file"] != name]
+        self.entries.append(
+            {"file": name, "epoch": meta["epoch"], "step": meta.get("step", 0), "metric": meta.get("metric")}
+        )
+        order = sorted(self.entries, key=lambda e: (e["epoch"], e.get("step", 0)))
+        keep = {e["file"] for e in order[-self.keep_last :]}
+        scored = [e for e in self.entries if e["metric"] is not None]
+        keep |= {e["file"] for e in sorted(scored, key=lambda e: self.sign * e["metric"])[: self.keep_best]}
+        for entry in self.entries:
+            if entry["file"] not in keep:
+                try:
+                    os.remove(os.path.join(os.path.dirname(self.prefix), entry["file"]))
+                except OSError:
+                    pass
+        self.entries = [e for e in self.entries if e["file"] in keep]
+        manifest = json.dumps({"checkpoints": self.entries}, indent=1).encode()
+        atomic_write(self.prefix + ".json", lambda f: f.write(manifest))
+
+    def flush(self):
+        """Waits for queued writes and stops the writer thread."""
+        if self.thread is not None:
+            self.pending.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            raise self.error
+
+    def on_train_end(self, logs=None):
+        self.flush()
+        if self.export_path:
+            t0 = time.perf_counter()
+            root, ext = os.path.splitext(self.export_path)
+            tmp = root + ".tmp" + ext  # keeps the extension that picks the format
+            self.model.save(tmp)
+            os.replace(tmp, self.export_path)
+            self.blocked.append(time.perf_counter() - t0)
+        if self.blocked:
+            print("checkpoints: %d saves, loop blocked %.3fs in total (max %.3fs), %.1fs writing in background" % (
+                len(self.blocked), sum(self.blocked), max(self.blocked), self.write_seconds))
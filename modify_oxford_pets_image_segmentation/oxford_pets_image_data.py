@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 09:12:40 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Shared OxfordPets data helpers
+Description: Path listing, the fixed train/validation split and the `Sequence`
+classes used by the training scripts, importable by the tools in this folder.
+"""
+
+import os
+import random
+
+from tensorflow import keras
+import numpy as np
+from tensorflow.keras.preprocessing.image import load_img
+from sklearn.preprocessing import LabelBinarizer
+
+
+input_dir = "images/"
+target_dir = "annotations/trimaps/"
+val_samples = 1000
+
+
+"""
+## Prepare paths of input images and target segmentation masks
+"""
+
+
+def get_img_paths(input_dir=input_dir, target_dir=target_dir):
+    """Returns sorted (input_img_paths, target_img_paths) like the scripts do."""
+    input_img_paths = sorted(
+        [
+            os.path.join(input_dir, fname)
+            for fname in os.listdir(input_dir)
+            if fname.endswith(".jpg")
+        ]
+    )
+    target_img_paths = sorted(
+        [
+            os.path.join(target_dir, fname)
+            for fname in os.listdir(target_dir)
+            if fname.endswith(".png") and not fname.startswith(".")
+        ]
+    )
+    return input_img_paths, target_img_paths
+
+
+def split_img_paths(input_img_paths, target_img_paths, val_samples=val_samples, seed=1337):
+    """Same shuffle and split as the scripts, without touching the input lists."""
+    input_img_paths = list(input_img_paths)
+    target_img_paths = list(target_img_paths)
+    random.Random(seed).shuffle(input_img_paths)
+    random.Random(seed).shuffle(target_img_paths)
+    train_input_img_paths = input_img_paths[:-val_samples]
+    train_target_img_paths = target_img_paths[:-val_samples]
+    val_input_img_paths = input_img_paths[-val_samples:]
+    val_target_img_paths = target_img_paths[-val_samples:]
+    return (
+        train_input_img_paths,
+        train_target_img_paths,
+        val_input_img_paths,
+        val_target_img_paths,
+    )
+
+
+def breed_name(path):
+    """First token of the file name, as the Rev3/Rev4 breed masks use it."""
+    return os.path.basename(path).split("_")[0]
+
+
+def get_breed_encoder(input_img_paths):
+    """LabelBinarizer over the breed names, fitted in first-seen order."""
+    seen = set()
+    uniq = [
+        name
+        for name in (breed_name(path) for path in input_img_paths)
+        if name not in seen and not seen.add(name)
+    ]
+    encoder = LabelBinarizer()
+    encoder.fit(uniq)
+    return encoder, len(uniq)
+
+
+"""
+## Prepare `Sequence` class to load & vectorize batches of data
+"""
+
+
+class OxfordPets(keras.utils.Sequence):
+    """Helper to iterate over the data (as Numpy arrays)."""
+
+    def __init__(self, batch_size, img_size, input_img_paths, target_img_paths):
+        self.batch_size = batch_size
+        self.img_size = img_size
+        self.input_img_paths = input_img_paths
+        self.target_img_paths = target_img_paths
+
+    def __len__(self):
+        return len(self.target_img_paths) // self.batch_size
+
+    def __getitem__(self, idx):
+        """Returns tuple (input, target) correspond to batch #idx."""
+        i = idx * self.batch_size
+        batch_input_img_paths = self.input_img_paths[i : i + self.batch_size]
+        batch_target_img_paths = self.target_img_paths[i : i + self.batch_size]
+        x = np.zeros((self.batch_size,) + self.img_size + (3,), dtype="float32")
+        for j, path in enumerate(batch_input_img_paths):
+            img = load_img(path, target_size=self.img_size)
+            x[j] = img
+        y = np.zeros((self.batch_size,) + self.img_size + (1,), dtype="uint8")
+        for j, path in enumerate(batch_target_img_paths):
+            img = load_img(path, target_size=self.img_size, color_mode="grayscale")
+            y[j] = np.expand_dims(img, 2)
+            # Ground truth labels are 1, 2, 3. Subtract one to make them 0, 1, 2:
+            y[j] -= 1
+        return x, y
+
+
+class OxfordPetsMod2(keras.utils.Sequence):
+    """Helper to iterate over the data (as Numpy arrays), RGB uint8 targets."""
+
+    def __init__(self, batch_size, img_size, input_img_paths, target_img_paths):
+        self.batch_size = batch_size
+        self.img_size = img_size
+        self.input_img_paths = input_img_paths
+        self.target_img_paths = target_img_paths
+
+    def __len__(self):
+        return len(self.target_img_paths) // self.batch_size
+
+    def __getitem__(self, idx):
+        """Returns tuple (input, target) correspond to batch #idx."""
+        i = idx * self.batch_size
+        batch_input_img_paths = self.input_img_paths[i : i + self.batch_size]
+        batch_target_img_paths = self.target_img_paths[i : i + self.batch_size]
+        x = np.zeros((self.batch_size,) + self.img_size + (3,), dtype="uint8")
+        for j, path in enumerate(batch_input_img_paths):
+            img = load_img(path, target_size=self.img_size)
+            x[j] = img
+        y = np.zeros((self.batch_size,) + self.img_size + (3,), dtype="uint8")
+        for j, path in enumerate(batch_target_img_paths):
+            img = load_img(path, target_size=self.img_size)
+            y[j] = img
+        return x, y
+
+
+class OxfordPetsMod5(keras.utils.Sequence):
+    """Helper to iterate over the data, ([image, breed mask], image) batches."""
+
+    def __init__(self, batch_size, img_size, input_img_paths, target_img_paths, encoder, n_uniq):
+        self.batch_size = batch_size
+        self.img_size = img_size
+        self.input_img_paths = input_img_paths
+        self.target_img_paths = target_img_paths
+        self.encoder = encoder
+        self.n_uniq = n_uniq
+
+    def __len__(self):
+        return len(self.target_img_paths) // self.batch_size
+
+    def __getitem__(self, idx):
+        """Returns tuple ([input, mask_label], input) correspond to batch #idx."""
+        i = idx * self.batch_size
+        batch_input_img_paths = self.input_img_paths[i : i + self.batch_size]
+        x = np.zeros((self.batch_size,) + self.img_size + (3,), dtype="uint8")
+        mask_label = np.zeros((self.batch_size,) + self.img_size + (self.n_uniq,), dtype="uint8")
+        for j, path in enumerate(batch_input_img_paths):
+            img = load_img(path, target_size=self.img_size)
+            x[j] = img
+            # One-hot breed label broadcast over every pixel
+            mask_label[j] = self.encoder.transform([breed_name(path)])[0]
+        return [x, mask_label], x
+
+
+def get_task_sequences(task, batch_size, img_size, n_uniq=None, color_target="image"):
+    """Returns (train_gen, val_gen) for a task from `models.get_task`.
+
+    Colour models regress the input image itself (the GEN_color scripts) or,
+    with `color_target="trimap"`, the RGB trimap (segmentation_Rev1).
+    """
+    input_img_paths, target_img_paths = get_img_paths()
+    (
+        train_input_img_paths,
+        train_target_img_paths,
+        val_input_img_paths,
+        val_target_img_paths,
+    ) = split_img_paths(input_img_paths, target_img_paths)
+
+    if task == "seg":
+        train_gen = OxfordPets(batch_size, img_size, train_input_img_paths, train_target_img_paths)
+        val_gen = OxfordPets(batch_size, img_size, val_input_img_paths, val_target_img_paths)
+    elif task == "color2":
+        encoder, n_found = get_breed_encoder(input_img_paths)
+        if n_uniq is not None and n_uniq != n_found:
+            raise ValueError("model expects %d breed channels, found %d" % (n_uniq, n_found))
+        train_gen = OxfordPetsMod5(
+            batch_size, img_size, train_input_img_paths, train_input_img_paths, encoder, n_found
+        )
+        val_gen = OxfordPetsMod5(
+            batch_size, img_size, val_input_img_paths, val_input_img_paths, encoder, n_found
+        )
+    else:
+        if color_target == "trimap":
+            train_targets, val_targets = train_target_img_paths, val_target_img_paths
+        else:
+            train_targets, val_targets = train_input_img_paths, val_input_img_paths
+        train_gen = OxfordPetsMod2(batch_size, img_size, train_input_img_paths, train_targets)
+        val_gen = OxfordPetsMod2(batch_size, img_size, val_input_img_paths, val_targets)
+    return train_gen, val_gen
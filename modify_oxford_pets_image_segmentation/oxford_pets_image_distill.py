@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 10:16:27 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Knowledge distillation of trained U-Nets into small students
+Description: Trains a small `get_model_lite` student on the outputs of a
+trained teacher (`oxford_segmentation.h5`, `oxford_gen_color_r*.h5`). The
+segmentation target is the teacher softmax (softened with a temperature and
+mixed with the hard trimap labels), the colour target is the teacher
+regression output. Intermediate teacher features can be matched too.
+Teacher outputs are written once to a .npy cache and read back every epoch.
+
+    python oxford_pets_image_distill.py oxford_segmentation.h5 --features
+    python oxford_pets_image_distill.py oxford_gen_color_r4.h5 --encoder-filters 32,64 --decoder-filters 64,32,16
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+
+from oxford_pets_image_cache import model_hash
+from oxford_pets_image_data import get_task_sequences
+from oxford_pets_image_models import count_macs, get_model_lite, get_task
+
+
+"""
+## Cache teacher outputs once
+"""
+
+
+def open_cache(path, shape, dtype="float16"):
+    """Returns (array, done). A finished cache of the right shape is opened read-only."""
+    if os.path.exists(path + ".done"):
+        array = np.load(path, mmap_mode="r")
+        if array.shape == shape and array.dtype == dtype:
+            return array, True
+        del array
+        os.remove(path + ".done")
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape), False
+
+
+def cache_teacher(teacher, gen, cache_dir, prefix, feature_layers):
+    """Runs `teacher` over `gen` once and memory-maps its output and features.
+
+    The file names carry a hash of the teacher weights, the samples, the batch
+    and image size and the feature layers, so changing any of them recomputes.
+    """
+    outputs = [teacher.output] + [teacher.get_layer(name).output for name in feature_layers]
+    probe = keras.Model(teacher.inputs, outputs)
+    n = len(gen) * gen.batch_size
+    key = hashlib.sha256(model_hash(teacher).encode())
+    key.update(json.dumps([
+        gen.batch_size, list(gen.img_size), list(gen.input_img_paths), list(feature_layers),
+        [list(t.shape[1:]) for t in outputs],
+    ]).encode())
+    prefix = "%s_%s" % (prefix, key.hexdigest()[:16])
+    caches = []
+    done = True
+    for k, tensor in enumerate(outputs):
+        path = os.path.join(cache_dir, "%s_%d.npy" % (prefix, k))
+        array, ready = open_cache(path, (n,) + tuple(tensor.shape[1:]))
+        caches.append((path, array))
+        done = done and ready
+    if done:
+        return [array for _, array in caches]
+
+    t0 = time.perf_counter()
+    for idx in range(len(gen)):
+        preds = probe.predict_on_batch(gen[idx][0])
+        preds = preds if isinstance(preds, list) else [preds]
+        i = idx * gen.batch_size
+        for (_, array), pred in zip(caches, preds):
+            array[i : i + gen.batch_size] = pred
+    for path, array in caches:
+        array.flush()
+        open(path + ".done", "w").close()
+    print("cached %s: %d samples in %.1fs" % (prefix, n, time.perf_counter() - t0))
+    return [np.load(path, mmap_mode="r") for path, _ in caches]
+
+
+class DistillSequence(keras.utils.Sequence):
+    """Pairs the batches of `gen` with the cached teacher outputs.
+
+    The first target packs the teacher output and the ground truth along the
+    channel axis for `distill_loss`, the rest are the teacher features.
+    """
+
+    def __init__(self, gen, caches):
+        self.gen = gen
+        self.caches = caches
+
+    def __len__(self):
+        return len(self.gen)
+
+    def __getitem__(self, idx):
+        x, y = self.gen[idx]
+        i = idx * self.gen.batch_size
+        batch = [np.asarray(c[i : i + self.gen.batch_size], dtype="float32") for c in self.caches]
+        targets = [np.concatenate([batch[0], np.asarray(y, dtype="float32")], axis=-1)] + batch[1:]
+        return x, targets if len(targets) > 1 else targets[0]
+
+
+"""
+## Student and losses
+"""
+
+
+def distill_loss(task, channels, temperature, alpha):
+    """Soft-target loss on the teacher output plus `alpha` x ground-truth loss."""
+
+    def seg_loss(y_true, logits):
+        teacher = y_true[..., :channels]
+        labels = tf.cast(y_true[..., channels], "int32")
+        soft = tf.nn.softmax(tf.math.log(tf.maximum(teacher, 1e-8)) / temperature)
+        kd = keras.losses.categorical_crossentropy(soft, logits / temperature, from_logits=True)
+        hard = keras.losses.sparse_categorical_crossentropy(labels, logits, from_logits=True)
+        return (1.0 - alpha) * kd * temperature**2 + alpha * hard
+
+    def color_loss(y_true, pred):
+        teacher = y_true[..., :channels]
+        target = y_true[..., channels:]
+        return (1.0 - alpha) * keras.losses.mae(teacher, pred) + alpha * keras.losses.mae(target, pred)
+
+    return seg_loss if task == "seg" else color_loss
+
+
+def last_add_at(model, height):
+    """Name of the last Add layer whose output has spatial size `height`."""
+    names = [
+        layer.name
+        for layer in model.layers
+        if isinstance(layer, layers.Add) and layer.output_shape[1] == height
+    ]
+    if not names:
+        raise ValueError("%s has no Add layer at %dx%d, pass --feature-layers" % (model.name, height, height))
+    return names[-1]
+
+
+"""
+## Train
+"""
+
+
+def evaluate(model, gen, task):
+    """mIoU for segmentation, MAE for colour, over the whole of `gen`."""
+    total = 0.0
+    count = 0
+    confusion = 0
+    for idx in range(len(gen)):
+        x, y = gen[idx]
+        pred = model.predict_on_batch(x)
+        if task == "seg":
+            n = pred.shape[-1]
+            true = y.ravel().astype("int64")
+            confusion = confusion + np.bincount(
+                true * n + np.argmax(pred, -1).ravel(), minlength=n * n
+            ).reshape(n, n)
+        else:
+            total += np.abs(pred - y.astype("float32")).sum()
+            count += pred.size
+    if task == "seg":
+        inter = np.diag(confusion)
+        union = confusion.sum(0) + confusion.sum(1) - inter
+        return float((inter[union > 0] / union[union > 0]).mean())
+    return total / count
+
+
+def latency(model, x, repeats=20):
+    model.predict_on_batch(x)
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        model.predict_on_batch(x)
+    return (time.perf_counter() - t0) / repeats
+
+
+def distill(args):
+    teacher = keras.models.load_model(args.teacher, compile=False)
+    task = get_task(teacher)
+    img_size = tuple(teacher.inputs[0].shape[1:3])
+    channels = teacher.output_shape[-1]
+    extra_channels = teacher.inputs[1].shape[-1] if task == "color2" else None
+    train_gen, val_gen = get_task_sequences(task, args.batch_size, img_size, extra_channels, args.color_target)
+
+    student = get_model_lite(
+        img_size,
+        channels,
+        activation="linear",
+        reduction=args.reduction,
+        encoder_filters=args.encoder_filters,
+        decoder_filters=args.decoder_filters,
+        entry_filters=args.entry_filters,
+        extra_channels=extra_channels,
+    )
+
+    feature_layers = args.feature_layers
+    if args.features and not feature_layers:
+        feature_layers = [last_add_at(teacher, img_size[0] // 8)]
+    outputs = [student.output]
+    for name in feature_layers:
+        # 1x1 adapter maps the student feature onto the teacher channel count
+        feature = teacher.get_layer(name).output
+        hint = student.get_layer(last_add_at(student, feature.shape[1])).output
+        outputs.append(layers.Conv2D(feature.shape[-1], 1, name="adapter_" + name)(hint))
+    train_model = keras.Model(student.inputs, outputs)
+
+    os.makedirs(args.cache_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(args.teacher))[0]
+    train_cache = cache_teacher(teacher, train_gen, args.cache_dir, stem + "_train", feature_layers)
+    val_cache = cache_teacher(teacher, val_gen, args.cache_dir, stem + "_val", feature_layers)
+
+    losses = [distill_loss(task, channels, args.temperature, args.alpha)]
+    losses += ["mse"] * len(feature_layers)
+    train_model.compile(
+        optimizer=keras.optimizers.Adam(args.lr),
+        loss=losses,
+        loss_weights=[1.0] + [args.feature_weight] * len(feature_layers),
+    )
+    weights_path = os.path.join(args.cache_dir, stem + "_student.weights.h5")
+    callbacks = [
+        keras.callbacks.ModelCheckpoint(weights_path, save_best_only=True, save_weights_only=True)
+    ]
+    train_model.fit(
+        DistillSequence(train_gen, train_cache),
+        epochs=args.epochs,
+        validation_data=DistillSequence(val_gen, val_cache),
+        callbacks=callbacks,
+    )
+    train_model.load_weights(weights_path)
+
+    # Same head type as the teacher, without the adapters
+    outputs = student.output
+    if task == "seg":
+        outputs = layers.Activation("softmax")(outputs)
+    student = keras.Model(student.inputs, outputs)
+    out_path = args.output or os.path.splitext(args.teacher)[0] + "_student.h5"
+    student.save(out_path)
+    print("saved", out_path)
+
+    metric = "mIoU" if task == "seg" else "MAE"
+    x = val_gen[0][0]
+    for name, model in [("teacher", teacher), ("student", student)]:
+        print("%-8s params %9d  GMACs %7.3f  ms/batch %8.2f  val %s %.4f" % (
+            name, model.count_params(), sum(count_macs(model).values()) / 1e9,
+            1e3 * latency(model, x), metric, evaluate(model, val_gen, task)))
+
+
+def int_list(text):
+    return tuple(int(v) for v in text.split(",") if v)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distill a trained U-Net into a small student.")
+    parser.add_argument("teacher", help="trained oxford_*.h5 teacher")
+    parser.add_argument("--output", default=None, help="student .h5 (default <teacher>_student.h5)")
+    parser.add_argument("--entry-filters", type=int, default=16)
+    parser.add_argument("--encoder-filters", type=int_list, default=(32, 64, 128))
+    parser.add_argument("--decoder-filters", type=int_list, default=None,
+                        help="one stage more than --encoder-filters (default: the encoder reversed, then half its first)")
+    parser.add_argument("--reduction", type=int, default=1, help="decoder channel reduction")
+    parser.add_argument("--temperature", type=float, default=2.0, help="softmax temperature (segmentation)")
+    parser.add_argument("--alpha", type=float, default=0.1, help="weight of the ground-truth loss")
+    parser.add_argument("--features", action="store_true", help="also match an intermediate teacher feature")
+    parser.add_argument("--feature-layers", type=lambda s: s.split(","), default=[], help="teacher layer names")
+    parser.add_argument("--feature-weight", type=float, default=0.1)
+    parser.add_argument("--epochs", type=int, default=15)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--cache-dir", default="distill_cache/", help="teacher output cache")
+    parser.add_argument("--color-target", choices=["image", "trimap"], default="image")
+    args = parser.parse_args()
+    if args.decoder_filters is None:
+        args.decoder_filters = args.encoder_filters[::-1] + (max(args.encoder_filters[0] // 2, 1),)
+    if len(args.decoder_filters) != len(args.encoder_filters) + 1:
+        parser.error("--decoder-filters needs %d stages for %d encoder stages" % (
+            len(args.encoder_filters) + 1, len(args.encoder_filters)))
+    distill(args)
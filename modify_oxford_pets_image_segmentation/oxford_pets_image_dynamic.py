@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Nov  2 09:37:48 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Dynamic-shape inference with shape buckets
+Description: Rebuilds a trained model with `(None, None, 3)` inputs, so it runs
+at the native resolution of each image, and groups images into a few padded
+(height, width) buckets with power-of-two batch sizes. Every bucket and batch
+size is traced once; images are edge-padded into their bucket and the output
+is cropped back. Trace counts and latency per bucket are reported, next to
+`model.predict` on the fixed-size model with changing batch sizes.
+
+    python oxford_pets_image_dynamic.py oxford_segmentation.h5 --images images/ --limit 300
+"""
+
+import argparse
+import collections
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+from tensorflow import keras
+
+from oxford_pets_image_graph import rebuild
+
+default_buckets = "160x160,256x256,384x384,512x512,384x256,256x384,512x384,384x512"
+
+
+def dynamic_model(model):
+    """`model` rebuilt with unknown height and width on every input."""
+    config = model.get_config()
+    for layer in config["layers"]:
+        if layer["class_name"] == "InputLayer":
+            shape = layer["config"]["batch_input_shape"]
+            layer["config"]["batch_input_shape"] = (None, None, None, shape[-1])
+    return rebuild(model, config)
+
+
+def size_multiple(model):
+    """Input size divisor that keeps every downsampled feature map whole."""
+    height = model.inputs[0].shape[1]
+    smallest = min(
+        layer.output_shape[1]
+        for layer in model.layers
+        if isinstance(layer.output_shape, tuple) and len(layer.output_shape) == 4
+    )
+    return height // smallest
+
+
+def parse_buckets(text, multiple):
+    buckets = []
+    for item in text.split(","):
+        h, w = (int(v) for v in item.split("x"))
+        if h % multiple or w % multiple:
+            raise ValueError("bucket %s is not a multiple of %d" % (item, multiple))
+        buckets.append((h, w))
+    return sorted(buckets, key=lambda b: (b[0] * b[1], b))
+
+
+class BucketedPredictor:
+    """Runs images of any size through a dynamic-shape model in padded buckets.
+
+    Images larger than every bucket are shrunk (keeping the aspect ratio) into
+    the largest one that holds their orientation; their outputs come back at
+    the shrunk size.
+    """
+
+    def __init__(self, model, buckets, max_batch=8):
+        self.model = model if model.inputs[0].shape[1] is None else dynamic_model(model)
+        self.buckets = buckets
+        self.max_batch = max_batch
+        self.traces = collections.Counter()
+        self.times = collections.defaultdict(list)
+        self.images = collections.Counter()
+        self.fn = tf.function(self.run)
+
+    def run(self, *x):
+        # Python side effect: only runs while tracing
+        self.traces[tuple(x[0].shape[:3])] += 1
+        x = [tf.cast(t, tf.float32) for t in x]
+        return self.model(x if len(x) > 1 else x[0], training=False)
+
+    def bucket_for(self, h, w):
+        for bh, bw in self.buckets:
+            if h <= bh and w <= bw:
+                return (bh, bw)
+        same = [b for b in self.buckets if (b[0] >= b[1]) == (h >= w)] or self.buckets
+        return max(same, key=lambda b: min(b[0] / h, b[1] / w))
+
+    def fit(self, image, bucket):
+        h, w = image.shape[:2]
+        if h > bucket[0] or w > bucket[1]:
+            scale = min(bucket[0] / h, bucket[1] / w)
+            size = (max(1, int(w * scale)), max(1, int(h * scale)))
+            image = np.asarray(Image.fromarray(image).resize(size, Image.BILINEAR))
+        return image
+
+    def predict(self, images, extras=None):
+        """Float outputs cropped to each (possibly shrunk) image.
+
+        `extras` are optional per-image vectors broadcast over the bucket as
+        a second input, such as the breed one-hot of `get_model2`.
+        """
+        groups = collections.defaultdict(list)
+        for i, image in enumerate(images):
+            groups[self.bucket_for(*image.shape[:2])].append(i)
+        outputs = [None] * len(images)
+        for bucket, indices in groups.items():
+            for start in range(0, len(indices), self.max_batch):
+                chunk = indices[start : start + self.max_batch]
+                batch = 1
+                while batch < len(chunk):
+                    batch *= 2
+                x = np.zeros((batch,) + bucket + (3,), dtype="uint8")
+                fitted = []
+                for j, i in enumerate(chunk):
+                    image = self.fit(images[i], bucket)
+                    h, w = image.shape[:2]
+                    x[j] = np.pad(image, ((0, bucket[0] - h), (0, bucket[1] - w), (0, 0)), mode="edge")
+                    fitted.append((h, w))
+                inputs = [x]
+                if extras is not None:
+                    mask = np.zeros((batch,) + bucket + (len(extras[chunk[0]]),), dtype="uint8")
+                    for j, i in enumerate(chunk):
+                        mask[j] = extras[i]
+                    inputs.append(mask)
+                t0 = time.perf_counter()
+                preds = self.fn(*inputs).numpy()
+                self.times[bucket + (batch,)].append(time.perf_counter() - t0)
+                self.images[bucket] += len(chunk)
+                for j, i in enumerate(chunk):
+                    h, w = fitted[j]
+                    outputs[i] = preds[j, :h, :w]
+        return outputs
+
+    def report(self):
+        print("%-12s %6s %6s %7s %10s %10s" % ("bucket", "batch", "calls", "traces", "ms/call", "ms/image"))
+        for key in sorted(self.times):
+            bucket, batch = key[:2], key[2]
+            times = self.times[key]
+            # The first call of a shape includes its trace
+            steady = times[1:] or times
+            print("%-12s %6d %6d %7d %10.2f %10.2f" % (
+                "%dx%d" % bucket, batch, len(times), self.traces[(batch,) + bucket],
+                1e3 * np.mean(steady), 1e3 * np.mean(steady) / batch))
+        print("total traces: %d for %d images" % (sum(self.traces.values()), sum(self.images.values())))
+
+
+def load_native(path):
+    with Image.open(path) as img:
+        return np.asarray(img.convert("RGB"), dtype="uint8")
+
+
+def fixed_predict_traces(model, images, batch_sizes=(3, 1, 2, 3, 1, 4)):
+    """Tracing count of `model.predict` when the batch size keeps changing."""
+    img_size = tuple(model.inputs[0].shape[1:3])
+    x = np.stack([np.asarray(Image.fromarray(image).resize(img_size[::-1])) for image in images[: max(batch_sizes)]])
+    t0 = time.perf_counter()
+    for n in batch_sizes:
+        model.predict(x[:n], verbose=0)
+    seconds = time.perf_counter() - t0
+    return model.predict_function.experimental_get_tracing_count(), seconds, sum(batch_sizes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Native-resolution inference in padded shape buckets.")
+    parser.add_argument("model", help="trained single-input oxford_*.h5")
+    parser.add_argument("--images", default="images/")
+    parser.add_argument("--limit", type=int, default=300)
+    parser.add_argument("--buckets", default=default_buckets, help="comma separated HxW")
+    parser.add_argument("--max-batch", type=int, default=8)
+    args = parser.parse_args()
+
+    model = keras.models.load_model(args.model, compile=False)
+    if len(model.inputs) > 1:
+        parser.error("the benchmark feeds images only, use BucketedPredictor(...).predict(images, extras)")
+    multiple = size_multiple(model)
+    buckets = parse_buckets(args.buckets, multiple)
+    paths = sorted(os.path.join(args.images, f) for f in os.listdir(args.images) if f.endswith(".jpg"))
+    images = [load_native(path) for path in paths[: args.limit]]
+
+    predictor = BucketedPredictor(model, buckets, args.max_batch)
+    t0 = time.perf_counter()
+    predictor.predict(images)
+    seconds = time.perf_counter() - t0
+    print("%d native-size images in %.2fs (%.1f img/s), sizes multiple of %d" % (
+        len(images), seconds, len(images) / seconds, multiple))
+    predictor.report()
+
+    traces, seconds, n = fixed_predict_traces(model, images)
+    print("fixed %s model.predict, changing batch sizes: %d traces, %d images in %.2fs" % (
+        tuple(model.inputs[0].shape[1:3]), traces, n, seconds))
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Nov 12 09:51:38 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Streaming validation metrics
+Description: Streams the batches of a validation Sequence through the model and
+accumulates the metrics in-graph, so memory stays at one batch whatever the
+size of the split (`model.predict(val_gen)` holds every prediction, about 1 GB
+of float32 for the 10-channel segmentation model). Segmentation accumulates a
+confusion matrix and reports per-class IoU, mean IoU, per-class Dice and pixel
+accuracy. Colour models accumulate the absolute and squared errors and report
+MAE and PSNR (over the whole split and averaged per image).
+
+    python oxford_pets_image_evaluate.py oxford_segmentation.h5 --num-classes 3
+    python oxford_pets_image_evaluate.py oxford_gen_color_r4.h5
+"""
+
+import argparse
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from oxford_pets_image_data import get_task_sequences
+from oxford_pets_image_models import get_task
+
+
+class StreamingEval:
+    """Accumulates metrics of `model` batch by batch.
+
+    For segmentation the argmax is taken over the first `num_classes` output
+    channels (default: all of them), which are the labels of the trimaps.
+    """
+
+    def __init__(self, model, task, num_classes=None, max_value=255.0):
+        self.model = model
+        self.task = task
+        self.max_value = max_value
+        if task == "seg":
+            self.num_classes = num_classes or int(model.outputs[0].shape[-1])
+            self.confusion = tf.Variable(tf.zeros((self.num_classes, self.num_classes), "int64"), trainable=False)
+        else:
+            self.abs_error = tf.Variable(0.0, dtype="float64", trainable=False)
+            self.sq_error = tf.Variable(0.0, dtype="float64", trainable=False)
+            self.psnr_sum = tf.Variable(0.0, dtype="float64", trainable=False)
+            self.values = tf.Variable(0, dtype="int64", trainable=False)
+            self.images = tf.Variable(0, dtype="int64", trainable=False)
+
+    def reset(self):
+        for variable in self.variables():
+            variable.assign(tf.zeros_like(variable))
+
+    def variables(self):
+        if self.task == "seg":
+            return [self.confusion]
+        return [self.abs_error, self.sq_error, self.psnr_sum, self.values, self.images]
+
+    @tf.function
+    def update(self, x, y):
+        pred = self.model(x, training=False)
+        if self.task == "seg":
+            labels = tf.reshape(tf.cast(y, "int64"), [-1])
+            classes = tf.reshape(tf.argmax(pred[..., : self.num_classes], axis=-1), [-1])
+            self.confusion.assign_add(
+                tf.math.confusion_matrix(labels, classes, num_classes=self.num_classes, dtype="int64")
+            )
+            return
+        diff = tf.cast(pred, "float64") - tf.cast(y, "float64")
+        per_image = tf.reduce_mean(tf.square(diff), axis=tf.range(1, tf.rank(diff)))
+        per_image_psnr = 10.0 * tf.math.log(self.max_value**2 / tf.maximum(per_image, 1e-12)) / np.log(10.0)
+        self.abs_error.assign_add(tf.reduce_sum(tf.abs(diff)))
+        self.sq_error.assign_add(tf.reduce_sum(tf.square(diff)))
+        self.psnr_sum.assign_add(tf.reduce_sum(per_image_psnr))
+        self.values.assign_add(tf.size(diff, out_type="int64"))
+        self.images.assign_add(tf.shape(diff, out_type="int64")[0])
+
+    def result(self):
+        if self.task == "seg":
+            return confusion_metrics(self.confusion.numpy())
+        values = max(int(self.values.numpy()), 1)
+        mse = float(self.sq_error.numpy()) / values
+        return {
+            "mae": float(self.abs_error.numpy()) / values,
+            "psnr": 10.0 * np.log10(self.max_value**2 / max(mse, 1e-12)),
+            "psnr_per_image": float(self.psnr_sum.numpy()) / max(int(self.images.numpy()), 1),
+        }
+
+
+def confusion_metrics(matrix):
+    """Per-class IoU and Dice, mean IoU and pixel accuracy of a confusion matrix
+    (rows: labels, columns: predictions). Classes absent from both are skipped."""
+    matrix = np.asarray(matrix, dtype="float64")
+    inter = np.diag(matrix)
+    labelled = matrix.sum(1)
+    predicted = matrix.sum(0)
+    union = labelled + predicted - inter
+    present = union > 0
+    iou = np.where(present, inter / np.maximum(union, 1), np.nan)
+    dice = np.where(present, 2 * inter / np.maximum(labelled + predicted, 1), np.nan)
+    return {
+        "iou": iou,
+        "mean_iou": float(np.nanmean(iou)),
+        "dice": dice,
+        "mean_dice": float(np.nanmean(dice)),
+        "pixel_accuracy": float(inter.sum() / max(matrix.sum(), 1)),
+        "confusion": matrix.astype("int64"),
+    }
+
+
+def evaluate_streaming(model, gen, task=None, num_classes=None):
+    """Metrics of `model` over every batch of `gen`, at constant memory."""
+    evaluator = StreamingEval(model, task or get_task(model), num_classes)
+    for idx in range(len(gen)):
+        x, y = gen[idx]
+        evaluator.update(x, y)
+    return evaluator.result()
+
+
+def print_metrics(metrics):
+    if "iou" in metrics:
+        print("IoU per class: %s" % np.array2string(metrics["iou"], precision=4))
+        print("Dice per class: %s" % np.array2string(metrics["dice"], precision=4))
+        print("mIoU %.4f  mean Dice %.4f  pixel accuracy %.4f" % (
+            metrics["mean_iou"], metrics["mean_dice"], metrics["pixel_accuracy"]))
+    else:
+        print("MAE %.3f  PSNR %.2f dB  (per image %.2f dB)" % (
+            metrics["mae"], metrics["psnr"], metrics["psnr_per_image"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming IoU/Dice or MAE/PSNR over the validation split.")
+    parser.add_argument("model", help="trained model (.h5)")
+    parser.add_argument("--num-classes", type=int, default=None, help="labels to score (default: output channels)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    model = keras.models.load_model(args.model, compile=False)
+    task = get_task(model)
+    if task == "color2":
+        n_uniq = int(model.inputs[1].shape[-1])
+        _, val_gen = get_task_sequences(task, args.batch_size, tuple(model.inputs[0].shape[1:3]), n_uniq)
+    else:
+        _, val_gen = get_task_sequences(task, args.batch_size, tuple(model.inputs[0].shape[1:3]))
+    print_metrics(evaluate_streaming(model, val_gen, task, args.num_classes))
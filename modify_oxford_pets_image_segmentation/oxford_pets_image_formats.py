@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 30 09:55:17 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Compact mask output formats
+Description: Label-map writers that replace the autocontrast PNG per output
+channel the scripts dump: palette (P-mode) PNGs, COCO-style RLE (one binary
+RLE per class, column-major, COCO's compressed count string) and a single
+packed archive with the labels stored at 2 bits per pixel behind a JSON index.
+The benchmark encodes and decodes the predictions of a trained model in every
+format and compares them with the per-channel PNG dump.
+
+    python oxford_pets_image_formats.py oxford_segmentation.h5 --images images/ --limit 200
+"""
+
+import argparse
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+from PIL import Image, ImageOps
+from tensorflow import keras
+from tensorflow.keras.preprocessing.image import load_img
+
+
+"""
+## Palette PNG
+"""
+
+def make_palette(num_classes):
+    """Evenly spaced grey levels for labels 0..num_classes-1: for three, the
+    0, 127, 255 the autocontrast masks of the scripts show."""
+    if not 1 <= num_classes <= 256:
+        raise ValueError("a palette holds 1 to 256 labels, not %d" % num_classes)
+    levels = [i * 255 // max(num_classes - 1, 1) for i in range(num_classes)]
+    return [level for level in levels for _ in range(3)] + [0] * (3 * (256 - num_classes))
+
+
+def encode_palette_png(labels, num_classes=3):
+    if labels.size and int(labels.max()) >= num_classes:
+        raise ValueError("label %d is outside the %d-class palette" % (labels.max(), num_classes))
+    img = Image.fromarray(labels, mode="P")
+    img.putpalette(make_palette(num_classes))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=False)
+    return buf.getvalue()
+
+
+def decode_palette_png(data):
+    with Image.open(io.BytesIO(data)) as img:
+        return np.asarray(img, dtype="uint8")
+
+
+"""
+## COCO-style RLE
+"""
+
+
+def rle_counts(mask):
+    """Run lengths of a binary mask in column-major order, zeros first."""
+    flat = mask.ravel(order="F").astype(bool)
+    change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate([[0], change, [flat.size]]))
+    if flat.size and flat[0]:
+        counts = np.concatenate([[0], counts])
+    return counts.tolist()
+
+
+def counts_to_string(counts):
+    """COCO's compressed counts: deltas to the count two back, 5 bits a char."""
+    chars = []
+    for i, x in enumerate(counts):
+        if i > 2:
+            x -= counts[i - 2]
+        more = True
+        while more:
+            c = x & 0x1F
+            x >>= 5
+            more = x != -1 if c & 0x10 else x != 0
+            if more:
+                c |= 0x20
+            chars.append(chr(c + 48))
+    return "".join(chars)
+
+
+def string_to_counts(s):
+    counts = []
+    p = 0
+    while p < len(s):
+        x = 0
+        k = 0
+        more = True
+        while more:
+            c = ord(s[p]) - 48
+            x |= (c & 0x1F) << (5 * k)
+            more = c & 0x20
+            p += 1
+            k += 1
+            if not more and c & 0x10:
+                x |= -1 << (5 * k)
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+    return counts
+
+
+def encode_rle(labels):
+    """{"size": [h, w], "classes": {label: counts string}} for present labels."""
+    classes = {}
+    for label in np.unique(labels):
+        classes[str(int(label))] = counts_to_string(rle_counts(labels == label))
+    return {"size": list(labels.shape), "classes": classes}
+
+
+def decode_rle(rle):
+    h, w = rle["size"]
+    labels = np.zeros(h * w, dtype="uint8")
+    for label, s in rle["classes"].items():
+        counts = string_to_counts(s)
+        mask = np.repeat(np.arange(len(counts)) % 2 == 1, counts)
+        labels[mask] = int(label)
+    return labels.reshape((w, h)).T
+
+
+"""
+## Packed archive
+"""
+
+
+def pack_labels(labels, bits):
+    """`8 // bits` labels per byte, first label in the lowest bits."""
+    per_byte = 8 // bits
+    flat = labels.ravel()
+    flat = np.concatenate([flat, np.zeros((-flat.size) % per_byte, dtype="uint8")])
+    shifts = (np.arange(per_byte) * bits).astype("uint8")
+    return np.bitwise_or.reduce(flat.reshape(-1, per_byte) << shifts, axis=1).astype("uint8")
+
+
+def unpack_labels(packed, bits, shape):
+    per_byte = 8 // bits
+    shifts = (np.arange(per_byte) * bits).astype("uint8")
+    values = (packed[:, None] >> shifts) & ((1 << bits) - 1)
+    return values.ravel()[: int(np.prod(shape))].reshape(shape).astype("uint8")
+
+
+class LabelArchive:
+    """Appends uint8 arrays to one `.bin` file, indexed in `.json` on close.
+
+    2D label maps are bit-packed when every label fits in `bits`; other
+    arrays (colour outputs) are stored as they are. Safe for several writer
+    threads.
+    """
+
+    def __init__(self, path, bits=2, compress=False):
+        self.path = os.path.splitext(path)[0]
+        self.bits = bits
+        self.compress = compress
+        self.lock = threading.Lock()
+        self.index = {}
+        self.offset = 0
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.file = open(self.path + ".bin", "wb")
+
+    def add(self, name, array):
+        bits = 8
+        data = array
+        if array.ndim == 2 and self.bits < 8 and array.max(initial=0) < (1 << self.bits):
+            bits = self.bits
+            data = pack_labels(array, bits)
+        data = data.tobytes()
+        if self.compress:
+            data = zlib.compress(data, 1)
+        with self.lock:
+            self.file.write(data)
+            self.index[name] = [self.offset, len(data), list(array.shape), bits]
+            self.offset += len(data)
+
+    def close(self):
+        self.file.close()
+        with open(self.path + ".json", "w") as f:
+            json.dump({"compress": self.compress, "entries": self.index}, f)
+
+
+class LabelArchiveReader:
+    """Random access to a `LabelArchive` through a memory map."""
+
+    def __init__(self, path):
+        path = os.path.splitext(path)[0]
+        with open(path + ".json") as f:
+            meta = json.load(f)
+        self.compress = meta["compress"]
+        self.index = meta["entries"]
+        self.data = np.memmap(path + ".bin", dtype="uint8", mode="r") if self.index else None
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return self.index.keys()
+
+    def __getitem__(self, name):
+        offset, nbytes, shape, bits = self.index[name]
+        data = self.data[offset : offset + nbytes]
+        if self.compress:
+            data = np.frombuffer(zlib.decompress(data.tobytes()), dtype="uint8")
+        if bits < 8:
+            return unpack_labels(np.asarray(data), bits, shape)
+        return np.asarray(data).reshape(shape)
+
+
+"""
+## Benchmark against the per-channel autocontrast PNG dump
+"""
+
+
+def per_channel_pngs(pred):
+    """What `display_mask` in the scripts saves: RGB, every channel, argmax."""
+    arrays = [pred[:, :, :3]] + [pred[:, :, j : j + 1] for j in range(pred.shape[-1])]
+    arrays.append(np.argmax(pred, axis=-1)[..., None])
+    out = []
+    for array in arrays:
+        img = ImageOps.autocontrast(keras.preprocessing.image.array_to_img(array))
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        out.append(buf.getvalue())
+    return out
+
+
+def decode_pngs(encoded):
+    """Reads every PNG back. Returns None: autocontrast is not lossless."""
+    for blobs in encoded:
+        for data in blobs:
+            with Image.open(io.BytesIO(data)) as img:
+                np.asarray(img)
+    return None
+
+
+def benchmark(preds):
+    labels = [np.argmax(pred, axis=-1).astype("uint8") for pred in preds]
+    n = len(preds)
+    tmp = tempfile.mkdtemp()
+    results = []
+
+    def run(name, encode, decode, size):
+        t0 = time.perf_counter()
+        encoded = encode()
+        t_enc = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        decoded = decode(encoded)
+        t_dec = time.perf_counter() - t0
+        if decoded is not None:
+            assert all(np.array_equal(a, b) for a, b in zip(decoded, labels)), name
+        results.append((name, size(encoded) / n, n / t_enc, n / t_dec))
+
+    run("per-channel png", lambda: [per_channel_pngs(pred) for pred in preds],
+        decode_pngs,
+        lambda enc: sum(len(b) for blobs in enc for b in blobs))
+    run("palette png", lambda: [encode_palette_png(l, preds[0].shape[-1]) for l in labels],
+        lambda enc: [decode_palette_png(d) for d in enc],
+        lambda enc: sum(len(d) for d in enc))
+    run("rle json", lambda: [json.dumps(encode_rle(l)) for l in labels],
+        lambda enc: [decode_rle(json.loads(s)) for s in enc],
+        lambda enc: sum(len(s) for s in enc))
+
+    for compress in (False, True):
+        path = os.path.join(tmp, "labels_%d" % compress)
+
+        def encode():
+            archive = LabelArchive(path, compress=compress)
+            for i, l in enumerate(labels):
+                archive.add(str(i), l)
+            archive.close()
+            return path
+
+        def decode(path):
+            reader = LabelArchiveReader(path)
+            return [reader[str(i)] for i in range(n)]
+
+        run("archive%s" % (" zlib" if compress else ""), encode, decode,
+            lambda path: os.path.getsize(path + ".bin") + os.path.getsize(path + ".json"))
+
+    base = results[0][1]
+    print("%-16s %10s %8s %10s %10s" % ("format", "B/image", "size", "enc img/s", "dec img/s"))
+    for name, size, enc, dec in results:
+        print("%-16s %10.0f %7.1f%% %10.1f %10.1f" % (name, size, 100.0 * size / base, enc, dec))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Size and speed of the mask output formats.")
+    parser.add_argument("model", help="trained oxford_segmentation*.h5")
+    parser.add_argument("--images", default="images/")
+    parser.add_argument("--limit", type=int, default=200, help="number of images")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    model = keras.models.load_model(args.model, compile=False)
+    img_size = tuple(model.inputs[0].shape[1:3])
+    paths = sorted(os.path.join(args.images, f) for f in os.listdir(args.images) if f.endswith(".jpg"))
+    paths = paths[: args.limit]
+    preds = []
+    for i in range(0, len(paths), args.batch_size):
+        x = np.stack([np.asarray(load_img(p, target_size=img_size)) for p in paths[i : i + args.batch_size]])
+        preds.extend(model.predict_on_batch(x))
+    benchmark(preds)
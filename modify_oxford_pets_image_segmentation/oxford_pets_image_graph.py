@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 11:02:15 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Functional-model graph rewrites
+Description: Helpers that edit a trained model's `get_config()` layer graph,
+rebuild it and carry the trained weights over by layer name.
+"""
+
+import numpy as np
+from tensorflow import keras
+
+
+"""
+## Walk the layer graph of a functional model config
+"""
+
+
+def layer_map(config):
+    """Layer configs of a functional model config, by layer name."""
+    return {layer["name"]: layer for layer in config["layers"]}
+
+
+def inbound_layers(layer):
+    """Names of the layers feeding `layer` (first and only call node)."""
+    if not layer["inbound_nodes"]:
+        return []
+    return [node[0] for node in layer["inbound_nodes"][0]]
+
+
+def consumers(config):
+    """Names of the layers reading each layer's output, by layer name."""
+    out = {layer["name"]: [] for layer in config["layers"]}
+    for layer in config["layers"]:
+        for name in inbound_layers(layer):
+            out[name].append(layer["name"])
+    return out
+
+
+def is_output(config, name):
+    return any(node[0] == name for node in config["output_layers"])
+
+
+def set_inbound(layer, names):
+    """Makes `layer` read the outputs of the layers in `names`."""
+    layer["inbound_nodes"] = [[[name, 0, 0, {}] for name in names]]
+
+
+def replace_input(config, old, new):
+    """Rewires every reader of layer `old`, and the model outputs, to `new`."""
+    for layer in config["layers"]:
+        for node in layer["inbound_nodes"]:
+            for entry in node:
+                if entry[0] == old:
+                    entry[0] = new
+    for entry in config["output_layers"]:
+        if entry[0] == old:
+            entry[0] = new
+
+
+def remove_layer(config, name):
+    config["layers"] = [layer for layer in config["layers"] if layer["name"] != name]
+
+
+def move_before(config, name, anchor):
+    """Moves layer `name` in front of `anchor` so the list stays topological."""
+    layers = config["layers"]
+    layer = layer_map(config)[name]
+    layers.remove(layer)
+    layers.insert(layers.index(layer_map(config)[anchor]), layer)
+
+
+def single_call(layer):
+    """True for layers called exactly once (the only kind the rewrites touch)."""
+    return len(layer["inbound_nodes"]) == 1
+
+
+"""
+## Rebuild and compare
+"""
+
+
+def rebuild(model, config, weights=None):
+    """Builds `config` and copies weights from `model` by layer name.
+
+    `weights` maps layer names to weight lists that override the copy, for
+    layers whose weights a rewrite has changed.
+    """
+    weights = weights or {}
+    new_model = keras.Model.from_config(config)
+    for layer in new_model.layers:
+        if layer.name in weights:
+            layer.set_weights(weights[layer.name])
+        elif layer.weights:
+            layer.set_weights(model.get_layer(layer.name).get_weights())
+    return new_model
+
+
+def random_inputs(model, batch_size=2, seed=0):
+    """Random image-range inputs for every model input (0/1 for masks)."""
+    rng = np.random.RandomState(seed)
+    shapes = model.input_shape
+    if not isinstance(shapes, list):
+        shapes = [shapes]
+    x = []
+    for shape in shapes:
+        shape = (batch_size,) + tuple(shape[1:])
+        high = 255.0 if shape[-1] == 3 else 1.0
+        x.append(rng.uniform(0.0, high, shape).astype("float32"))
+    return x if len(x) > 1 else x[0]
+
+
+def max_abs_diff(model_a, model_b, x):
+    """Largest absolute difference between the predictions of two models."""
+    a = model_a.predict_on_batch(x)
+    b = model_b.predict_on_batch(x)
+    return float(np.max(np.abs(np.asarray(a) - np.asarray(b))))
+
+
+"""
+## Project before upsampling
+"""
+
+
+def reorder_upsampling_projections(model):
+    """Swaps nearest `UpSampling2D` -> 1x1 `Conv2D` pairs into conv -> upsample.
+
+    A 1x1 convolution with stride 1 acts on each pixel on its own, and
+    nearest-neighbour upsampling only repeats pixels, so the two commute. The
+    conv then runs on 1/4 of the pixels with unchanged weights.
+    Returns (new_model, names of the swapped conv layers).
+    """
+    config = model.get_config()
+    layers = layer_map(config)
+    readers = consumers(config)
+    swapped = []
+    for conv in list(config["layers"]):
+        if conv["class_name"] != "Conv2D" or not single_call(conv):
+            continue
+        conv_cfg = conv["config"]
+        if (
+            tuple(conv_cfg["kernel_size"]) != (1, 1)
+            or tuple(conv_cfg["strides"]) != (1, 1)
+            or tuple(conv_cfg["dilation_rate"]) != (1, 1)
+        ):
+            continue
+        sources = inbound_layers(conv)
+        if len(sources) != 1:
+            continue
+        up = layers[sources[0]]
+        if (
+            up["class_name"] != "UpSampling2D"
+            or not single_call(up)
+            or up["config"].get("interpolation", "nearest") != "nearest"
+            or readers[up["name"]] != [conv["name"]]
+            or is_output(config, up["name"])
+        ):
+            continue
+
+        # readers of conv -> up, conv <- up's input, up <- conv
+        replace_input(config, conv["name"], up["name"])
+        conv["inbound_nodes"] = up["inbound_nodes"]
+        set_inbound(up, [conv["name"]])
+        move_before(config, conv["name"], up["name"])
+        readers = consumers(config)
+        swapped.append(conv["name"])
+    if not swapped:
+        return model, swapped
+    return rebuild(model, config), swapped
+
+
+"""
+## Fold BatchNormalization and drop redundant layers for inference
+"""
+
+conv_classes = ("Conv2D", "SeparableConv2D", "Conv2DTranspose", "DepthwiseConv2D")
+
+
+def only_reader(config, readers, name):
+    """Name of the single layer reading `name`, or None."""
+    if len(readers[name]) != 1 or is_output(config, name):
+        return None
+    return readers[name][0]
+
+
+def folded_conv_weights(conv, conv_weights, bn, bn_weights):
+    """Conv weights with the BN affine transform of its output folded in."""
+    cfg = bn["config"]
+    bn_weights = list(bn_weights)
+    gamma = bn_weights.pop(0) if cfg.get("scale", True) else 1.0
+    beta = bn_weights.pop(0) if cfg.get("center", True) else 0.0
+    mean, var = bn_weights
+    scale = gamma / np.sqrt(var + cfg["epsilon"])
+    shift = beta - mean * scale
+
+    weights = list(conv_weights)
+    use_bias = conv["config"].get("use_bias", True)
+    bias = weights.pop() if use_bias else np.zeros_like(shift)
+    kernel = weights[-1]
+    if conv["class_name"] == "Conv2DTranspose":
+        # kernel is (kh, kw, out, in)
+        kernel = kernel * scale[None, None, :, None]
+    elif conv["class_name"] == "DepthwiseConv2D":
+        # kernel is (kh, kw, in, depth_multiplier), outputs are in-major
+        kernel = kernel * scale.reshape(kernel.shape[2:])
+    else:
+        # Conv2D kernel or SeparableConv2D pointwise kernel, out last
+        kernel = kernel * scale
+    weights[-1] = kernel.astype(conv_weights[-1].dtype)
+    return weights + [(bias * scale + shift).astype(kernel.dtype)]
+
+
+def fold_batchnorm(config, weights, model):
+    """Folds every BN that is the only reader of a linear conv into it."""
+    folded = []
+    for bn in list(config["layers"]):
+        if bn["class_name"] != "BatchNormalization" or not single_call(bn):
+            continue
+        axis = bn["config"]["axis"]
+        if (axis if isinstance(axis, int) else axis[0]) not in (-1, 3):
+            continue
+        sources = inbound_layers(bn)
+        conv = layer_map(config).get(sources[0]) if len(sources) == 1 else None
+        if (
+            conv is None
+            or conv["class_name"] not in conv_classes
+            or not single_call(conv)
+            or conv["config"].get("activation", "linear") != "linear"
+            or only_reader(config, consumers(config), conv["name"]) != bn["name"]
+        ):
+            continue
+        conv_weights = weights.get(conv["name"]) or model.get_layer(conv["name"]).get_weights()
+        weights[conv["name"]] = folded_conv_weights(
+            conv, conv_weights, bn, model.get_layer(bn["name"]).get_weights()
+        )
+        conv["config"]["use_bias"] = True
+        replace_input(config, bn["name"], conv["name"])
+        remove_layer(config, bn["name"])
+        folded.append(bn["name"])
+    return folded
+
+
+def is_relu(layer):
+    if layer["class_name"] == "ReLU":
+        cfg = layer["config"]
+        return not cfg.get("max_value") and not cfg.get("negative_slope") and not cfg.get("threshold")
+    return layer["config"].get("activation") == "relu"
+
+
+def drop_repeated_relu(config):
+    """Removes `Activation("relu")` layers applied to an output already >= 0."""
+    dropped = []
+    for act in list(config["layers"]):
+        if act["class_name"] != "Activation" or not is_relu(act) or not single_call(act):
+            continue
+        sources = inbound_layers(act)
+        if len(sources) == 1 and is_relu(layer_map(config)[sources[0]]):
+            replace_input(config, act["name"], sources[0])
+            remove_layer(config, act["name"])
+            dropped.append(act["name"])
+    return dropped
+
+
+def fuse_conv_relu(config):
+    """Moves a ReLU that is the only reader of a linear conv into the conv."""
+    fused = []
+    for act in list(config["layers"]):
+        if act["class_name"] != "Activation" or not is_relu(act) or not single_call(act):
+            continue
+        sources = inbound_layers(act)
+        conv = layer_map(config).get(sources[0]) if len(sources) == 1 else None
+        if (
+            conv is None
+            or conv["class_name"] not in conv_classes
+            or conv["config"].get("activation", "linear") != "linear"
+            or only_reader(config, consumers(config), conv["name"]) != act["name"]
+        ):
+            continue
+        conv["config"]["activation"] = "relu"
+        replace_input(config, act["name"], conv["name"])
+        remove_layer(config, act["name"])
+        fused.append(act["name"])
+    return fused
+
+
+def fuse_upsampled_adds(config):
+    """Turns add([up(a), up(b)]) into up(add([a, b])) for nearest upsampling.
+
+    Nearest upsampling only repeats pixels, so the residual add can run at the
+    lower resolution and a single UpSampling2D replaces one per branch.
+    """
+    fused = []
+    for add in list(config["layers"]):
+        if add["class_name"] != "Add" or not single_call(add):
+            continue
+        layers = layer_map(config)
+        readers = consumers(config)
+        ups = [layers[name] for name in inbound_layers(add)]
+        if len(ups) < 2 or not all(
+            up["class_name"] == "UpSampling2D"
+            and single_call(up)
+            and up["config"].get("interpolation", "nearest") == "nearest"
+            and tuple(up["config"]["size"]) == tuple(ups[0]["config"]["size"])
+            and only_reader(config, readers, up["name"]) == add["name"]
+            for up in ups
+        ):
+            continue
+
+        keep = ups[0]
+        replace_input(config, add["name"], keep["name"])
+        add["inbound_nodes"] = [[up["inbound_nodes"][0][0] for up in ups]]
+        set_inbound(keep, [add["name"]])
+        for up in ups[1:]:
+            remove_layer(config, up["name"])
+        move_before(config, add["name"], keep["name"])
+        fused.append(add["name"])
+    return fused
+
+
+def optimize_for_inference(model):
+    """Returns (inference model, {pass name: affected layer names})."""
+    config = model.get_config()
+    weights = {}
+    report = {}
+    report["fold_batchnorm"] = fold_batchnorm(config, weights, model)
+    report["drop_repeated_relu"] = drop_repeated_relu(config)
+    report["fuse_conv_relu"] = fuse_conv_relu(config)
+    report["fuse_upsampled_adds"] = fuse_upsampled_adds(config)
+    return rebuild(model, config, weights), report
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 29 10:41:06 2026
+
+@author: schomsin
+"""
+
+"""
+Title: On-graph post-processing heads
+Description: Appends the host-side post-processing of the scripts
+(`np.argmax(val_preds[i], axis=-1)`, `np.rint(val_preds).astype(int)`) to the
+model itself, so `predict` returns uint8 label maps (plus optional uint8
+per-class probabilities) for segmentation and clipped, rounded uint8 images
+for colour regression instead of full float32 tensors. The head model also
+takes uint8 images, so neither direction carries float32 pixels.
+
+    python oxford_pets_image_heads.py oxford_segmentation.h5 --probabilities
+    python oxford_pets_image_heads.py oxford_gen_color_r4.h5
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+
+from oxford_pets_image_graph import random_inputs
+from oxford_pets_image_models import get_task
+
+
+class OutputHead(layers.Layer):
+    """uint8 outputs of a "seg" or "color" model, see `models.get_task`.
+
+    Segmentation: the argmax label map, and with `probabilities` also each
+    class probability scaled to 0..255. Colour: clipped to 0..255 and rounded
+    half to even like `np.rint`.
+    """
+
+    def __init__(self, task, probabilities=False, **kwargs):
+        super().__init__(**kwargs)
+        self.task = task
+        self.probabilities = probabilities
+
+    def call(self, inputs):
+        if self.task == "seg":
+            labels = tf.cast(tf.argmax(inputs, axis=-1), tf.uint8)
+            if not self.probabilities:
+                return labels
+            probs = tf.round(tf.clip_by_value(inputs, 0.0, 1.0) * 255.0)
+            return [labels, tf.cast(probs, tf.uint8)]
+        return tf.cast(tf.round(tf.clip_by_value(inputs, 0.0, 255.0)), tf.uint8)
+
+    def get_config(self):
+        config = super().get_config()
+        config.update({"task": self.task, "probabilities": self.probabilities})
+        return config
+
+
+custom_objects = {"OutputHead": OutputHead}
+
+
+def add_output_head(model, probabilities=False):
+    """`model` with uint8 image inputs and an `OutputHead`."""
+    task = get_task(model)
+    inputs = [keras.Input(shape=model.inputs[0].shape[1:], dtype="uint8", name="image_uint8")]
+    inputs += [keras.Input(shape=t.shape[1:], dtype="uint8", name="mask_uint8") for t in model.inputs[1:]]
+    # Rescaling casts to float32, a scale of 1 keeps the pixel values
+    x = [layers.Rescaling(1.0, name="to_float_%d" % i)(t) for i, t in enumerate(inputs)]
+    outputs = OutputHead("color" if task == "color2" else task, probabilities, name="output_head")(
+        model(x if len(x) > 1 else x[0])
+    )
+    return keras.Model(inputs, outputs, name=model.name + "_head")
+
+
+"""
+## Output size and host time with and without the head
+"""
+
+
+def compare(model, head, batch_size=16, repeats=10):
+    task = get_task(model)
+    x = random_inputs(model, batch_size)
+    x = [np.rint(t).astype("uint8") for t in x] if isinstance(x, list) else np.rint(x).astype("uint8")
+
+    def host(x):
+        preds = model.predict_on_batch(x)
+        # What the scripts do after predict
+        if task == "seg":
+            return preds, np.argmax(preds, axis=-1)
+        return preds, np.rint(preds).astype(int)
+
+    def on_graph(x):
+        outputs = head.predict_on_batch(x)
+        return outputs if isinstance(outputs, list) else [outputs]
+
+    for name, run in [("host", host), ("on-graph", on_graph)]:
+        outputs = run(x)
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            run(x)
+        seconds = (time.perf_counter() - t0) / repeats
+        sizes = ", ".join("%s %s %d B" % (o.dtype, o.shape[1:], o[0].nbytes) for o in outputs)
+        print("  %-8s %7.2f ms/batch of %d, per image: %s" % (name, 1e3 * seconds, batch_size, sizes))
+
+    raw = model.predict_on_batch(x)[0].nbytes
+    head_out = on_graph(x)
+    print("  float32 output / uint8 output: %.0fx" % (raw / head_out[0][0].nbytes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export models with uint8 post-processing heads.")
+    parser.add_argument("models", nargs="+", help="trained oxford_*.h5")
+    parser.add_argument("--probabilities", action="store_true", help="segmentation: also output uint8 probabilities")
+    parser.add_argument("--suffix", default="_head")
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    for path in args.models:
+        model = keras.models.load_model(path, compile=False)
+        head = add_output_head(model, args.probabilities)
+        out_path = os.path.splitext(path)[0] + args.suffix + ".h5"
+        head.save(out_path)
+        print("%s -> %s (%s)" % (path, out_path, get_task(model)))
+        compare(model, head, args.batch_size)
@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 22 09:34:50 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Batched directory inference
+Description: Streams images from a directory or glob through bounded queues:
+parallel decode and resize, batched `predict`, vectorized post-processing and
+parallel writes of label masks (segmentation) or RGB images (colour models).
+Paths are listed lazily and every queue is bounded, so memory stays constant
+however many files there are.
+
+    python oxford_pets_image_infer.py oxford_segmentation.h5 input/ --output out/infer/
+    python oxford_pets_image_infer.py oxford_gen_color_r4.h5 "images/*.jpg" --batch-size 16
+    python oxford_pets_image_infer.py oxford_segmentation.h5 input/ --cache-dir cache/infer/
+    python oxford_pets_image_infer.py oxford_segmentation.h5 images/ --format archive
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+from tensorflow import keras
+
+from oxford_pets_image_cache import PredictionCache, model_hash
+from oxford_pets_image_data import breed_name, get_breed_encoder, get_img_paths
+from oxford_pets_image_formats import LabelArchive, encode_palette_png, encode_rle
+from oxford_pets_image_heads import add_output_head, custom_objects
+from oxford_pets_image_models import get_task
+from oxford_pets_image_restore import restore_outputs
+from oxford_pets_image_tta import tta_model, tta_sets
+
+image_exts = (".jpg", ".jpeg", ".png")
+done = object()  # end-of-stream marker passed through the queues
+
+
+"""
+## Stages
+"""
+
+
+def list_images(spec):
+    """Yields image paths under a directory (recursively) or matching a glob."""
+    if os.path.isdir(spec):
+        stack = [spec]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in sorted(entries, key=lambda e: e.name):
+                    if entry.is_dir():
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith(image_exts) and not entry.name.startswith("."):
+                        yield entry.path
+    else:
+        for path in glob.iglob(spec, recursive=True):
+            if path.lower().endswith(image_exts):
+                yield path
+
+
+def decode_image(path, img_size):
+    """Returns (uint8 HxWx3 array at img_size, original (width, height))."""
+    with Image.open(path) as img:
+        size = img.size
+        img = img.convert("RGB")
+        if img.size != (img_size[1], img_size[0]):
+            img = img.resize((img_size[1], img_size[0]), Image.NEAREST)
+        return np.asarray(img, dtype="uint8"), size
+
+
+def postprocess(task, preds):
+    """Label maps (segmentation) or clipped RGB (colour), uint8, whole batch."""
+    if isinstance(preds, list):
+        preds = preds[0]  # labels of a head with probabilities
+    if preds.dtype == np.uint8:
+        return preds  # already done by an `OutputHead`
+    if task == "seg":
+        return np.argmax(preds, axis=-1).astype("uint8")
+    return np.clip(np.rint(preds), 0, 255).astype("uint8")
+
+
+def output_path(path, root, out_dir, ext=".png"):
+    """Mirrors `path` below `root` into `out_dir` with a new extension."""
+    rel = os.path.relpath(path, root) if root else os.path.basename(path)
+    return os.path.join(out_dir, os.path.splitext(rel)[0] + ext)
+
+
+def save_output(out_path, array, label_scale=1):
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    if array.ndim == 2 and label_scale != 1:
+        array = (array * label_scale).astype("uint8")
+    Image.fromarray(array).save(out_path)
+
+
+def make_writer(fmt, root, out_dir, label_scale=1, num_classes=3):
+    """Returns (write_fn(item, output), close_fn) for an output format.
+
+    "png" writes one PNG per image, "palette" one P-mode PNG per label map,
+    "rle" one JSON line per image into predictions.rle.jsonl and "archive"
+    every output into one packed predictions.bin / .json.
+    """
+    if fmt == "png":
+        def write(item, output):
+            save_output(output_path(item[0], root, out_dir), output, label_scale)
+
+        return write, lambda: None
+
+    if fmt == "palette":
+        def write(item, output):
+            out_path = output_path(item[0], root, out_dir)
+            os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+            with open(out_path, "wb") as f:
+                f.write(encode_palette_png(output, num_classes))
+
+        return write, lambda: None
+
+    os.makedirs(out_dir, exist_ok=True)
+    if fmt == "rle":
+        lock = threading.Lock()
+        f = open(os.path.join(out_dir, "predictions.rle.jsonl"), "w")
+
+        def write(item, output):
+            name = os.path.relpath(output_path(item[0], root, out_dir, ""), out_dir)
+            line = json.dumps(dict(encode_rle(output), file=name))
+            with lock:
+                f.write(line + "\n")
+
+        return write, f.close
+
+    archive = LabelArchive(os.path.join(out_dir, "predictions"))
+
+    def write(item, output):
+        archive.add(os.path.relpath(output_path(item[0], root, out_dir, ""), out_dir), output)
+
+    return write, archive.close
+
+
+class Stats:
+    """Thread-safe per-stage busy time and item counts."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds = {}
+        self.counts = {}
+
+    def add(self, stage, seconds, count=1):
+        with self.lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+            self.counts[stage] = self.counts.get(stage, 0) + count
+
+    def count(self, stage):
+        with self.lock:
+            return self.counts.get(stage, 0)
+
+
+"""
+## Pipeline
+"""
+
+
+def run_pipeline(
+    paths,
+    predict_fn,
+    write_fn,
+    img_size,
+    batch_size=32,
+    decode_workers=4,
+    write_workers=4,
+    queue_size=256,
+    decode_fn=decode_image,
+    report_every=10.0,
+    cache=None,
+    cache_salt=None,
+):
+    """Decode -> batch -> predict -> write, each stage behind a bounded queue.
+
+    `predict_fn(x, items)` gets a uint8 batch and the decoded items
+    (path, original size) and returns one output per item. `write_fn(item,
+    output)` runs on the writer threads. Returns the `Stats`.
+
+    With a `PredictionCache` the decode workers hash the file bytes first and
+    send hits straight to the writers (their size is None); misses are decoded
+    from the bytes already read and stored after `predict`. `cache_salt(path)`
+    adds per-image inputs to the key.
+    """
+    stats = Stats()
+    path_q = queue.Queue(queue_size)
+    decoded_q = queue.Queue(queue_size)
+    write_q = queue.Queue(queue_size)
+
+    def feed():
+        for path in paths:
+            path_q.put(path)
+        for _ in range(decode_workers):
+            path_q.put(done)
+
+    def decode():
+        while True:
+            path = path_q.get()
+            if path is done:
+                decoded_q.put(done)
+                return
+            t0 = time.perf_counter()
+            key = None
+            try:
+                if cache is None:
+                    array, size = decode_fn(path, img_size)
+                else:
+                    with open(path, "rb") as f:
+                        content = f.read()
+                    key = cache.key(content, cache_salt(path) if cache_salt else "")
+                    output = cache.get(key, len(content))
+                    if output is not None:
+                        stats.add("cache_hit", time.perf_counter() - t0)
+                        write_q.put(((path, None), output, None))
+                        continue
+                    array, size = decode_fn(io.BytesIO(content), img_size)
+            except Exception as e:  # corrupt or unreadable file, keep going
+                print("skip %s: %s" % (path, e))
+                stats.add("failed", 0.0)
+                continue
+            stats.add("decode", time.perf_counter() - t0)
+            decoded_q.put((path, size, array, key))
+
+    def write():
+        while True:
+            job = write_q.get()
+            if job is done:
+                return
+            item, output, key = job
+            t0 = time.perf_counter()
+            try:
+                write_fn(item, output)
+                if key is not None:
+                    cache.put(key, output)
+            except Exception as e:
+                print("write failed %s: %s" % (job[0][0], e))
+                stats.add("failed", 0.0)
+                continue
+            stats.add("write", time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    threads += [threading.Thread(target=decode, daemon=True) for _ in range(decode_workers)]
+    writers = [threading.Thread(target=write, daemon=True) for _ in range(write_workers)]
+    for t in threads + writers:
+        t.start()
+
+    # Fixed-shape buffer: the last, partial batch is padded so predict never retraces
+    x = np.zeros((batch_size,) + tuple(img_size) + (3,), dtype="uint8")
+    items = []
+    keys = []
+    finished = 0
+    t_start = time.perf_counter()
+    t_report = t_start
+    while finished < decode_workers:
+        job = decoded_q.get()
+        if job is done:
+            finished += 1
+        else:
+            x[len(items)] = job[2]
+            items.append(job[:2])
+            keys.append(job[3])
+        if items and (len(items) == batch_size or finished == decode_workers):
+            t0 = time.perf_counter()
+            outputs = predict_fn(x, items)
+            stats.add("predict", time.perf_counter() - t0, len(items))
+            for item, output, key in zip(items, outputs, keys):
+                write_q.put((item, output, key))
+            items = []
+            keys = []
+        if report_every and time.perf_counter() - t_report > report_every:
+            t_report = time.perf_counter()
+            n = stats.count("predict") + stats.count("cache_hit")
+            print("%d images, %.1f img/s, queues: decoded %d, write %d" % (
+                n, n / (t_report - t_start), decoded_q.qsize(), write_q.qsize()))
+
+    for _ in writers:
+        write_q.put(done)
+    for t in writers:
+        t.join()
+    stats.add("total", time.perf_counter() - t_start, 0)
+    return stats
+
+
+def print_stats(stats, decode_workers, write_workers, cache=None):
+    n = stats.counts.get("predict", 0) + stats.counts.get("cache_hit", 0)
+    total = stats.seconds.get("total", 0.0)
+    print("%d images in %.1fs: %.1f img/s, %d failed" % (
+        n, total, n / max(total, 1e-9), stats.counts.get("failed", 0)))
+    if cache is not None:
+        report = cache.report()
+        print("  cache: %d hits, %d misses (%.1f%% hit rate), %.1f MB of outputs served, "
+              "%.1f MB of images not decoded, %d entries / %.1f MB on disk, %d evicted" % (
+                  report["hits"], report["misses"], 100.0 * report["hit_rate"],
+                  report["bytes_served"] / 2**20, report["input_bytes_skipped"] / 2**20,
+                  report["entries"], report["bytes_on_disk"] / 2**20, report["evicted"]))
+    # Busy time per worker, the stage closest to the wall time is the bottleneck
+    for stage, workers in [("decode", decode_workers), ("predict", 1), ("write", write_workers)]:
+        busy = stats.seconds.get(stage, 0.0) / workers
+        print("  %-8s %7.1fs busy per worker (%.0f%% of wall time)" % (
+            stage, busy, 100.0 * busy / max(total, 1e-9)))
+
+
+"""
+## Models
+"""
+
+
+def make_model_fn(model, task, breed_encoder=None):
+    """Raw batched predictions; adds the breed mask for `get_model2*`."""
+    if task != "color2":
+        return lambda x, items: model.predict_on_batch(x)
+
+    mask_shape = tuple(model.inputs[1].shape[1:])
+    known = set(breed_encoder.classes_)
+
+    def run(x, items):
+        # Breed from the file name, all-zero mask for unknown names
+        masks = np.zeros((len(x),) + mask_shape, dtype="uint8")
+        for j, (path, _) in enumerate(items):
+            name = breed_name(path)
+            if name in known:
+                masks[j] = breed_encoder.transform([name])[0]
+        return model.predict_on_batch([x, masks])
+
+    return run
+
+
+def make_predict_fn(model, task, breed_encoder=None, native_size=False):
+    """Batched predict + post-processing to uint8 outputs.
+
+    With `native_size` the probabilities (or colour outputs) are resized to
+    each image's original size before argmax / rounding.
+    """
+    run = make_model_fn(model, task, breed_encoder)
+
+    def predict(x, items):
+        preds = run(x, items)
+        if native_size:
+            return restore_outputs(preds[: len(items)], [size for _, size in items], task)
+        return postprocess(task, preds)
+
+    return predict
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a trained model over a directory of images.")
+    parser.add_argument("model", help="trained oxford_*.h5")
+    parser.add_argument("input", help="image directory or glob")
+    parser.add_argument("--output", default="out/infer/", help="output directory")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--decode-workers", type=int, default=4)
+    parser.add_argument("--write-workers", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=256, help="max items per queue")
+    parser.add_argument("--label-scale", type=int, default=1, help="multiply label values in saved masks")
+    parser.add_argument("--breeds-dir", default="images/", help="breed names for two-input colour models")
+    parser.add_argument("--native-size", action="store_true", help="write outputs at the original image size")
+    parser.add_argument("--format", default="png", choices=["png", "palette", "rle", "archive"], help="output format")
+    parser.add_argument("--tta", default="none", choices=sorted(tta_sets), help="test-time augmentation set")
+    parser.add_argument("--head", action="store_true", help="argmax / rounding inside the model")
+    parser.add_argument("--cache-dir", default=None, help="reuse predictions of unchanged images")
+    parser.add_argument("--cache-max-mb", type=float, default=1024.0, help="evict beyond this cache size")
+    args = parser.parse_args()
+
+    model = keras.models.load_model(args.model, custom_objects=custom_objects, compile=False)
+    task = get_task(model)
+    exported_head = model.layers[-1].name == "output_head"
+    if (args.head or exported_head) and args.native_size:
+        parser.error("--native-size resizes the float outputs, use it without an output head")
+    if exported_head and args.tta != "none":
+        parser.error("--tta averages the float outputs, use the model without its output head")
+    if task != "seg" and args.format in ("palette", "rle"):
+        parser.error("--format %s is for segmentation label maps" % args.format)
+    img_size = tuple(model.inputs[0].shape[1:3])
+    # Class channels, in front of the head of an exported model
+    num_classes = int((model.layers[-1].input if exported_head else model.outputs[0]).shape[-1])
+    encoder = None
+    if task == "color2":
+        encoder, _ = get_breed_encoder(get_img_paths(args.breeds_dir, args.breeds_dir)[0])
+    root = args.input if os.path.isdir(args.input) else None
+    cache = None
+    if args.cache_dir:
+        # Everything that changes the stored uint8 output is part of the key
+        options = "task=%s,img_size=%dx%d,native_size=%d,tta=%s" % ((task,) + img_size + (args.native_size, args.tta))
+        cache = PredictionCache(args.cache_dir, int(args.cache_max_mb * 2**20), model_hash(model), options)
+    if args.tta != "none":
+        model = tta_model(model, args.tta)
+    if args.head and not exported_head:
+        model = add_output_head(model)
+
+    write_fn, close_fn = make_writer(args.format, root, args.output, args.label_scale, num_classes)
+    stats = run_pipeline(
+        list_images(args.input),
+        make_predict_fn(model, task, encoder, args.native_size),
+        write_fn,
+        img_size,
+        batch_size=args.batch_size,
+        decode_workers=args.decode_workers,
+        write_workers=args.write_workers,
+        queue_size=args.queue_size,
+        cache=cache,
+        cache_salt=breed_name if task == "color2" else None,
+    )
+    close_fn()
+    print_stats(stats, args.decode_workers, args.write_workers, cache)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Nov 11 10:02:16 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Per-step throughput and data-wait instrumentation
+Description: `TimedSequence` wraps any of the Sequence classes and records when
+each batch finished loading and how long loading took. `StepStats`, a
+callback, records when each train step began and ended. Together they give per
+step: the time the step waited for its batch (the batch became ready after the
+step had started), the time in the train step, images/sec and the queue depth
+(batches loaded but not yet consumed) when the step began. Every load is
+recorded with its batch index and a step is matched to the oldest unconsumed
+load of the index it trains on, so workers finishing out of order and loading
+ahead into the next pass are handled. Train with `shuffle=False` (shuffle
+inside the Sequence instead), so `fit` serves the indices in order, and with
+thread workers (`use_multiprocessing=False`): batches loaded in other
+processes are not seen by the hook. Rows go to a CSV and to
+TensorBoard scalars; at the end of every epoch a summary says whether the
+input pipeline or the train step is the bottleneck.
+
+    python oxford_pets_image_instrument.py --task seg --epochs 1
+    python oxford_pets_image_instrument.py --task color --workers 4 --steps 50 --logdir logs/instrument
+"""
+
+import argparse
+import collections
+import csv
+import threading
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from oxford_pets_image_data import get_task_sequences
+from oxford_pets_image_models import get_model
+
+# Data-wait share of the step time above which an epoch is called input-bound
+input_bound_share = 0.1
+
+
+class TimedSequence(keras.utils.Sequence):
+    """Serves the batches of `seq`, timestamping when each finished loading."""
+
+    def __init__(self, seq):
+        self.seq = seq
+        self.batch_size = seq.batch_size
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # Per batch index, (ready time, load seconds) of the loads not yet consumed
+            self.loads = collections.defaultdict(collections.deque)
+            self.loaded = 0
+            self.consumed = 0
+
+    def __len__(self):
+        return len(self.seq)
+
+    def __getitem__(self, idx):
+        t0 = time.perf_counter()
+        batch = self.seq[idx]
+        t1 = time.perf_counter()
+        with self.lock:
+            self.loads[idx].append((t1, t1 - t0))
+            self.loaded += 1
+        return batch
+
+    def on_epoch_end(self):
+        self.seq.on_epoch_end()
+
+    def queued(self):
+        with self.lock:
+            return self.loaded - self.consumed
+
+    def consume(self):
+        """(batch index, ready time, load seconds) of the batch of the next step.
+
+        `fit` serves the indices in order, wrapping around at the end of a pass.
+        """
+        with self.lock:
+            idx = self.consumed % len(self.seq)
+            self.consumed += 1
+            pending = self.loads[idx]
+            if not pending:
+                return idx, None, None
+            ready, load = pending.popleft()
+            return idx, ready, load
+
+
+class StepStats(keras.callbacks.Callback):
+    """Per-step data wait, step time, img/s and queue depth of a `TimedSequence`."""
+
+    def __init__(self, sequence, csv_path="step_stats.csv", logdir=None, workers=1):
+        super().__init__()
+        self.sequence = sequence
+        self.csv_path = csv_path
+        self.workers = workers
+        self.writer = tf.summary.create_file_writer(logdir) if logdir else None
+        self.global_step = 0
+
+    def on_train_begin(self, logs=None):
+        # Drops the batch `fit` reads before training to inspect the data
+        self.sequence.reset()
+        self.file = open(self.csv_path, "w", newline="")
+        self.csv = csv.writer(self.file)
+        self.csv.writerow(["epoch", "step", "batch", "wait_ms", "step_ms", "load_ms", "img_per_s", "queue_depth"])
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch = epoch
+        self.rows = []
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self.begin = time.perf_counter()
+        self.depth = self.sequence.queued()
+
+    def on_train_batch_end(self, batch, logs=None):
+        end = time.perf_counter()
+        idx, ready, load = self.sequence.consume()
+        wait = 0.0 if ready is None else max(ready - self.begin, 0.0)
+        step = end - self.begin - wait
+        row = (wait, step, load or 0.0, self.sequence.batch_size / max(end - self.begin, 1e-9), self.depth)
+        self.rows.append(row)
+        self.csv.writerow([self.epoch, batch, idx, "%.3f" % (wait * 1e3), "%.3f" % (step * 1e3),
+                           "%.3f" % ((load or 0.0) * 1e3), "%.2f" % row[3], self.depth])
+        if self.writer is not None:
+            with self.writer.as_default():
+                for name, value in zip(["data_wait_ms", "step_ms", "load_ms", "img_per_s", "queue_depth"],
+                                       [wait * 1e3, step * 1e3, (load or 0.0) * 1e3, row[3], self.depth]):
+                    tf.summary.scalar("steps/" + name, value, step=self.global_step)
+        self.global_step += 1
+
+    def on_epoch_end(self, epoch, logs=None):
+        if not self.rows:
+            return
+        wait, step, load, _, depth = (np.array(col, dtype="float64") for col in zip(*self.rows))
+        total = wait.sum() + step.sum()
+        share = wait.sum() / max(total, 1e-9)
+        speed = len(self.rows) * self.sequence.batch_size / max(total, 1e-9)
+        print("epoch %d: %.1f img/s, data wait %.1f ms (%.0f%% of step time), train step %.1f ms, "
+              "load %.1f ms/batch on %d worker(s), queue depth %.1f" % (
+                  epoch + 1, speed, wait.mean() * 1e3,
+                  100.0 * share, step.mean() * 1e3, load.mean() * 1e3, self.workers, depth.mean()))
+        if share > input_bound_share:
+            print("  bottleneck: input pipeline (loading a batch takes %.1fx a train step per worker)" % (
+                load.mean() / max(step.mean() * self.workers, 1e-9)))
+        else:
+            print("  bottleneck: train step (batches are ready when the step starts)")
+        if self.writer is not None:
+            with self.writer.as_default():
+                tf.summary.scalar("epoch/data_wait_share", share, step=epoch)
+                tf.summary.scalar("epoch/img_per_s", speed, step=epoch)
+            self.writer.flush()
+        self.file.flush()
+
+    def on_train_end(self, logs=None):
+        self.file.close()
+
+
+def instrument(seq, csv_path="step_stats.csv", logdir=None, workers=1):
+    """Returns (sequence to pass to `fit`, callback) for a training Sequence."""
+    timed = TimedSequence(seq)
+    return timed, StepStats(timed, csv_path, logdir, workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find out whether training is input-bound or compute-bound.")
+    parser.add_argument("--task", default="seg", choices=["seg", "color"])
+    parser.add_argument("--img-size", type=int, default=160)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=None, help="steps per epoch (default: one pass)")
+    parser.add_argument("--workers", type=int, default=1, help="Keras data loading threads")
+    parser.add_argument("--csv", default="step_stats.csv")
+    parser.add_argument("--logdir", default=None, help="TensorBoard log directory")
+    args = parser.parse_args()
+
+    img_size = (args.img_size, args.img_size)
+    train_gen, _ = get_task_sequences(args.task, args.batch_size, img_size)
+    timed, stats = instrument(train_gen, args.csv, args.logdir, args.workers)
+    if args.task == "seg":
+        model = get_model(img_size, 3)
+        model.compile(optimizer="rmsprop", loss="sparse_categorical_crossentropy")
+    else:
+        model = get_model(img_size, 3, activation="linear")
+        model.compile(optimizer="adam", loss="mae")
+    model.fit(timed, epochs=args.epochs, steps_per_epoch=args.steps, callbacks=[stats],
+              shuffle=False, workers=args.workers, use_multiprocessing=False)
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 09:40:02 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Shared U-Net Xception-style model builders
+Description: Reference `get_model` and a lightweight decoder variant, plus a
+small MAC counter to compare their inference cost.
+"""
+
+import importlib
+import inspect
+
+from tensorflow import keras
+from tensorflow.keras import layers
+
+
+"""
+## Prepare U-Net Xception-style model
+"""
+
+
+def get_model(img_size, num_classes, activation="softmax"):
+    inputs = keras.Input(shape=img_size + (3,))
+
+    ### [First half of the network: downsampling inputs] ###
+
+    # Entry block
+    x = layers.Conv2D(32, 3, strides=2, padding="same")(inputs)
+    x = layers.BatchNormalization()(x)
+    x = layers.Activation("relu")(x)
+
+    previous_block_activation = x  # Set aside residual
+
+    # Blocks 1, 2, 3 are identical apart from the feature depth.
+    for filters in [64, 128, 256]:
+        x = layers.Activation("relu")(x)
+        x = layers.SeparableConv2D(filters, 3, padding="same")(x)
+        x = layers.BatchNormalization()(x)
+
+        x = layers.Activation("relu")(x)
+        x = layers.SeparableConv2D(filters, 3, padding="same")(x)
+        x = layers.BatchNormalization()(x)
+
+        x = layers.MaxPooling2D(3, strides=2, padding="same")(x)
+
+        # Project residual
+        residual = layers.Conv2D(filters, 1, strides=2, padding="same")(
+            previous_block_activation
+        )
+        x = layers.add([x, residual])  # Add back residual
+        previous_block_activation = x  # Set aside next residual
+
+    ### [Second half of the network: upsampling inputs] ###
+
+    for filters in [256, 128, 64, 32]:
+        x = layers.Activation("relu")(x)
+        x = layers.Conv2DTranspose(filters, 3, padding="same")(x)
+        x = layers.BatchNormalization()(x)
+
+        x = layers.Activation("relu")(x)
+        x = layers.Conv2DTranspose(filters, 3, padding="same")(x)
+        x = layers.BatchNormalization()(x)
+
+        x = layers.UpSampling2D(2)(x)
+
+        # Project residual
+        residual = layers.Conv2D(filters, 1, padding="same")(previous_block_activation)
+        residual = layers.UpSampling2D(2)(residual)
+        x = layers.add([x, residual])  # Add back residual
+        previous_block_activation = x  # Set aside next residual
+
+    # Add a per-pixel classification layer
+    outputs = layers.Conv2D(num_classes, 3, activation=activation, padding="same")(x)
+
+    # Define the model
+    model = keras.Model(inputs, outputs)
+    return model
+
+
+def get_model_lite(
+    img_size,
+    num_classes,
+    activation="softmax",
+    reduction=1,
+    encoder_filters=(64, 128, 256),
+    decoder_filters=(256, 128, 64, 32),
+    entry_filters=32,
+    extra_channels=None,
+):
+    """Same encoder as `get_model`, decoder built from SeparableConv2D.
+
+    `reduction` divides the channel count of the second conv of every decoder
+    stage, so fewer channels are carried into the upsampled (4x larger)
+    resolution. `reduction=1` keeps the `get_model` channel layout.
+    `extra_channels` adds a second input like the breed mask of `get_model2`,
+    pooled to the bottleneck and added there. The entry block and every encoder
+    stage halve the resolution, so `decoder_filters` needs one stage more than
+    `encoder_filters` for the output to be at the input resolution.
+    """
+    if len(decoder_filters) != len(encoder_filters) + 1:
+        raise ValueError("%d encoder stages need %d decoder stages, got %d" % (
+            len(encoder_filters), len(encoder_filters) + 1, len(decoder_filters)))
+
+    inputs = keras.Input(shape=img_size + (3,))
+
+    ### [First half of the network: downsampling inputs] ###
+
+    # Entry block
+    x = layers.Conv2D(entry_filters, 3, strides=2, padding="same")(inputs)
+    x = layers.BatchNormalization()(x)
+    x = layers.Activation("relu")(x)
+
+    previous_block_activation = x  # Set aside residual
+
+    for filters in encoder_filters:
+        x = layers.Activation("relu")(x)
+        x = layers.SeparableConv2D(filters, 3, padding="same")(x)
+        x = layers.BatchNormalization()(x)
+
+        x = layers.Activation("relu")(x)
+        x = layers.SeparableConv2D(filters, 3, padding="same")(x)
+        x = layers.BatchNormalization()(x)
+
+        x = layers.MaxPooling2D(3, strides=2, padding="same")(x)
+
+        # Project residual
+        residual = layers.Conv2D(filters, 1, strides=2, padding="same")(
+            previous_block_activation
+        )
+        x = layers.add([x, residual])  # Add back residual
+        previous_block_activation = x  # Set aside next residual
+
+    if extra_channels:
+        inputs1 = keras.Input(shape=img_size + (extra_channels,))
+        a = layers.AveragePooling2D(2 ** (len(encoder_filters) + 1))(inputs1)
+        a = layers.Conv2D(x.shape[-1], 1, padding="same")(a)
+        x = layers.add([x, a])  # Add x a
+        inputs = [inputs, inputs1]
+
+    ### [Second half of the network: upsampling inputs] ###
+
+    for filters in decoder_filters:
+        out_filters = max(filters // reduction, 1)
+
+        x = layers.Activation("relu")(x)
+        x = layers.SeparableConv2D(filters, 3, padding="same")(x)
+        x = layers.BatchNormalization()(x)
+
+        # Reduce channels before moving to the next resolution
+        x = layers.Activation("relu")(x)
+        x = layers.SeparableConv2D(out_filters, 3, padding="same")(x)
+        x = layers.BatchNormalization()(x)
+
+        x = layers.UpSampling2D(2)(x)
+
+        # Project residual
+        residual = layers.Conv2D(out_filters, 1, padding="same")(previous_block_activation)
+        residual = layers.UpSampling2D(2)(residual)
+        x = layers.add([x, residual])  # Add back residual
+        previous_block_activation = x  # Set aside next residual
+
+    # Add a per-pixel classification layer
+    outputs = layers.Conv2D(num_classes, 3, activation=activation, padding="same")(x)
+
+    # Define the model
+    model = keras.Model(inputs, outputs)
+    return model
+
+
+"""
+## Tell trained models apart
+"""
+
+
+def get_task(model):
+    """Returns "seg" for softmax heads, "color2" for the two-input
+    `get_model2*` models and "color" for the single-input linear heads."""
+    if len(model.inputs) > 1:
+        return "color2"
+    config = model.layers[-1].get_config()
+    if config.get("activation") == "softmax" or config.get("task") == "seg":
+        return "seg"
+    return "color"
+
+
+def load_builder(spec):
+    """"module:function" -> the function, e.g. "oxford_pets_image_models:get_model"."""
+    module, name = spec.split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def build_model(spec, img_size, num_classes, activation):
+    """Model of a `load_builder` spec. `activation` is passed to the builders
+    that take it; the revisions' `get_model1`/`get_model2` have a linear head."""
+    builder = load_builder(spec)
+    if "activation" in inspect.signature(builder).parameters:
+        return builder(img_size, num_classes, activation=activation)
+    return builder(img_size, num_classes)
+
+
+# Optimizer, loss and head of the single-process scripts per task
+task_compile = {
+    "seg": ("rmsprop", "sparse_categorical_crossentropy", "softmax"),
+    "color": ("adam", "mae", "linear"),
+    "color2": ("adam", "mae", "linear"),
+}
+
+
+"""
+## Count multiply-accumulates per image
+"""
+
+
+def count_macs(model):
+    """Multiply-accumulates of the conv layers for one image, by layer name.
+
+    Needs a fixed input size: build dynamic-shape models at the size to count.
+    """
+    macs = {}
+    for layer in model.layers:
+        if not isinstance(
+            layer, (layers.Conv2D, layers.SeparableConv2D, layers.DepthwiseConv2D)
+        ):
+            continue
+        in_shape = tuple(layer.input.shape)
+        out_shape = tuple(layer.output.shape)
+        if None in in_shape[1:] + out_shape[1:]:
+            raise ValueError("%s has unknown dimensions %s -> %s, count the MACs at a fixed img_size" % (
+                layer.name, in_shape, out_shape))
+        kh, kw = layer.kernel_size
+        cin = in_shape[-1]
+        if isinstance(layer, layers.SeparableConv2D):
+            depth = cin * layer.depth_multiplier
+            n = out_shape[1] * out_shape[2] * (kh * kw * depth + depth * layer.filters)
+        elif isinstance(layer, layers.DepthwiseConv2D):
+            n = out_shape[1] * out_shape[2] * kh * kw * cin * layer.depth_multiplier
+        elif isinstance(layer, layers.Conv2DTranspose):
+            # Every input pixel is scattered through the full kernel
+            n = in_shape[1] * in_shape[2] * kh * kw * cin * layer.filters
+        else:
+            n = out_shape[1] * out_shape[2] * kh * kw * cin * layer.filters
+        macs[layer.name] = int(n)
+    return macs
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Nov  6 09:44:10 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Data-parallel training with MultiWorkerMirroredStrategy
+Description: Launches N local worker processes (TF_CONFIG on localhost ports)
+or runs one worker of a multi-host cluster. The global batch keeps the size
+of the single-process scripts and is split across workers, so every step
+sees the same number of samples and the loss is the mean over the global
+batch. Each worker reads a disjoint shard of the training split.
+`--scaling 1,2,4,8` times a few steps per worker count and reports img/s,
+speedup and efficiency.
+
+    python oxford_pets_image_multiworker.py --workers 4 --task seg --epochs 15
+    python oxford_pets_image_multiworker.py --scaling 1,2,4,8 --steps 30
+    # one host of a cluster (run on every host with its own --index)
+    python oxford_pets_image_multiworker.py --hosts node1:12345,node2:12345 --index 0
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import tensorflow as tf
+from tensorflow import keras
+
+from oxford_pets_image_data import (
+    OxfordPets,
+    OxfordPetsMod2,
+    OxfordPetsMod5,
+    get_breed_encoder,
+    get_img_paths,
+    split_img_paths,
+)
+from oxford_pets_image_models import build_model, task_compile
+
+
+"""
+## Worker
+"""
+
+
+def shard(items, index, count):
+    """Every `count`-th item from `index`, truncated so all shards are equal."""
+    n = len(items) // count * count
+    return items[index:n:count]
+
+
+def task_sequence(task, batch_size, img_size, input_paths, target_paths, encoder=None):
+    if task == "seg":
+        return OxfordPets(batch_size, img_size, input_paths, target_paths)
+    # Colour models regress the input image itself
+    if task == "color2":
+        return OxfordPetsMod5(batch_size, img_size, input_paths, input_paths, encoder, len(encoder.classes_))
+    return OxfordPetsMod2(batch_size, img_size, input_paths, input_paths)
+
+
+def sequence_dataset(seq):
+    """Endless tf.data pipeline over the batches of a `Sequence`."""
+    def batch(idx):
+        x, y = seq[idx]
+        # The two-input models get [image, breed mask]; tf.data wants a tuple
+        return (tuple(x) if isinstance(x, list) else x), y
+
+    def gen():
+        while True:
+            for idx in range(len(seq)):
+                yield batch(idx)
+
+    spec = tf.nest.map_structure(lambda a: tf.TensorSpec(a.shape, a.dtype), batch(0))
+    return tf.data.Dataset.from_generator(gen, output_signature=spec).prefetch(2)
+
+
+class StepTimer(keras.callbacks.Callback):
+    """Wall time of the training steps after `warmup` steps."""
+
+    def __init__(self, warmup=3):
+        super().__init__()
+        self.warmup = warmup
+        self.steps = 0
+        self.t0 = None
+        self.seconds = 0.0
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if self.steps >= self.warmup:
+            self.t0 = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        if self.t0 is not None:
+            self.seconds += time.perf_counter() - self.t0
+            self.t0 = None
+        self.steps += 1
+
+
+def run_worker(args):
+    if args.threads:
+        tf.config.threading.set_intra_op_parallelism_threads(args.threads)
+        tf.config.threading.set_inter_op_parallelism_threads(2)
+    strategy = tf.distribute.MultiWorkerMirroredStrategy()
+    resolver = strategy.cluster_resolver
+    num_workers = len(resolver.cluster_spec().as_dict().get("worker", [])) or 1
+    chief = resolver.task_id == 0
+
+    img_size = (args.img_size, args.img_size)
+    input_img_paths, target_img_paths = get_img_paths()
+    train_in, train_tg, val_in, val_tg = split_img_paths(input_img_paths, target_img_paths)
+    encoder = get_breed_encoder(input_img_paths)[0] if args.task == "color2" else None
+    per_replica = args.batch_size // strategy.num_replicas_in_sync
+    steps = args.steps or len(shard(train_in, 0, num_workers)) // per_replica
+    val_steps = len(shard(val_in, 0, num_workers)) // per_replica
+
+    def dataset_fn(inputs, targets):
+        def fn(input_context):
+            batch = input_context.get_per_replica_batch_size(args.batch_size)
+            i, n = input_context.input_pipeline_id, input_context.num_input_pipelines
+            seq = task_sequence(args.task, batch, img_size, shard(inputs, i, n), shard(targets, i, n), encoder)
+            return sequence_dataset(seq)
+
+        return keras.utils.experimental.DatasetCreator(fn)
+
+    optimizer, loss, activation = task_compile[args.task]
+    with strategy.scope():
+        model = build_model(args.builder, img_size, 3, activation)
+        model.compile(optimizer=optimizer, loss=loss)
+
+    timer = StepTimer()
+    fit_args = {}
+    if not args.no_validation:
+        fit_args = dict(validation_data=dataset_fn(val_in, val_tg), validation_steps=val_steps)
+    model.fit(
+        dataset_fn(train_in, train_tg),
+        epochs=args.epochs,
+        steps_per_epoch=steps,
+        callbacks=[timer],
+        verbose=2 if chief else 0,
+        **fit_args,
+    )
+
+    # Every worker takes part in saving; only the chief's copy is kept
+    if args.output:
+        model.save(args.output if chief else os.path.join(tempfile.mkdtemp(), "worker.h5"))
+    if chief and args.result:
+        timed = max(timer.steps - timer.warmup, 0)
+        with open(args.result, "w") as f:
+            json.dump({
+                "workers": num_workers,
+                "global_batch": args.batch_size,
+                "steps_timed": timed,
+                "seconds": timer.seconds,
+                "img_per_s": timed * args.batch_size / max(timer.seconds, 1e-9),
+            }, f)
+
+
+"""
+## Local launcher and scaling report
+"""
+
+
+def free_ports(n):
+    sockets = [socket.socket() for _ in range(n)]
+    for s in sockets:
+        s.bind(("localhost", 0))
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+
+def tf_config(hosts, index):
+    return json.dumps({"cluster": {"worker": hosts}, "task": {"type": "worker", "index": index}})
+
+
+def launch(n, worker_args, threads=None):
+    """Runs `n` local workers to completion, returns their exit codes."""
+    hosts = ["localhost:%d" % port for port in free_ports(n)]
+    threads = threads or max(1, (os.cpu_count() or 1) // n)
+    procs = []
+    for i in range(n):
+        env = dict(os.environ, TF_CONFIG=tf_config(hosts, i))
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--threads", str(threads)] + worker_args
+        procs.append(subprocess.Popen(cmd, env=env))
+    return [p.wait() for p in procs]
+
+
+def scaling_report(counts, worker_args, summary="summary-oxford-multiworker.txt"):
+    rows = []
+    for n in counts:
+        result = os.path.join(tempfile.mkdtemp(), "result.json")
+        codes = launch(n, worker_args + ["--result", result])
+        if any(codes):
+            print("%d workers failed: exit codes %s" % (n, codes))
+            continue
+        with open(result) as f:
+            rows.append(json.load(f))
+
+    base = rows[0]["img_per_s"] / rows[0]["workers"] if rows else 1.0
+    lines = ["%-8s %12s %10s %11s" % ("workers", "img/s", "speedup", "efficiency")]
+    for row in rows:
+        speedup = row["img_per_s"] / base
+        lines.append("%-8d %12.1f %9.2fx %10.0f%%" % (
+            row["workers"], row["img_per_s"], speedup, 100.0 * speedup / row["workers"]))
+    print("\n".join(lines))
+    with open(summary, "w") as fw:
+        fw.write("\n".join(lines) + "\n")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Data-parallel training on local or remote workers.")
+    parser.add_argument("--task", default="seg", choices=sorted(task_compile))
+    parser.add_argument("--builder", default="oxford_pets_image_models:get_model", help="module:function")
+    parser.add_argument("--img-size", type=int, default=160)
+    parser.add_argument("--batch-size", type=int, default=32, help="global batch, split over the workers")
+    parser.add_argument("--epochs", type=int, default=15)
+    parser.add_argument("--steps", type=int, default=None, help="steps per epoch (default: one pass)")
+    parser.add_argument("--no-validation", action="store_true")
+    parser.add_argument("--output", default=None, help="trained model .h5 (chief only)")
+    parser.add_argument("--workers", type=int, default=None, help="launch this many local workers")
+    parser.add_argument("--scaling", default=None, help="comma separated worker counts to time")
+    parser.add_argument("--hosts", default=None, help="host:port list of a multi-host cluster")
+    parser.add_argument("--index", type=int, default=None, help="this host's position in --hosts")
+    # Set by the launcher
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--threads", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--result", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    worker_args = ["--task", args.task, "--builder", args.builder, "--img-size", str(args.img_size),
+                   "--batch-size", str(args.batch_size)]
+    if args.scaling:
+        worker_args += ["--epochs", "1", "--steps", str(args.steps or 30), "--no-validation"]
+        scaling_report([int(n) for n in args.scaling.split(",")], worker_args)
+    elif args.workers:
+        worker_args += ["--epochs", str(args.epochs)]
+        worker_args += ["--steps", str(args.steps)] if args.steps else []
+        worker_args += ["--output", args.output] if args.output else []
+        worker_args += ["--no-validation"] if args.no_validation else []
+        sys.exit(max(launch(args.workers, worker_args)))
+    else:
+        if args.hosts:
+            os.environ["TF_CONFIG"] = tf_config(args.hosts.split(","), args.index or 0)
+        run_worker(args)
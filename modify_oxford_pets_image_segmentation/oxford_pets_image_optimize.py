@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 14:03:12 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Inference-graph optimizer for trained models
+Description: Rebuilds a trained `oxford_*.h5` for inference: moves 1x1
+residual projections before upsampling, folds BatchNormalization into the
+preceding Conv2D/SeparableConv2D/Conv2DTranspose, drops repeated ReLUs, moves
+ReLUs into convs and runs upsampled residual adds at the lower resolution.
+The result is checked against the original predictions before it is saved.
+
+    python oxford_pets_image_optimize.py oxford_segmentation.h5 oxford_gen_color_r4.h5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from tensorflow import keras
+
+from oxford_pets_image_graph import optimize_for_inference, random_inputs, reorder_upsampling_projections
+from oxford_pets_image_models import count_macs
+
+
+def latency(model, x, repeats=20):
+    """Median seconds per `predict_on_batch` call after one warm-up call."""
+    model.predict_on_batch(x)
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        model.predict_on_batch(x)
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times))
+
+
+def optimize(path, out_path, batch_size, rtol, reorder=True):
+    model = keras.models.load_model(path, compile=False)
+    new_model = model
+    if reorder:
+        new_model, swapped = reorder_upsampling_projections(new_model)
+        print("  reorder_projections: %d" % len(swapped))
+    new_model, report = optimize_for_inference(new_model)
+    for name, changed in report.items():
+        print("  %s: %d" % (name, len(changed)))
+
+    x = random_inputs(model, batch_size)
+    a = model.predict_on_batch(x)
+    b = new_model.predict_on_batch(x)
+    diff = float(np.max(np.abs(a - b)))
+    scale = max(1.0, float(np.max(np.abs(a))))
+    print("  layers %d -> %d, params %d -> %d, GMACs %.3f -> %.3f" % (
+        len(model.layers), len(new_model.layers), model.count_params(), new_model.count_params(),
+        sum(count_macs(model).values()) / 1e9, sum(count_macs(new_model).values()) / 1e9))
+    print("  ms/batch of %d: %.2f -> %.2f" % (
+        batch_size, 1e3 * latency(model, x), 1e3 * latency(new_model, x)))
+    print("  max |diff| %.3g (%.3g of output range)" % (diff, diff / scale))
+    if diff > rtol * scale:
+        print("  predictions differ, not saving")
+        return False
+    new_model.save(out_path)
+    print("  saved", out_path)
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold BN and drop redundant layers for inference.")
+    parser.add_argument("models", nargs="+", help="trained .h5 checkpoints")
+    parser.add_argument("--suffix", default="_infer", help="appended to the output file name")
+    parser.add_argument("--batch-size", type=int, default=8, help="batch used for the check and timing")
+    parser.add_argument("--rtol", type=float, default=1e-4, help="max diff relative to the output range")
+    parser.add_argument("--no-reorder", action="store_true", help="keep the residual projection order")
+    args = parser.parse_args()
+
+    ok = True
+    for path in args.models:
+        print(path)
+        root, ext = os.path.splitext(path)
+        ok = optimize(path, root + args.suffix + ext, args.batch_size, args.rtol, not args.no_reorder) and ok
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 11:48:57 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Rebuild checkpoints with the residual projection before upsampling
+Description: Loads trained `oxford_*.h5` models built with
+`UpSampling2D(2)` -> `Conv2D(filters, 1)` residuals, rebuilds them with the
+1x1 projection first (same weights, 1/4 of the MACs) and checks that the
+predictions match.
+
+    python oxford_pets_image_reorder.py oxford_segmentation.h5 oxford_gen_color_r4.h5
+"""
+
+import argparse
+import os
+import sys
+
+from tensorflow import keras
+
+from oxford_pets_image_graph import max_abs_diff, random_inputs, reorder_upsampling_projections
+from oxford_pets_image_models import count_macs
+
+
+def convert(path, out_path, atol):
+    model = keras.models.load_model(path, compile=False)
+    new_model, swapped = reorder_upsampling_projections(model)
+    if not swapped:
+        print("%s: nothing to reorder" % path)
+        return True
+
+    diff = max_abs_diff(model, new_model, random_inputs(model))
+    macs_old = sum(count_macs(model).values())
+    macs_new = sum(count_macs(new_model).values())
+    print("%s: %d projections moved, GMACs %.3f -> %.3f, max |diff| %.3g" % (
+        path, len(swapped), macs_old / 1e9, macs_new / 1e9, diff))
+    if diff > atol:
+        print("%s: predictions differ, not saving" % path)
+        return False
+    new_model.save(out_path)
+    print("saved", out_path)
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move 1x1 residual projections before UpSampling2D.")
+    parser.add_argument("models", nargs="+", help="trained .h5 checkpoints")
+    parser.add_argument("--suffix", default="_reorder", help="appended to the output file name")
+    parser.add_argument("--atol", type=float, default=1e-4, help="max abs prediction difference")
+    args = parser.parse_args()
+
+    ok = True
+    for path in args.models:
+        root, ext = os.path.splitext(path)
+        ok = convert(path, root + args.suffix + ext, args.atol) and ok
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 26 09:48:21 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Restore predictions to the original image resolution
+Description: Upsamples model-resolution probabilities (segmentation) or
+regression outputs (colour) back to each image's original size inside a
+`tf.function`, then takes argmax or clips to uint8 there, so only uint8 maps
+at native size leave the graph. Images of the same size are resized as one
+batch, and the output is produced in strips of rows so the float
+intermediate never exceeds `max_pixels` pixels per call.
+"""
+
+import numpy as np
+import tensorflow as tf
+
+
+def coords(out_len, in_len, start, stop):
+    """Bilinear source indices and weights for outputs [start, stop).
+
+    Same half-pixel-centre sampling as `tf.image.resize(..., "bilinear")`.
+    """
+    scale = tf.cast(in_len, tf.float32) / tf.cast(out_len, tf.float32)
+    pos = (tf.cast(tf.range(start, stop), tf.float32) + 0.5) * scale - 0.5
+    pos = tf.maximum(pos, 0.0)
+    lo = tf.floor(pos)
+    frac = pos - lo
+    lo = tf.minimum(tf.cast(lo, tf.int32), in_len - 1)
+    hi = tf.minimum(lo + 1, in_len - 1)
+    return lo, hi, frac
+
+
+def _resize_strip(preds, out_h, out_w, y0, y1):
+    """Rows [y0, y1) of `preds` (k, h, w, c) bilinearly resized to (out_h, out_w)."""
+    in_h = tf.shape(preds)[1]
+    in_w = tf.shape(preds)[2]
+    lo, hi, frac = coords(out_h, in_h, y0, y1)
+    frac = frac[None, :, None, None]
+    rows = tf.gather(preds, lo, axis=1) * (1.0 - frac) + tf.gather(preds, hi, axis=1) * frac
+    lo, hi, frac = coords(out_w, in_w, 0, out_w)
+    frac = frac[None, None, :, None]
+    return tf.gather(rows, lo, axis=2) * (1.0 - frac) + tf.gather(rows, hi, axis=2) * frac
+
+
+signature = [
+    tf.TensorSpec([None, None, None, None], tf.float32),
+    tf.TensorSpec([], tf.int32),
+    tf.TensorSpec([], tf.int32),
+    tf.TensorSpec([], tf.int32),
+    tf.TensorSpec([], tf.int32),
+]
+
+
+# Dynamic shapes in the signature: one trace serves every image size
+@tf.function(input_signature=signature)
+def restore_labels_strip(preds, out_h, out_w, y0, y1):
+    strip = _resize_strip(preds, out_h, out_w, y0, y1)
+    return tf.cast(tf.argmax(strip, axis=-1), tf.uint8)
+
+
+@tf.function(input_signature=signature)
+def restore_color_strip(preds, out_h, out_w, y0, y1):
+    strip = _resize_strip(preds, out_h, out_w, y0, y1)
+    return tf.cast(tf.round(tf.clip_by_value(strip, 0.0, 255.0)), tf.uint8)
+
+
+def restore_outputs(preds, sizes, task, max_pixels=2**22):
+    """Native-size uint8 outputs for a batch of model-resolution predictions.
+
+    `sizes` are the original (width, height) of each image. Returns a list of
+    (height, width) label maps or (height, width, channels) images.
+    """
+    preds = np.asarray(preds, dtype="float32")
+    strip_fn = restore_labels_strip if task == "seg" else restore_color_strip
+    outputs = [None] * len(sizes)
+    groups = {}
+    for i, size in enumerate(sizes):
+        groups.setdefault(tuple(size), []).append(i)
+
+    for (width, height), indices in groups.items():
+        # Images per call and rows per strip within the pixel budget
+        per_call = max(1, min(len(indices), max_pixels // (width * height)))
+        rows = max(1, min(height, max_pixels // (width * per_call)))
+        for start in range(0, len(indices), per_call):
+            chunk = indices[start : start + per_call]
+            shape = (len(chunk), height, width) + (() if task == "seg" else preds.shape[-1:])
+            full = np.empty(shape, dtype="uint8")
+            batch = tf.constant(preds[chunk])
+            for y0 in range(0, height, rows):
+                y1 = min(y0 + rows, height)
+                full[:, y0:y1] = strip_fn(batch, height, width, y0, y1).numpy()
+            for j, i in enumerate(chunk):
+                outputs[i] = full[j]
+    return outputs
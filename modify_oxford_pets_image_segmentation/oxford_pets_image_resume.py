@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Nov  5 10:08:33 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Resumable training
+Description: `fit_resumable` continues an interrupted `model.fit` from the
+latest `AsyncCheckpoint`: weights, optimizer slots and iteration counter,
+epoch and batch position, the batch-order RNG of the sampler and the
+best-metric state of callbacks such as EarlyStopping or ReduceLROnPlateau.
+A partly finished epoch is completed from the next unseen batch, then training
+goes on normally. On SIGTERM the current state is checkpointed after the
+running batch and the process exits, so preemptible machines can be used.
+"""
+
+import os
+import signal
+
+import numpy as np
+from tensorflow import keras
+
+from oxford_pets_image_checkpoint import (
+    AsyncCheckpoint,
+    latest_checkpoint,
+    load_checkpoint,
+    optimizer_variables,
+)
+
+# Attributes that hold the progress of the stock Keras callbacks
+callback_state_attrs = ("best", "wait", "cooldown_counter", "stopped_epoch", "epochs_since_last_save")
+
+
+class ShuffledSequence(keras.utils.Sequence):
+    """Serves the batches of `seq` in a seeded order that can be resumed.
+
+    Train with `fit(..., shuffle=False)`: the order comes from this sampler's
+    RandomState, not from Keras, so it is restored with the checkpoint.
+    """
+
+    def __init__(self, seq, seed=1337, shuffle=True):
+        self.seq = seq
+        self.shuffle = shuffle
+        self.rng = np.random.RandomState(seed)
+        self.start = 0
+        self.draw()
+
+    def draw(self):
+        # RNG state the current order was drawn from, to redraw it on resume
+        self.before = self.rng.get_state()
+        n = len(self.seq)
+        self.order = self.rng.permutation(n) if self.shuffle else np.arange(n)
+        self.start = 0
+
+    def __len__(self):
+        return len(self.order) - self.start
+
+    def __getitem__(self, idx):
+        return self.seq[int(self.order[self.start + idx])]
+
+    def on_epoch_end(self):
+        self.draw()
+
+    def get_state(self, epoch_done):
+        """JSON-able RNG state: for the next epoch if this one is done."""
+        name, keys, pos, has_gauss, gauss = self.rng.get_state() if epoch_done else self.before
+        return [name, keys.tolist(), int(pos), int(has_gauss), float(gauss)]
+
+    def set_state(self, state, step=0):
+        name, keys, pos, has_gauss, gauss = state
+        self.rng.set_state((name, np.array(keys, dtype="uint32"), pos, has_gauss, gauss))
+        self.draw()
+        self.start = step
+
+
+def callback_states(callbacks):
+    states = {}
+    for i, callback in enumerate(callbacks):
+        state = {}
+        for attr in callback_state_attrs:
+            value = getattr(callback, attr, None)
+            if isinstance(value, (int, float, np.integer, np.floating)):
+                state[attr] = float(value) if isinstance(value, (float, np.floating)) else int(value)
+        if state:
+            states["%d:%s" % (i, type(callback).__name__)] = state
+    return states
+
+
+def set_callback_states(callbacks, states):
+    for i, callback in enumerate(callbacks):
+        for attr, value in states.get("%d:%s" % (i, type(callback).__name__), {}).items():
+            setattr(callback, attr, value)
+
+
+def restore_optimizer(model, opt_weights):
+    """Creates the optimizer slots and assigns the saved values."""
+    optimizer = model.optimizer
+    if hasattr(optimizer, "build"):
+        optimizer.build(model.trainable_variables)
+    else:  # legacy optimizer
+        optimizer._create_all_weights(model.trainable_variables)
+    variables = optimizer_variables(optimizer)
+    if len(variables) != len(opt_weights):
+        raise ValueError("checkpoint has %d optimizer variables, the optimizer %d" % (len(opt_weights), len(variables)))
+    for variable, value in zip(variables, opt_weights):
+        variable.assign(value)
+
+
+class TrainingState(keras.callbacks.Callback):
+    """Tracks epoch and batch, adds them to every checkpoint, handles SIGTERM.
+
+    Must come after the callbacks whose state it carries: their
+    `on_train_begin` resets that state, this one puts it back.
+    """
+
+    def __init__(self, checkpoint, sampler, callbacks, save_every=0):
+        super().__init__()
+        self.checkpoint = checkpoint
+        self.sampler = sampler
+        self.callbacks = callbacks
+        self.save_every = save_every
+        self.epoch = 0
+        self.step = 0
+        self.carry = None
+        self.terminate = False
+        checkpoint.extra_meta = self.meta
+
+    def meta(self, meta):
+        done = not meta.get("step")
+        return {
+            "sampler": self.sampler.get_state(done),
+            "callbacks": callback_states(self.callbacks),
+        }
+
+    def on_train_begin(self, logs=None):
+        if self.carry is not None:
+            set_callback_states(self.callbacks, self.carry)
+
+    def on_train_end(self, logs=None):
+        # Survives the second `fit` of a resumed run
+        self.carry = callback_states(self.callbacks)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch = epoch
+        self.step = self.sampler.start
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.step += 1
+        if self.terminate:
+            if self.step >= len(self.sampler.order):
+                # Last batch of the epoch: resume at the start of the next one
+                self.checkpoint.save({"epoch": self.epoch + 1, "step": 0})
+            else:
+                self.checkpoint.save({"epoch": self.epoch, "step": self.step})
+            self.checkpoint.flush()
+            print("SIGTERM: checkpointed epoch %d step %d, exiting" % (self.epoch, self.step))
+            raise SystemExit(128 + signal.SIGTERM)
+        if self.save_every and self.step % self.save_every == 0 and self.step < len(self.sampler.order):
+            self.checkpoint.save({"epoch": self.epoch, "step": self.step})
+
+    def request_stop(self, signum, frame):
+        self.terminate = True  # acted on after the running batch
+
+
+def fit_resumable(
+    model,
+    train_gen,
+    epochs,
+    prefix,
+    validation_data=None,
+    callbacks=(),
+    seed=1337,
+    save_every=0,
+    keep_last=3,
+    keep_best=2,
+    monitor="val_loss",
+    export_path=None,
+):
+    """`model.fit` that resumes from `<prefix>` checkpoints. `model` is compiled."""
+    callbacks = list(callbacks)
+    sampler = ShuffledSequence(train_gen, seed)
+    checkpoint = AsyncCheckpoint(prefix, keep_last, keep_best, monitor, export_path=export_path)
+    state = TrainingState(checkpoint, sampler, callbacks, save_every)
+
+    epoch = 0
+    path = latest_checkpoint(prefix)
+    if path is not None and os.path.exists(path):
+        weights, opt_weights, meta = load_checkpoint(path)
+        model.set_weights(weights)
+        restore_optimizer(model, opt_weights)
+        epoch, step = meta["epoch"], meta.get("step", 0)
+        if "sampler" in meta:
+            sampler.set_state(meta["sampler"], step)
+        state.carry = meta.get("callbacks", {})
+        if sampler.start >= len(sampler.order):
+            # Saved after the last batch of an epoch: nothing of it is left
+            sampler.draw()
+            epoch += 1
+        print("resuming from %s: epoch %d, step %d" % (path, epoch, step))
+
+    previous = signal.signal(signal.SIGTERM, state.request_stop)
+    try:
+        all_callbacks = callbacks + [checkpoint, state]
+        history = None
+        if sampler.start and epoch < epochs:
+            # Rest of the interrupted epoch, without the final .h5 export
+            checkpoint.export_path = None
+            history = model.fit(sampler, epochs=epoch + 1, initial_epoch=epoch, shuffle=False,
+                                validation_data=validation_data, callbacks=all_callbacks)
+            checkpoint.export_path = export_path
+            epoch += 1
+        if epoch < epochs:
+            history = model.fit(sampler, epochs=epochs, initial_epoch=epoch, shuffle=False,
+                                validation_data=validation_data, callbacks=all_callbacks)
+        elif export_path and not os.path.exists(export_path):
+            model.save(export_path)
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+    return history
+
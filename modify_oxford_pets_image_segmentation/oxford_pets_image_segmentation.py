@@ -168,8 +168,8 @@ def get_model(img_size, num_classes):
         x = layers.UpSampling2D(2)(x)
 
         # Project residual
-        residual = layers.UpSampling2D(2)(previous_block_activation)
-        residual = layers.Conv2D(filters, 1, padding="same")(residual)
+        residual = layers.Conv2D(filters, 1, padding="same")(previous_block_activation)
+        residual = layers.UpSampling2D(2)(residual)
         x = layers.add([x, residual])  # Add back residual
         previous_block_activation = x  # Set aside next residual
 
@@ -266,18 +266,24 @@ img1 = PIL.ImageOps.autocontrast(keras.preprocessing.image.array_to_img(val_gen[
 print(val_gen[10][1][1].shape)
 display(img1)
 
-val_preds = model.predict(val_gen)
+# Stream the split through the model instead of holding every prediction
+# (1000x160x160x10 float32). Labels are 0, 1, 2: score the first 3 channels.
+from oxford_pets_image_evaluate import evaluate_streaming, print_metrics
+
+print_metrics(evaluate_streaming(model, val_gen, "seg", num_classes=3))
 
 
 def display_mask(i):
     """Quick utility to display a model's prediction."""
-    img = PIL.ImageOps.autocontrast(keras.preprocessing.image.array_to_img(val_preds[i][:,:,:3]))
+    x, _ = val_gen[i // batch_size]
+    pred = model.predict_on_batch(x[i % batch_size : i % batch_size + 1])[0]
+    img = PIL.ImageOps.autocontrast(keras.preprocessing.image.array_to_img(pred[:,:,:3]))
     display(img)
-    for j in range(val_preds[i].shape[2]):
-        img0 = np.expand_dims(val_preds[i][:,:,j], axis=-1)
+    for j in range(pred.shape[2]):
+        img0 = np.expand_dims(pred[:,:,j], axis=-1)
         img = PIL.ImageOps.autocontrast(keras.preprocessing.image.array_to_img(img0))
         display(img)
-    mask = np.argmax(val_preds[i], axis=-1)
+    mask = np.argmax(pred, axis=-1)
     mask = np.expand_dims(mask, axis=-1)
     img = PIL.ImageOps.autocontrast(keras.preprocessing.image.array_to_img(mask))
     display(img)
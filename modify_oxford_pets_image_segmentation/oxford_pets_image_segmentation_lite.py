@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:05:31 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Lightweight decoder vs reference U-Net on the trimap task
+Description: Trains `get_model_lite` (SeparableConv2D decoder, optional channel
+reduction) on the Oxford Pets trimaps and compares MACs, parameters, CPU
+latency and validation IoU against `get_model`.
+"""
+
+import os
+import time
+
+from tensorflow import keras
+import numpy as np
+
+from oxford_pets_image_data import OxfordPets, get_img_paths, split_img_paths
+from oxford_pets_image_models import count_macs, get_model, get_model_lite
+
+img_size = (160, 160)
+num_classes = 3
+batch_size = 32
+epochs = 15
+reduction = 2
+
+"""
+## Set aside a validation split
+"""
+
+input_img_paths, target_img_paths = get_img_paths()
+print("Number of samples:", len(input_img_paths))
+
+(
+    train_input_img_paths,
+    train_target_img_paths,
+    val_input_img_paths,
+    val_target_img_paths,
+) = split_img_paths(input_img_paths, target_img_paths)
+
+train_gen = OxfordPets(batch_size, img_size, train_input_img_paths, train_target_img_paths)
+val_gen = OxfordPets(batch_size, img_size, val_input_img_paths, val_target_img_paths)
+
+
+def load_or_train(path, build):
+    """Loads `path` if it exists, otherwise trains the model from `build()`."""
+    if os.path.exists(path) and os.path.isfile(path):
+        return keras.models.load_model(path, compile=False)
+    model = build()
+    model.compile(optimizer="rmsprop", loss="sparse_categorical_crossentropy")
+    callbacks = [keras.callbacks.ModelCheckpoint(path, save_best_only=True)]
+    model.fit(train_gen, epochs=epochs, validation_data=val_gen, callbacks=callbacks)
+    return keras.models.load_model(path, compile=False)
+
+
+"""
+## Train (or load) both models
+"""
+
+# Own 3-class reference: oxford_segmentation.h5 of the main script has
+# num_classes = 10 output channels.
+model_ref = load_or_train(
+    "oxford_segmentation_ref3.h5", lambda: get_model(img_size, num_classes)
+)
+model_lite = load_or_train(
+    "oxford_segmentation_lite.h5",
+    lambda: get_model_lite(img_size, num_classes, reduction=reduction),
+)
+
+
+"""
+## Compare cost and accuracy
+"""
+
+
+def mean_iou(model, gen):
+    """Per-class and mean IoU of argmax predictions over `gen`."""
+    confusion = np.zeros((num_classes, num_classes), dtype="int64")
+    for idx in range(len(gen)):
+        x, y = gen[idx]
+        pred = np.argmax(model.predict_on_batch(x), axis=-1).ravel()
+        true = y.ravel().astype("int64")
+        confusion += np.bincount(
+            true * num_classes + pred, minlength=num_classes * num_classes
+        ).reshape(num_classes, num_classes)
+    inter = np.diag(confusion)
+    union = confusion.sum(0) + confusion.sum(1) - inter
+    iou = inter / np.maximum(union, 1)
+    return iou, iou.mean()
+
+
+def latency(model, n_batch, repeats=20):
+    """Median seconds per `predict_on_batch` call of `n_batch` images."""
+    x = np.random.RandomState(0).uniform(0, 255, (n_batch,) + img_size + (3,))
+    x = x.astype("float32")
+    model.predict_on_batch(x)  # warm up / trace
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        model.predict_on_batch(x)
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times))
+
+
+rows = []
+for name, model in [("get_model", model_ref), ("get_model_lite", model_lite)]:
+    macs = sum(count_macs(model).values())
+    iou, miou = mean_iou(model, val_gen)
+    t1 = latency(model, 1)
+    tb = latency(model, batch_size)
+    rows.append((name, model.count_params(), macs, t1, tb, miou, iou))
+
+print("%-16s %10s %8s %10s %12s %7s  %s" % (
+    "model", "params", "GMACs", "ms/img@1", "ms/img@%d" % batch_size, "mIoU", "IoU per class"))
+for name, params, macs, t1, tb, miou, iou in rows:
+    print("%-16s %10d %8.2f %10.2f %12.2f %7.4f  %s" % (
+        name, params, macs / 1e9, t1 * 1e3, tb * 1e3 / batch_size, miou,
+        np.array2string(iou, precision=4)))
+
+speedup = rows[0][4] / rows[1][4]
+print("MAC reduction: %.2fx, batched latency reduction: %.2fx, mIoU change: %+.4f" % (
+    rows[0][2] / rows[1][2], speedup, rows[1][5] - rows[0][5]))
+
+fw = open("summary-oxford-lite.txt", "w")
+for row in rows:
+    fw.write("%s params=%d macs=%d ms_at_1=%.3f ms_per_img_at_%d=%.3f miou=%.4f\n" % (
+        row[0], row[1], row[2], row[3] * 1e3, batch_size, row[4] * 1e3 / batch_size, row[5]))
+fw.close()
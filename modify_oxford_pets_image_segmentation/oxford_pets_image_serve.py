@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 22 15:12:08 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Local HTTP inference service with dynamic micro-batching
+Description: Loads a trained model once and serves single-image requests on
+localhost. Concurrent requests are grouped into one `predict` call of up to
+`--max-batch` images or `--max-wait-ms` after the first request of a batch.
+GET /stats returns latency percentiles and the batch-size histogram.
+
+    python oxford_pets_image_serve.py oxford_segmentation.h5 --port 8500
+    curl --data-binary @input/000004.jpg -o mask.png localhost:8500/predict
+    curl --data-binary @input/000004.jpg "localhost:8500/predict?breed=Abyssinian" -o out.png
+    curl localhost:8500/stats
+"""
+
+import argparse
+import collections
+import io
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from PIL import Image
+from tensorflow import keras
+
+from oxford_pets_image_data import get_breed_encoder, get_img_paths
+from oxford_pets_image_infer import decode_image, make_predict_fn
+from oxford_pets_image_models import get_task
+from oxford_pets_image_tta import tta_model, tta_sets
+
+
+class Request:
+    def __init__(self, x, item):
+        self.x = x
+        self.item = item
+        self.arrived = time.perf_counter()
+        self.event = threading.Event()
+        self.output = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Groups queued requests into batches for one model thread.
+
+    Batches are padded to the next power of two (capped at `max_batch`), so
+    the model sees a handful of shapes and is traced once per shape.
+    """
+
+    def __init__(self, predict_fn, img_size, max_batch=16, max_wait_ms=5.0, history=10000):
+        self.predict_fn = predict_fn
+        self.img_size = img_size
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.latency = collections.deque(maxlen=history)
+        self.model_time = collections.deque(maxlen=history)
+        self.batch_sizes = collections.Counter()
+        self.served = 0
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, x, item):
+        """Blocks until the request's batch has run and returns its output."""
+        request = Request(x, item)
+        self.requests.put(request)
+        request.event.wait()
+        with self.lock:
+            self.latency.append(time.perf_counter() - request.arrived)
+        if request.error is not None:
+            raise request.error
+        return request.output
+
+    def next_batch(self):
+        batch = [self.requests.get()]
+        deadline = batch[0].arrived + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def loop(self):
+        while True:
+            batch = self.next_batch()
+            padded = 1
+            while padded < len(batch):
+                padded *= 2
+            x = np.zeros((min(padded, self.max_batch),) + tuple(self.img_size) + (3,), dtype="uint8")
+            for j, request in enumerate(batch):
+                x[j] = request.x
+            t0 = time.perf_counter()
+            try:
+                outputs = self.predict_fn(x, [request.item for request in batch])
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+                    request.event.set()
+                continue
+            with self.lock:
+                self.model_time.append(time.perf_counter() - t0)
+                self.batch_sizes[len(batch)] += 1
+                self.served += len(batch)
+            for request, output in zip(batch, outputs):
+                request.output = output
+                request.event.set()
+
+    def stats(self):
+        with self.lock:
+            latency = np.array(self.latency) * 1e3
+            model_time = np.array(self.model_time) * 1e3
+            sizes = dict(sorted(self.batch_sizes.items()))
+            served = self.served
+
+        def percentiles(values):
+            if not len(values):
+                return {}
+            return {"p%d" % p: round(float(np.percentile(values, p)), 3) for p in (50, 90, 99)}
+
+        return {
+            "served": served,
+            "latency_ms": percentiles(latency),
+            "model_ms_per_batch": percentiles(model_time),
+            "batch_size_histogram": sizes,
+            "mean_batch_size": served / max(sum(sizes.values()), 1),
+            "queued": self.requests.qsize(),
+        }
+
+
+def make_handler(batcher, img_size):
+    class Handler(BaseHTTPRequestHandler):
+        def reply(self, code, body, content_type):
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlparse(self.path).path != "/stats":
+                return self.reply(404, b"not found\n", "text/plain")
+            self.reply(200, json.dumps(batcher.stats(), indent=1).encode(), "application/json")
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != "/predict":
+                return self.reply(404, b"not found\n", "text/plain")
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                x, size = decode_image(io.BytesIO(body), img_size)
+            except Exception as e:
+                return self.reply(400, ("cannot decode image: %s\n" % e).encode(), "text/plain")
+            # make_predict_fn reads the breed from the "path" of each item
+            breed = parse_qs(url.query).get("breed", [""])[0]
+            try:
+                output = batcher.submit(x, (breed, size))
+            except Exception as e:
+                return self.reply(500, ("prediction failed: %s\n" % e).encode(), "text/plain")
+            png = io.BytesIO()
+            Image.fromarray(output).save(png, format="PNG")
+            self.reply(200, png.getvalue(), "image/png")
+
+        def log_message(self, format, *args):
+            pass  # per-request logging costs more than the small models
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a trained model on localhost.")
+    parser.add_argument("model", help="trained oxford_*.h5")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8500)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--breeds-dir", default="images/", help="breed names for two-input colour models")
+    parser.add_argument("--native-size", action="store_true", help="return outputs at the original image size")
+    parser.add_argument("--tta", default="none", choices=sorted(tta_sets), help="test-time augmentation set")
+    args = parser.parse_args()
+
+    model = keras.models.load_model(args.model, compile=False)
+    task = get_task(model)
+    img_size = tuple(model.inputs[0].shape[1:3])
+    encoder = None
+    if task == "color2":
+        encoder, _ = get_breed_encoder(get_img_paths(args.breeds_dir, args.breeds_dir)[0])
+
+    if args.tta != "none":
+        model = tta_model(model, args.tta)
+    predict_fn = make_predict_fn(model, task, encoder, args.native_size)
+    batcher = MicroBatcher(predict_fn, img_size, args.max_batch, args.max_wait_ms)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(batcher, img_size))
+    print("serving %s (%s) on http://%s:%d" % (args.model, task, args.host, args.port))
+    server.serve_forever()
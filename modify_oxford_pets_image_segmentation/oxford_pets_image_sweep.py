@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Nov  9 09:58:02 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Parallel hyperparameter and architecture sweeps
+Description: Replaces copying a script per revision and editing `img_size`,
+`batch_size`, `epochs`, the filter lists and the loss by hand. A grid or
+random space over those knobs is expanded into trials, and each trial runs
+as its own process pinned (`sched_setaffinity`) to a disjoint set of cores,
+so a many-core machine runs several trials at once. The dataset is decoded
+once per `img_size` into uint8 .npy files that every trial memory-maps.
+Trials report their validation score per epoch to a shared directory and
+stop when they trail the best trial at the same epoch by `--stop-ratio`.
+Every finished trial is one row of `sweep_results.csv`.
+
+    python oxford_pets_image_sweep.py --task color --cores-per-trial 4 \
+        --space "img_size=128,160;batch_size=16,32;lr=1e-3,3e-4;loss=mae,mse;encoder_filters=32-64-128,64-128-256"
+    python oxford_pets_image_sweep.py --task seg --random 12 --space "lr=1e-4:3e-3;entry_filters=16,32;reduction=1,2"
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Knobs of a trial and their values when the space leaves them out
+defaults = {
+    "img_size": 160,
+    "batch_size": 32,
+    "epochs": 15,
+    "lr": 1e-3,
+    "optimizer": "adam",
+    "loss": None,  # per task, see task_defaults
+    "encoder_filters": "64-128-256",
+    "entry_filters": 32,
+    "reduction": 1,
+}
+task_defaults = {
+    "seg": {"loss": "sparse_categorical_crossentropy", "activation": "softmax", "score": "val_loss"},
+    # Colour losses differ between trials, so they are compared on MAE
+    "color": {"loss": "mae", "activation": "linear", "score": "val_mae"},
+}
+
+
+"""
+## Search space
+"""
+
+
+def parse_value(text):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_space(text):
+    """"name=a,b,c;name=lo:hi" -> {name: [values] or (lo, hi)}."""
+    space = {}
+    for item in filter(None, (part.strip() for part in text.split(";"))):
+        name, values = item.split("=", 1)
+        if name not in defaults:
+            raise ValueError("unknown knob %r, expected one of %s" % (name, ", ".join(defaults)))
+        if ":" in values:
+            lo, hi = values.split(":")
+            space[name] = (float(lo), float(hi))  # sampled log-uniform
+        else:
+            space[name] = [parse_value(v) for v in values.split(",")]
+    return space
+
+
+def grid_trials(space):
+    names = sorted(space)
+    if any(isinstance(space[name], tuple) for name in names):
+        raise ValueError("ranges (lo:hi) need --random")
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_trials(space, n, seed=1337):
+    rng = random.Random(seed)
+    trials = []
+    for _ in range(n):
+        trial = {}
+        for name in sorted(space):
+            values = space[name]
+            if isinstance(values, tuple):
+                trial[name] = math.exp(rng.uniform(math.log(values[0]), math.log(values[1])))
+            else:
+                trial[name] = rng.choice(values)
+        trials.append(trial)
+    return trials
+
+
+"""
+## Shared dataset cache
+"""
+
+
+def build_cache(img_size, cache_dir):
+    """Decodes the train/val split once into uint8 .npy files for `img_size`."""
+    from tensorflow.keras.preprocessing.image import load_img
+
+    from oxford_pets_image_data import get_img_paths, split_img_paths
+
+    prefix = os.path.join(cache_dir, "oxford_%d" % img_size)
+    if os.path.exists(prefix + ".done"):
+        return prefix
+    os.makedirs(cache_dir, exist_ok=True)
+    size = (img_size, img_size)
+    train_in, train_tg, val_in, val_tg = split_img_paths(*get_img_paths())
+    for split, inputs, targets in [("train", train_in, train_tg), ("val", val_in, val_tg)]:
+        x = np.lib.format.open_memmap("%s_%s_x.npy" % (prefix, split), "w+", "uint8", (len(inputs),) + size + (3,))
+        y = np.lib.format.open_memmap("%s_%s_y.npy" % (prefix, split), "w+", "uint8", (len(targets),) + size + (1,))
+        for i, (inp, tgt) in enumerate(zip(inputs, targets)):
+            x[i] = load_img(inp, target_size=size)
+            # Ground truth labels are 1, 2, 3. Subtract one to make them 0, 1, 2:
+            y[i] = np.expand_dims(load_img(tgt, target_size=size, color_mode="grayscale"), 2) - 1
+        x.flush()
+        y.flush()
+    open(prefix + ".done", "w").close()
+    return prefix
+
+
+"""
+## One trial (runs in its own pinned process)
+"""
+
+
+def run_trial(trial, trial_id, task, cache_dir, progress_dir, stop_ratio, grace):
+    import tensorflow as tf
+    from tensorflow import keras
+
+    from oxford_pets_image_models import get_model_lite
+
+    cores = len(os.sched_getaffinity(0))
+    tf.config.threading.set_intra_op_parallelism_threads(cores)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    params = dict(defaults, **trial)
+    settings = task_defaults[task]
+    loss = params["loss"] or settings["loss"]
+    prefix = build_cache(params["img_size"], cache_dir)
+    data = {split: (np.load("%s_%s_x.npy" % (prefix, split), mmap_mode="r"),
+                    np.load("%s_%s_y.npy" % (prefix, split), mmap_mode="r")) for split in ("train", "val")}
+
+    class MemmapSequence(keras.utils.Sequence):
+        def __init__(self, x, y, batch_size):
+            self.x, self.y, self.batch_size = x, y, batch_size
+
+        def __len__(self):
+            return len(self.x) // self.batch_size
+
+        def __getitem__(self, idx):
+            i = idx * self.batch_size
+            x = np.asarray(self.x[i : i + self.batch_size])
+            # Colour models regress the input image itself
+            return x, np.asarray(self.y[i : i + self.batch_size]) if task == "seg" else x
+
+    class StopLosers(keras.callbacks.Callback):
+        """Stops when this trial's score trails the best at the same epoch."""
+
+        def on_train_begin(self, logs=None):
+            open(os.path.join(progress_dir, "%s.jsonl" % trial_id), "w").close()
+
+        def on_epoch_end(self, epoch, logs=None):
+            score = logs.get(settings["score"])
+            if score is None:
+                return
+            with open(os.path.join(progress_dir, "%s.jsonl" % trial_id), "a") as f:
+                f.write(json.dumps({"epoch": epoch, "score": float(score)}) + "\n")
+            if epoch + 1 < grace:
+                return
+            best = min(best_at(progress_dir, epoch), default=score)
+            if score > best * stop_ratio:
+                print("trial %s: %.4f vs best %.4f at epoch %d, stopping" % (trial_id, score, best, epoch + 1))
+                self.model.stop_training = True
+                self.stopped = epoch + 1
+
+    encoder = tuple(int(v) for v in str(params["encoder_filters"]).split("-"))
+    model = get_model_lite(
+        (params["img_size"],) * 2,
+        3,
+        activation=settings["activation"],
+        reduction=params["reduction"],
+        encoder_filters=encoder,
+        # Mirror of the encoder plus the entry stage, as in the defaults
+        decoder_filters=encoder[::-1] + (params["entry_filters"],),
+        entry_filters=params["entry_filters"],
+    )
+    optimizer = keras.optimizers.get({"class_name": params["optimizer"], "config": {"learning_rate": params["lr"]}})
+    model.compile(optimizer=optimizer, loss=loss, metrics=["mae"] if task == "color" else None)
+
+    stopper = StopLosers()
+    stopper.stopped = None
+    t0 = time.perf_counter()
+    history = model.fit(
+        MemmapSequence(*data["train"], params["batch_size"]),
+        epochs=params["epochs"],
+        validation_data=MemmapSequence(*data["val"], params["batch_size"]),
+        callbacks=[stopper],
+        verbose=2,
+    )
+    scores = history.history.get(settings["score"], [])
+    return {
+        "epochs_run": len(scores),
+        "best_score": min(scores) if scores else None,
+        "seconds": time.perf_counter() - t0,
+        "stopped_early": stopper.stopped is not None,
+    }
+
+
+def best_at(progress_dir, epoch):
+    """Scores of every trial at `epoch` so far."""
+    for name in os.listdir(progress_dir):
+        with open(os.path.join(progress_dir, name)) as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # still being written by that trial
+                entry = json.loads(line)
+                if entry["epoch"] == epoch:
+                    yield entry["score"]
+
+
+"""
+## Scheduler
+"""
+
+
+def core_sets(cores_per_trial):
+    cores = sorted(os.sched_getaffinity(0))
+    return [cores[i : i + cores_per_trial] for i in range(0, len(cores) - cores_per_trial + 1, cores_per_trial)]
+
+
+def run_sweep(trials, task, cores_per_trial, out_dir, stop_ratio, grace):
+    cache_dir = os.path.join(out_dir, "cache")
+    progress_dir = os.path.join(out_dir, "progress")
+    # Scores of an earlier sweep into the same directory must not stop these trials
+    shutil.rmtree(progress_dir, ignore_errors=True)
+    os.makedirs(progress_dir)
+    # Decode once up front, not in several trials at the same time
+    for img_size in sorted({dict(defaults, **t)["img_size"] for t in trials}):
+        build_cache(img_size, cache_dir)
+
+    free = core_sets(cores_per_trial)
+    if not free:
+        raise ValueError("fewer than %d cores available" % cores_per_trial)
+    print("%d trials, %d at a time on %d cores each" % (len(trials), len(free), cores_per_trial))
+    table = os.path.join(out_dir, "sweep_results.csv")
+    fields = ["trial"] + list(defaults) + ["cores", "status", "epochs_run", "best_score", "seconds", "stopped_early"]
+    with open(table, "w", newline="") as f:
+        csv.DictWriter(f, fields).writeheader()
+
+    pending = list(enumerate(trials))
+    running = {}
+    while pending or running:
+        while pending and free:
+            i, trial = pending.pop(0)
+            cores = free.pop(0)
+            trial_id = "t%03d" % i
+            result = os.path.join(out_dir, trial_id + ".json")
+            cmd = [sys.executable, os.path.abspath(__file__), "--task", task, "--out", out_dir,
+                   "--stop-ratio", str(stop_ratio), "--grace", str(grace),
+                   "--trial", json.dumps(trial), "--trial-id", trial_id, "--result", result]
+            log = open(os.path.join(out_dir, trial_id + ".log"), "w")
+            proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT,
+                                    preexec_fn=lambda cores=cores: os.sched_setaffinity(0, cores))
+            running[proc] = (trial_id, trial, cores, result, log)
+        time.sleep(1.0)
+        for proc in [p for p in running if p.poll() is not None]:
+            trial_id, trial, cores, result, log = running.pop(proc)
+            log.close()
+            free.append(cores)
+            row = dict(defaults, **trial)
+            row.update(trial=trial_id, cores="%d-%d" % (cores[0], cores[-1]),
+                       status="ok" if proc.returncode == 0 else "failed (%d)" % proc.returncode)
+            if proc.returncode == 0:
+                with open(result) as f:
+                    row.update(json.load(f))
+            with open(table, "a", newline="") as f:
+                csv.DictWriter(f, fields).writerow(row)
+            print("%s %s: %s" % (trial_id, row["status"], row.get("best_score")))
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grid or random sweeps as pinned parallel processes.")
+    parser.add_argument("--task", default="seg", choices=sorted(task_defaults))
+    parser.add_argument("--space", default="", help='e.g. "lr=1e-3,3e-4;batch_size=16,32" or "lr=1e-4:1e-2"')
+    parser.add_argument("--random", type=int, default=0, help="sample this many trials instead of the grid")
+    parser.add_argument("--cores-per-trial", type=int, default=4)
+    parser.add_argument("--stop-ratio", type=float, default=1.25, help="stop at this many times the best score")
+    parser.add_argument("--grace", type=int, default=3, help="epochs before a trial can be stopped")
+    parser.add_argument("--out", default="sweep/")
+    # Set by the scheduler for a trial process
+    parser.add_argument("--trial", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--trial-id", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--result", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.trial:
+        summary = run_trial(json.loads(args.trial), args.trial_id, args.task, os.path.join(args.out, "cache"),
+                            os.path.join(args.out, "progress"), args.stop_ratio, args.grace)
+        with open(args.result, "w") as f:
+            json.dump(summary, f)
+    else:
+        space = parse_space(args.space)
+        trials = random_trials(space, args.random) if args.random else grid_trials(space)
+        print("results:", run_sweep(trials, args.task, args.cores_per_trial, args.out, args.stop_ratio, args.grace))
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 09:21:44 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Post-training int8 quantization of trained models to TFLite
+Description: Converts a trained `oxford_*.h5` (single-input `get_model*` or
+two-input `get_model2*`) to a fully integer TFLite model, calibrated on
+training batches from the OxfordPets `Sequence` classes, then reports IoU/MAE
+drift against the float model and CPU latency with and without XNNPACK.
+
+    python oxford_pets_image_tflite.py oxford_segmentation.h5
+    python oxford_pets_image_tflite.py oxford_gen_color_r4.h5 --calibration 300
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from oxford_pets_image_data import get_task_sequences
+from oxford_pets_image_models import get_task
+
+
+"""
+## Convert with a representative dataset
+"""
+
+
+def as_list(x):
+    return list(x) if isinstance(x, (list, tuple)) else [x]
+
+
+def representative_dataset(gen, n_samples):
+    """Yields single calibration samples (one list entry per model input)."""
+
+    def dataset():
+        count = 0
+        for idx in range(len(gen)):
+            inputs = as_list(gen[idx][0])
+            for j in range(len(inputs[0])):
+                yield [x[j : j + 1].astype("float32") for x in inputs]
+                count += 1
+                if count >= n_samples:
+                    return
+
+    return dataset
+
+
+def convert_int8(model, gen, n_samples):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset(gen, n_samples)
+    # Integer-only kernels, uint8 images in and quantized maps out
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    converter.inference_output_type = tf.uint8
+    return converter.convert()
+
+
+"""
+## Run the int8 model
+"""
+
+
+class TFLiteModel:
+    """Batch-of-one TFLite runner that takes and returns float arrays."""
+
+    def __init__(self, tflite_model, keras_model, num_threads=None, xnnpack=True):
+        kwargs = {"model_content": tflite_model, "num_threads": num_threads}
+        if not xnnpack:
+            kwargs["experimental_op_resolver_type"] = (
+                tf.lite.experimental.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+            )
+        self.interpreter = tf.lite.Interpreter(**kwargs)
+        self.interpreter.allocate_tensors()
+        details = self.interpreter.get_input_details()
+        # Match TFLite inputs to the Keras input order by channel count
+        self.input_details = []
+        for tensor in keras_model.inputs:
+            used = [d["index"] for d in self.input_details]
+            match = [d for d in details if d["shape"][-1] == tensor.shape[-1] and d["index"] not in used]
+            self.input_details.append(match[0])
+        self.output_details = self.interpreter.get_output_details()[0]
+
+    def quantize_inputs(self, inputs):
+        out = []
+        for x, detail in zip(inputs, self.input_details):
+            scale, zero_point = detail["quantization"]
+            q = np.round(x.astype("float32") / scale + zero_point)
+            out.append(np.clip(q, 0, 255).astype(detail["dtype"]))
+        return out
+
+    def invoke(self, quantized):
+        for q, detail in zip(quantized, self.input_details):
+            self.interpreter.set_tensor(detail["index"], q)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_details["index"])
+
+    def predict(self, inputs):
+        """Float predictions for a batch, one invoke per image."""
+        inputs = as_list(inputs)
+        scale, zero_point = self.output_details["quantization"]
+        preds = []
+        for j in range(len(inputs[0])):
+            q = self.invoke(self.quantize_inputs([x[j : j + 1] for x in inputs]))
+            preds.append((q.astype("float32") - zero_point) * scale)
+        return np.concatenate(preds)
+
+
+"""
+## Drift and latency report
+"""
+
+
+def evaluate(model, tflite, gen, task, n_samples):
+    """Task metric for float and int8 models plus their disagreement."""
+    num_classes = model.output_shape[-1]
+    confusion = {"float": 0, "int8": 0}
+    sums = {"float": 0.0, "int8": 0.0, "drift": 0.0, "agree": 0.0, "pixels": 0}
+    seen = 0
+    for idx in range(len(gen)):
+        x, y = gen[idx]
+        p_float = model.predict_on_batch(x)
+        p_int8 = tflite.predict(x)
+        if task == "seg":
+            true = y.ravel().astype("int64")
+            for key, p in [("float", p_float), ("int8", p_int8)]:
+                pred = np.argmax(p, axis=-1).ravel()
+                confusion[key] = confusion[key] + np.bincount(
+                    true * num_classes + pred, minlength=num_classes * num_classes
+                ).reshape(num_classes, num_classes)
+            sums["agree"] += np.sum(np.argmax(p_float, -1) == np.argmax(p_int8, -1))
+        else:
+            y = y.astype("float32")
+            sums["float"] += np.abs(p_float - y).sum()
+            sums["int8"] += np.abs(p_int8 - y).sum()
+            sums["drift"] += np.abs(p_float - p_int8).sum()
+        sums["pixels"] += p_float[..., 0].size if task == "seg" else p_float.size
+        seen += len(p_float)
+        if seen >= n_samples:
+            break
+
+    report = {"samples": seen}
+    if task == "seg":
+        for key in ["float", "int8"]:
+            cm = confusion[key]
+            inter = np.diag(cm)
+            union = cm.sum(0) + cm.sum(1) - inter
+            present = union > 0
+            report["miou_" + key] = float((inter[present] / union[present]).mean())
+        report["miou_drift"] = report["miou_int8"] - report["miou_float"]
+        report["argmax_agreement"] = sums["agree"] / sums["pixels"]
+    else:
+        report["mae_float"] = sums["float"] / sums["pixels"]
+        report["mae_int8"] = sums["int8"] / sums["pixels"]
+        report["mae_float_vs_int8"] = sums["drift"] / sums["pixels"]
+    return report
+
+
+def latency(run, repeats):
+    """Median seconds per call of `run` after one warm-up call."""
+    run()
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times))
+
+
+def export(path, out_path, calibration, eval_samples, num_threads, repeats, color_target):
+    model = keras.models.load_model(path, compile=False)
+    task = get_task(model)
+    img_size = tuple(model.input_shape[0][1:3] if task == "color2" else model.input_shape[1:3])
+    n_uniq = model.input_shape[1][-1] if task == "color2" else None
+    train_gen, val_gen = get_task_sequences(task, 8, img_size, n_uniq, color_target)
+
+    tflite_model = convert_int8(model, train_gen, calibration)
+    with open(out_path, "wb") as f:
+        f.write(tflite_model)
+
+    runner = TFLiteModel(tflite_model, model, num_threads=num_threads)
+    report = {"task": task, "float_mb": os.path.getsize(path) / 2**20, "int8_mb": len(tflite_model) / 2**20}
+    report.update(evaluate(model, runner, val_gen, task, eval_samples))
+
+    sample = [x[:1] for x in as_list(val_gen[0][0])]
+    sample = sample if len(sample) > 1 else sample[0]
+    report["ms_keras_float"] = 1e3 * latency(lambda: model.predict_on_batch(sample), repeats)
+    quantized = runner.quantize_inputs(as_list(sample))
+    report["ms_int8_xnnpack"] = 1e3 * latency(lambda: runner.invoke(quantized), repeats)
+    plain = TFLiteModel(tflite_model, model, num_threads=num_threads, xnnpack=False)
+    report["ms_int8_builtin"] = 1e3 * latency(lambda: plain.invoke(quantized), repeats)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a trained model to int8 TFLite.")
+    parser.add_argument("models", nargs="+", help="trained oxford_*.h5 checkpoints")
+    parser.add_argument("--calibration", type=int, default=200, help="training images used for calibration")
+    parser.add_argument("--eval-samples", type=int, default=1000, help="validation images used for drift")
+    parser.add_argument("--threads", type=int, default=None, help="interpreter threads")
+    parser.add_argument("--repeats", type=int, default=50, help="timed calls per latency figure")
+    parser.add_argument(
+        "--color-target", choices=["image", "trimap"], default="image",
+        help="regression target of single-input colour models",
+    )
+    args = parser.parse_args()
+
+    for path in args.models:
+        out_path = os.path.splitext(path)[0] + "_int8.tflite"
+        report = export(
+            path, out_path, args.calibration, args.eval_samples, args.threads, args.repeats, args.color_target
+        )
+        lines = ["%s -> %s" % (path, out_path)]
+        lines += ["  %-20s %s" % (k, ("%.4f" % v) if isinstance(v, float) else v) for k, v in report.items()]
+        print("\n".join(lines))
+        fw = open(os.path.splitext(path)[0] + "_int8.txt", "w")
+        fw.write("\n".join(lines) + "\n")
+        fw.close()
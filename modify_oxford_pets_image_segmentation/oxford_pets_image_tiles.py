@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 23 10:27:36 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Tiled sliding-window inference at native resolution
+Description: Runs the fully convolutional single-input `get_model*` networks
+over images larger than their training `img_size` without resizing. The image
+is cut into overlapping tiles of `img_size`, tiles are batched through the
+model and blended with a linear-ramp window. Tiles are processed one band of
+rows at a time, so the float accumulator is one tile high and the result is
+written band by band into a uint8 .npy memmap.
+
+Input rows are read band by band from `.npy` (memory-mapped) images. JPEG and
+PNG files are decoded by PIL as a whole first, so for gigapixel inputs convert
+them to .npy once.
+
+    python oxford_pets_image_tiles.py oxford_segmentation.h5 big_photo.jpg --overlap 32
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from PIL import Image
+from tensorflow import keras
+
+from oxford_pets_image_infer import postprocess
+from oxford_pets_image_models import get_task
+
+
+"""
+## Image sources read one band of rows at a time
+"""
+
+
+class ArraySource:
+    """Rows of an HxWx3 uint8 array (an np.load memmap for large images)."""
+
+    def __init__(self, array):
+        self.array = array
+        self.shape = array.shape[:2]
+
+    def read(self, y0, y1):
+        return np.asarray(self.array[y0:y1, :, :3], dtype="uint8")
+
+
+def open_source(path, tile_size):
+    """ArraySource for `path`, edge-padded up to at least one tile."""
+    if path.endswith(".npy"):
+        array = np.load(path, mmap_mode="r")
+    else:
+        Image.MAX_IMAGE_PIXELS = None
+        with Image.open(path) as img:
+            array = np.asarray(img.convert("RGB"), dtype="uint8")
+    pad_h = max(tile_size[0] - array.shape[0], 0)
+    pad_w = max(tile_size[1] - array.shape[1], 0)
+    if pad_h or pad_w:
+        array = np.pad(np.asarray(array), ((0, pad_h), (0, pad_w), (0, 0)), mode="edge")
+    return ArraySource(array)
+
+
+"""
+## Tiling
+"""
+
+
+def tile_positions(length, tile, stride):
+    """Tile origins covering [0, length), the last one flush with the end."""
+    positions = list(range(0, length - tile + 1, stride))
+    if positions[-1] != length - tile:
+        positions.append(length - tile)
+    return positions
+
+
+def blend_window(tile_size, overlap):
+    """Weights that ramp linearly across the overlap, so neighbours cross-fade."""
+    ramps = []
+    for tile in tile_size:
+        w = np.ones(tile, dtype="float32")
+        n = min(overlap, tile // 2)
+        if n:
+            ramp = (np.arange(n, dtype="float32") + 0.5) / n
+            w[:n] = ramp
+            w[-n:] = ramp[::-1]
+        ramps.append(w)
+    return np.outer(ramps[0], ramps[1])[..., None]
+
+
+def predict_tiled(model, source, tile_size, overlap, batch_size, out, task):
+    """Writes the blended, post-processed prediction of `source` into `out`.
+
+    Rows [ty, next_ty) are final once the tiles of row `ty` are added, so the
+    accumulator only ever holds one tile height of the full width.
+    """
+    th, tw = tile_size
+    height, width = source.shape
+    stride_y = max(th - overlap, 1)
+    stride_x = max(tw - overlap, 1)
+    rows = tile_positions(height, th, stride_y)
+    cols = tile_positions(width, tw, stride_x)
+    window = blend_window(tile_size, overlap)
+    channels = model.output_shape[-1]
+
+    acc = np.zeros((th, width, channels), dtype="float32")
+    weight = np.zeros((th, width, 1), dtype="float32")
+    x = np.zeros((batch_size, th, tw, 3), dtype="uint8")
+    n_tiles = 0
+    for i, ty in enumerate(rows):
+        band = source.read(ty, ty + th)
+        for start in range(0, len(cols), batch_size):
+            chunk = cols[start : start + batch_size]
+            for j, tx in enumerate(chunk):
+                x[j] = band[:, tx : tx + tw]
+            # Full-size buffer keeps one traced shape for every call
+            preds = model.predict_on_batch(x)
+            for j, tx in enumerate(chunk):
+                acc[:, tx : tx + tw] += preds[j] * window
+                weight[:, tx : tx + tw] += window
+            n_tiles += len(chunk)
+
+        next_ty = rows[i + 1] if i + 1 < len(rows) else ty + th
+        n = next_ty - ty
+        out[ty : ty + n] = postprocess(task, acc[:n] / weight[:n])[:, : out.shape[1]]
+        # Shift the unfinished rows up and clear the rows the next band adds
+        acc[:-n] = acc[n:]
+        acc[-n:] = 0
+        weight[:-n] = weight[n:]
+        weight[-n:] = 0
+    return n_tiles
+
+
+def segment_large_image(model, path, out_path, overlap=32, batch_size=16, png_max_pixels=64 * 2**20):
+    """Tiled prediction of one image into `out_path` (.npy, plus .png if small)."""
+    task = get_task(model)
+    if task == "color2":
+        raise ValueError("tiled inference supports the single-input get_model* networks")
+    tile_size = tuple(model.inputs[0].shape[1:3])
+    source = open_source(path, tile_size)
+    if path.endswith(".npy"):
+        height, width = np.load(path, mmap_mode="r").shape[:2]
+    else:
+        with Image.open(path) as img:
+            width, height = img.size
+    shape = (height, width) if task == "seg" else (height, width, model.output_shape[-1])
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    out = np.lib.format.open_memmap(out_path, mode="w+", dtype="uint8", shape=shape)
+    # Images smaller than a tile are padded: predict them in memory, keep the real rows
+    full = out if source.shape[0] == height else np.zeros((source.shape[0],) + shape[1:], dtype="uint8")
+    t0 = time.perf_counter()
+    n_tiles = predict_tiled(model, source, tile_size, overlap, batch_size, full, task)
+    seconds = time.perf_counter() - t0
+    if full is not out:
+        out[:] = full[:height]
+    if height * width <= png_max_pixels:
+        Image.fromarray(np.asarray(out)).save(os.path.splitext(out_path)[0] + ".png")
+    out.flush()
+    return n_tiles, seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tiled inference for images larger than img_size.")
+    parser.add_argument("model", help="trained oxford_*.h5 (single input)")
+    parser.add_argument("images", nargs="+", help=".jpg/.png images or HxWx3 uint8 .npy arrays")
+    parser.add_argument("--output", default="out/tiles/", help="output directory")
+    parser.add_argument("--overlap", type=int, default=32, help="pixels shared by neighbouring tiles")
+    parser.add_argument("--batch-size", type=int, default=16, help="tiles per predict call")
+    args = parser.parse_args()
+
+    model = keras.models.load_model(args.model, compile=False)
+    for path in args.images:
+        out_path = os.path.join(args.output, os.path.splitext(os.path.basename(path))[0] + ".npy")
+        n_tiles, seconds = segment_large_image(model, path, out_path, args.overlap, args.batch_size)
+        print("%s: %d tiles in %.1fs (%.1f tiles/s) -> %s" % (
+            path, n_tiles, seconds, n_tiles / max(seconds, 1e-9), out_path))
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 28 09:21:53 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Batched test-time augmentation
+Description: Wraps a trained model so that every augmented view of a batch
+(flips, zoom in / zoom out inside the fixed `img_size` frame) is stacked into
+one larger tensor and run in a single call. The outputs are un-augmented and
+averaged in the graph: softmax probabilities for `get_model`, the linear
+outputs for `get_model1`/`get_model2`. Zoomed views only cover part of the
+frame, so the average is weighted by where each view has a prediction.
+
+    python oxford_pets_image_tta.py oxford_segmentation.h5 --sets none,flip,flip4,scale,flip_scale
+    python oxford_pets_image_infer.py oxford_segmentation.h5 input/ --tta flip
+"""
+
+import argparse
+import time
+
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+
+from oxford_pets_image_data import get_task_sequences
+from oxford_pets_image_evaluate import evaluate_streaming
+from oxford_pets_image_models import get_task
+
+# (horizontal flip, vertical flip, zoom) per view, the first one is the identity
+tta_sets = {
+    "none": [(False, False, 1.0)],
+    "flip": [(False, False, 1.0), (True, False, 1.0)],
+    "flip4": [(False, False, 1.0), (True, False, 1.0), (False, True, 1.0), (True, True, 1.0)],
+    "scale": [(False, False, 1.0), (False, False, 0.75), (False, False, 1.25)],
+    "flip_scale": [(flip, False, zoom) for zoom in (1.0, 0.75, 1.25) for flip in (False, True)],
+}
+
+
+"""
+## Augment and un-augment inside the graph
+"""
+
+
+def _window(size, zoom):
+    """(offset, length) of the zoomed region inside a frame of `size` pixels."""
+    length = int(round(size / zoom)) if zoom > 1 else int(round(size * zoom))
+    return (size - length) // 2, length
+
+
+def _flip(t, hflip, vflip):
+    if hflip:
+        t = tf.reverse(t, axis=[2])
+    if vflip:
+        t = tf.reverse(t, axis=[1])
+    return t
+
+
+def augment(x, view, img_size):
+    """One augmented view of a float batch, same shape as `x`."""
+    hflip, vflip, zoom = view
+    x = _flip(x, hflip, vflip)
+    (top, h), (left, w) = _window(img_size[0], zoom), _window(img_size[1], zoom)
+    if zoom > 1:
+        # Zoom in: the centre crop fills the frame
+        x = tf.image.resize(x[:, top : top + h, left : left + w], img_size)
+    elif zoom < 1:
+        # Zoom out: the whole image shrunk into the centre, mirrored borders
+        x = tf.image.resize(x, (h, w))
+        pad = [[0, 0], [top, img_size[0] - h - top], [left, img_size[1] - w - left], [0, 0]]
+        x = tf.pad(x, pad, mode="REFLECT")
+    return x
+
+
+def unaugment(y, view, img_size):
+    """Maps a view's output back onto the frame; returns (output, weight)."""
+    hflip, vflip, zoom = view
+    (top, h), (left, w) = _window(img_size[0], zoom), _window(img_size[1], zoom)
+    weight = tf.ones_like(y[..., :1])
+    if zoom > 1:
+        # Only the centre of the frame was seen
+        y = tf.image.resize(y, (h, w))
+        pad = [[0, 0], [top, img_size[0] - h - top], [left, img_size[1] - w - left], [0, 0]]
+        y = tf.pad(y, pad)
+        weight = tf.pad(weight[:, :h, :w], pad)
+    elif zoom < 1:
+        y = tf.image.resize(y[:, top : top + h, left : left + w], img_size)
+    return _flip(y, hflip, vflip), _flip(weight, hflip, vflip)
+
+
+def tta_model(model, views):
+    """`model` wrapped to run all `views` as one batch and average the outputs."""
+    if isinstance(views, str):
+        views = tta_sets[views]
+    img_size = tuple(model.inputs[0].shape[1:3])
+    n = len(views)
+    inputs = [keras.Input(shape=t.shape[1:], name="tta_" + t.name.split(":")[0]) for t in model.inputs]
+
+    def stack(x):
+        x = tf.cast(x, tf.float32)
+        return tf.concat([augment(x, view, img_size) for view in views], axis=0)
+
+    def merge(y):
+        total = 0.0
+        weight = 0.0
+        for view, part in zip(views, tf.split(y, n, axis=0)):
+            part, w = unaugment(part, view, img_size)
+            total += part * w
+            weight += w
+        return total / weight
+
+    big = [layers.Lambda(stack, name="tta_views")(inputs[0])]
+    # Breed masks are constant over the image, repeated as they are
+    big += [layers.Lambda(lambda m: tf.tile(m, [n, 1, 1, 1]))(extra) for extra in inputs[1:]]
+    outputs = layers.Lambda(merge, name="tta_merge")(model(big if len(big) > 1 else big[0]))
+    return keras.Model(inputs, outputs, name=model.name + "_tta")
+
+
+"""
+## Cost and gain per TTA set
+"""
+
+
+def images_per_second(model, x, repeats=10):
+    model.predict_on_batch(x)
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        model.predict_on_batch(x)
+    batch = len(x[0]) if isinstance(x, list) else len(x)
+    return batch * repeats / (time.perf_counter() - t0)
+
+
+def compare(model, sets, batch_size=16, color_target="image"):
+    task = get_task(model)
+    img_size = tuple(model.inputs[0].shape[1:3])
+    n_uniq = model.inputs[1].shape[-1] if task == "color2" else None
+    _, val_gen = get_task_sequences(task, batch_size, img_size, n_uniq, color_target)
+    metric = "mIoU" if task == "seg" else "MAE"
+    x = val_gen[0][0]
+
+    rows = []
+    for name in sets:
+        wrapped = model if name == "none" else tta_model(model, name)
+        metrics = evaluate_streaming(wrapped, val_gen, task)
+        score = metrics["mean_iou"] if task == "seg" else metrics["mae"]
+        rows.append((name, len(tta_sets[name]), images_per_second(wrapped, x), score))
+
+    base_speed, base_score = rows[0][2], rows[0][3]
+    print("%-10s %5s %9s %7s %10s %9s" % ("set", "views", "img/s", "cost", metric, "gain"))
+    for name, n_views, speed, score in rows:
+        # Higher mIoU is better, lower MAE is better
+        gain = score - base_score if task == "seg" else base_score - score
+        print("%-10s %5d %9.1f %6.2fx %10.4f %+9.4f" % (name, n_views, speed, base_speed / speed, score, gain))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cost and accuracy gain of test-time augmentation sets.")
+    parser.add_argument("model", help="trained oxford_*.h5")
+    parser.add_argument("--sets", default="none,flip,flip4,scale,flip_scale", help="comma separated, see tta_sets")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--color-target", default="image", choices=["image", "trimap"])
+    args = parser.parse_args()
+
+    sets = args.sets.split(",")
+    if sets[0] != "none":
+        sets.insert(0, "none")  # the baseline for cost and gain
+    compare(keras.models.load_model(args.model, compile=False), sets, args.batch_size, args.color_target)
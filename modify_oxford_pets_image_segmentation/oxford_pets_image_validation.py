@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Nov 13 09:44:05 2026
+
+@author: schomsin
+"""
+
+"""
+Title: In-memory validation set on a schedule
+Description: The validation split never changes, yet `validation_data=val_gen`
+decodes its 1,000 JPEGs (and PNG trimaps) again at the end of every epoch.
+`decode_split` decodes it once into uint8 arrays: the images, the trimap
+labels for segmentation and, for the breed-mask models (Rev3/Rev4), one
+one-hot row per image that is broadcast to a mask per batch (about 49 MB of
+images at 128x128). `ScheduledValidation` replaces `validation_data`:
+it validates every N epochs and/or every M steps, on a fixed subset
+stratified by breed if one is given, and on the full set at the last epoch
+(or at train end when training stopped early). The results go into the epoch
+logs as `val_*`, so checkpoint callbacks after it see them on the epochs it
+runs.
+"""
+
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras.preprocessing.image import load_img
+
+from oxford_pets_image_data import breed_name
+
+
+class ValidationSet:
+    """uint8 images, optional uint8 targets and optional one-hot breed rows."""
+
+    def __init__(self, x, y=None, breeds=None):
+        self.x = x
+        self.y = y  # None: the target is the image itself
+        self.breeds = breeds
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.x, self.y, self.breeds) if a is not None)
+
+    def batch(self, idx):
+        """(inputs, target) of the images at `idx`, as the Sequences return them."""
+        x = self.x[idx]
+        y = x if self.y is None else self.y[idx]
+        if self.breeds is None:
+            return x, y
+        rows = self.breeds[idx][:, None, None, :]
+        return [x, np.broadcast_to(rows, x.shape[:3] + rows.shape[-1:])], y
+
+
+def decode_split(input_paths, img_size, target_paths=None, encoder=None):
+    """Decodes a split once. `target_paths`: trimaps for segmentation labels;
+    `encoder`: the breed LabelBinarizer of the breed-mask models."""
+    x = np.zeros((len(input_paths),) + img_size + (3,), dtype="uint8")
+    for j, path in enumerate(input_paths):
+        x[j] = load_img(path, target_size=img_size)
+    y = None
+    if target_paths is not None:
+        y = np.zeros((len(target_paths),) + img_size + (1,), dtype="uint8")
+        for j, path in enumerate(target_paths):
+            img = load_img(path, target_size=img_size, color_mode="grayscale")
+            # Ground truth labels are 1, 2, 3. Subtract one to make them 0, 1, 2:
+            y[j] = np.expand_dims(img, 2) - 1
+    breeds = None
+    if encoder is not None:
+        breeds = encoder.transform([breed_name(path) for path in input_paths]).astype("uint8")
+    return ValidationSet(x, y, breeds)
+
+
+def stratified_subset(input_paths, size, seed=1337):
+    """Sorted indices of `size` images, each breed in proportion to the split."""
+    groups = {}
+    for i, path in enumerate(input_paths):
+        groups.setdefault(breed_name(path), []).append(i)
+    rng = np.random.RandomState(seed)
+    picked = []
+    for name in sorted(groups):
+        members = groups[name]
+        take = min(len(members), max(1, int(round(size * len(members) / len(input_paths)))))
+        picked.extend(rng.choice(members, take, replace=False))
+    return np.sort(np.array(picked, dtype="int64"))
+
+
+class ScheduledValidation(keras.callbacks.Callback):
+    """Validates a `ValidationSet` every `every_epochs` epochs and/or every
+    `every_steps` steps, on `subset` (indices) until the full-set pass at the end.
+
+    `epochs` is the last epoch of the whole run, which is not `fit`'s own
+    `epochs` when the run is split over several fits (a resumed partial epoch).
+    Without it, the full set is validated at the end of every fit.
+
+    Evaluation runs its own loop, so the training metrics of the running epoch
+    are not reset by a mid-epoch check.
+    """
+
+    def __init__(self, val_set, batch_size=32, every_epochs=1, every_steps=None, subset=None, metrics=(),
+                 epochs=None):
+        super().__init__()
+        self.val_set = val_set
+        self.batch_size = batch_size
+        self.every_epochs = every_epochs
+        self.every_steps = every_steps
+        self.subset = subset
+        self.metrics = metrics
+        self.epochs = epochs
+        self.history = []  # (epoch, step, full, results)
+
+    def on_train_begin(self, logs=None):
+        self.step = 0
+        self.epoch_done = 0
+        self.last_full = False
+        self.predict = tf.function(lambda x: self.model(x, training=False))
+        self.loss_fn = keras.losses.get(self.model.loss)
+        self.metric_fns = {name: keras.losses.get(name) for name in self.metrics}
+
+    def evaluate(self, full):
+        indices = np.arange(len(self.val_set)) if full or self.subset is None else self.subset
+        totals = dict.fromkeys(["loss"] + list(self.metric_fns), 0.0)
+        t0 = time.perf_counter()
+        for i in range(0, len(indices), self.batch_size):
+            idx = indices[i : i + self.batch_size]
+            x, y = self.val_set.batch(idx)
+            pred = self.predict(x)
+            totals["loss"] += float(tf.reduce_mean(self.loss_fn(y, pred))) * len(idx)
+            for name, fn in self.metric_fns.items():
+                totals[name] += float(tf.reduce_mean(fn(y, pred))) * len(idx)
+        results = {"val_" + name: total / len(indices) for name, total in totals.items()}
+        print("validation on %d images (%s) in %.1fs: %s" % (
+            len(indices), "full" if full or self.subset is None else "subset", time.perf_counter() - t0,
+            " ".join("%s=%.4f" % item for item in results.items())))
+        self.last_full = full or self.subset is None
+        return results
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.step += 1
+        if self.every_steps and self.step % self.every_steps == 0:
+            self.history.append((None, self.step, False, self.evaluate(full=False)))
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epoch_done = epoch + 1
+        last = epoch + 1 == self.epochs
+        if not last and (not self.every_epochs or (epoch + 1) % self.every_epochs):
+            self.last_full = False
+            return
+        results = self.evaluate(full=last)
+        self.history.append((epoch + 1, self.step, last, results))
+        if logs is not None:
+            logs.update(results)
+
+    def on_train_end(self, logs=None):
+        # A fit that only covers part of the run ends without the full pass
+        finished = self.epochs is None or self.model.stop_training or self.epoch_done >= self.epochs
+        if finished and not self.last_full:
+            self.history.append((None, self.step, True, self.evaluate(full=True)))
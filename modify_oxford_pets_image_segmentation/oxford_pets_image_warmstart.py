@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Nov 17 10:12:40 2026
+
+@author: schomsin
+"""
+
+"""
+Title: Warm-start a new revision from an earlier one
+Description: Every revision (`oxford_gen_color.h5`, `_r1` to `_r4`, `_r2_sht`)
+trained from scratch, although most of its layers have the shapes of the
+previous revision's. `warm_start` maps the layers with weights of two models by
+structural position: both lists, in graph order, are aligned on
+(layer class, weight ranks) so inserted or removed layers only shift the match.
+Each matched layer is then
+- transferred when every weight has the same shape,
+- partially copied when only channel counts differ (the overlapping slice of
+  the old weights goes over the new layer's initial values, e.g. when a
+  revision widens a conv from 64 to 128 filters),
+- left as initialized otherwise, as are the unmatched layers and layers with a
+  different number of weights (a conv with and one without a bias).
+The names of the layers do not matter, so auto-named layers (`conv2d_12`) of
+different revisions still match. `fit_warm_started` can train with the
+transferred layers frozen for the first epochs.
+
+    python oxford_pets_image_warmstart.py oxford_gen_color_r3.h5 new_r4_untrained.h5 --output r4_warm.h5
+    python oxford_pets_image_warmstart.py oxford_segmentation.h5 --builder oxford_pets_image_models:get_model_lite --img-size 160
+"""
+
+import argparse
+import difflib
+
+from tensorflow import keras
+
+from oxford_pets_image_heads import custom_objects
+from oxford_pets_image_models import load_builder
+
+
+def weighted_layers(model):
+    return [layer for layer in model.layers if layer.get_weights()]
+
+
+def signature(layer):
+    return (type(layer).__name__, tuple(w.ndim for w in layer.get_weights()))
+
+
+def align(old_layers, new_layers):
+    """(old, new) layer pairs by structural position."""
+    old_sigs = [signature(layer) for layer in old_layers]
+    new_sigs = [signature(layer) for layer in new_layers]
+    pairs = []
+    matcher = difflib.SequenceMatcher(None, old_sigs, new_sigs, autojunk=False)
+    for tag, i0, i1, j0, j1 in matcher.get_opcodes():
+        if tag == "equal":
+            pairs.extend(zip(old_layers[i0:i1], new_layers[j0:j1]))
+        elif tag == "replace":
+            # Same position, different weight layout: pair up layers of the same class
+            pairs.extend((old, new) for old, new in zip(old_layers[i0:i1], new_layers[j0:j1])
+                         if type(old) is type(new))
+    return pairs
+
+
+def overlap_copy(old, new):
+    """`new` with the overlapping slice of `old`, or None unless only the
+    channel axes (the last two, or the only one) differ."""
+    if old.ndim != new.ndim or old.shape[:-2] != new.shape[:-2]:
+        return None
+    out = new.copy()
+    region = tuple(slice(0, min(a, b)) for a, b in zip(old.shape, new.shape))
+    out[region] = old[region]
+    return out
+
+
+def warm_start(model, source):
+    """Copies matching weights of `source` (a model or an .h5 path) into
+    `model`. Returns the report: rows of (new layer, old layer or None, status)."""
+    if isinstance(source, str):
+        source = keras.models.load_model(source, custom_objects=custom_objects, compile=False)
+    new_layers = weighted_layers(model)
+    pairs = dict((id(new), old) for old, new in align(weighted_layers(source), new_layers))
+    report = []
+    for layer in new_layers:
+        old = pairs.get(id(layer))
+        if old is None:
+            report.append((layer, None, "reinitialized"))
+            continue
+        old_weights = old.get_weights()
+        new_weights = layer.get_weights()
+        if len(old_weights) != len(new_weights):
+            report.append((layer, old, "reinitialized"))
+            continue
+        if all(o.shape == n.shape for o, n in zip(old_weights, new_weights)):
+            layer.set_weights(old_weights)
+            report.append((layer, old, "transferred"))
+            continue
+        copies = [overlap_copy(o, n) for o, n in zip(old_weights, new_weights)]
+        if any(c is None for c in copies):
+            report.append((layer, old, "reinitialized"))
+        else:
+            layer.set_weights(copies)
+            report.append((layer, old, "partial"))
+    return report
+
+
+def print_report(report, summary=None):
+    lines = []
+    for layer, old, status in report:
+        shapes = " ".join("x".join(str(d) for d in w.shape) for w in layer.get_weights()[:1])
+        old_shapes = "" if old is None else " ".join("x".join(str(d) for d in w.shape) for w in old.get_weights()[:1])
+        lines.append("%-14s %-28s <- %-28s %s%s" % (
+            status, layer.name, "-" if old is None else old.name, shapes,
+            " (was %s)" % old_shapes if status == "partial" else ""))
+    counts = dict((s, sum(1 for _, _, st in report if st == s)) for s in ("transferred", "partial", "reinitialized"))
+    params = dict.fromkeys(counts, 0)
+    for layer, _, status in report:
+        params[status] += layer.count_params()
+    total = max(sum(params.values()), 1)
+    lines.append(", ".join("%d %s (%.0f%% of the weights)" % (counts[s], s, 100.0 * params[s] / total)
+                           for s in counts))
+    print("\n".join(lines))
+    if summary:
+        fw = open(summary, "w")
+        fw.write("\n".join(lines) + "\n")
+        fw.close()
+
+
+def fit_warm_started(model, report, compile_kwargs, train_gen, epochs, freeze_epochs=0, **fit_kwargs):
+    """Fits `model` with the transferred layers frozen for `freeze_epochs`
+    epochs, then all of it. The model is compiled for each phase because Keras
+    only picks up `trainable` changes on compile."""
+    transferred = [layer for layer, _, status in report if status == "transferred"]
+    history = None
+    if freeze_epochs:
+        for layer in transferred:
+            layer.trainable = False
+        model.compile(**compile_kwargs)
+        history = model.fit(train_gen, epochs=min(freeze_epochs, epochs), **fit_kwargs)
+        for layer in transferred:
+            layer.trainable = True
+    if freeze_epochs < epochs:
+        model.compile(**compile_kwargs)
+        history = model.fit(train_gen, epochs=epochs, initial_epoch=freeze_epochs, **fit_kwargs)
+    return history
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy matching layers of an earlier revision into a new model.")
+    parser.add_argument("source", help="trained earlier revision (.h5)")
+    parser.add_argument("target", nargs="?", default=None, help="new model (.h5), or use --builder")
+    parser.add_argument("--builder", default=None, help="module:function building the new model")
+    parser.add_argument("--img-size", type=int, default=160)
+    parser.add_argument("--num-classes", type=int, default=3)
+    parser.add_argument("--activation", default="softmax")
+    parser.add_argument("--output", default=None, help="save the warm-started model here (.h5)")
+    args = parser.parse_args()
+
+    if args.target:
+        model = keras.models.load_model(args.target, custom_objects=custom_objects, compile=False)
+    elif args.builder:
+        model = load_builder(args.builder)((args.img_size, args.img_size), args.num_classes,
+                                           activation=args.activation)
+    else:
+        parser.error("give the new model as an .h5 or with --builder")
+    report = warm_start(model, args.source)
+    print_report(report, "summary-oxford-warmstart.txt")
+    if args.output:
+        model.save(args.output)